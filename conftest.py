@@ -0,0 +1,41 @@
+import atexit
+import os
+import shutil
+import tempfile
+import pytest
+from django.core.cache import caches
+from django.test import override_settings
+
+
+def pytest_configure(config):
+    """
+    Writes the metrics and the cache of the test processes, the ones they
+    start included, to temporary directories rather than to METRICS_DIR and
+    the cache of the site.
+    """
+    directory = tempfile.mkdtemp(prefix='oc-lettings-metrics-')
+    # Registered before the flush of the metrics, so run after it
+    atexit.register(shutil.rmtree, directory, True)
+    os.environ['METRICS_DIR'] = directory
+    override_settings(METRICS_DIR=directory).enable()
+
+    cache = tempfile.mkdtemp(prefix='oc-lettings-cache-')
+    atexit.register(shutil.rmtree, cache, True)
+    os.environ['CACHE_BACKEND'] = 'file'
+    os.environ['CACHE_LOCATION'] = cache
+    override_settings(CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': cache,
+        }
+    }).enable()
+
+
+@pytest.fixture(autouse=True)
+def empty_caches():
+    """
+    Starts each test with empty caches: no page, version or login counter
+    left by the previous tests.
+    """
+    for cache in caches.all():
+        cache.clear()
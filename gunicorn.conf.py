@@ -1,3 +1,37 @@
+import os
+
+
 bind = "0.0.0.0:8000"
 wsgi_app = "oc_lettings_site.wsgi:application"
 workers = 2
+
+# SERVER_MODE=asgi serves the ASGI application with uvicorn workers: each worker
+# runs an event loop, so that slow clients no longer hold a whole worker
+if os.environ.get('SERVER_MODE', 'wsgi') == 'asgi':
+    wsgi_app = "oc_lettings_site.asgi:application"
+    worker_class = "uvicorn.workers.UvicornWorker"
+    # Set before on_starting loads the settings in the master process
+    os.environ.setdefault('ASYNC_VIEWS', 'True')
+
+
+def on_starting(server):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'oc_lettings_site.settings')
+    import django
+    django.setup()
+    from django.conf import settings
+    from oc_lettings_site import metrics, page_cache
+    # A per-process cache would let each worker serve the pages the others invalidated
+    aliases = {settings.PAGE_CACHE_ALIAS, settings.LOGIN_GUARD_CACHE_ALIAS}
+    if server.cfg.workers > 1 and not all(page_cache.is_shared(alias) for alias in aliases):
+        raise RuntimeError(
+            "The cache is per process: set CACHE_BACKEND to 'file' or 'redis' "
+            "to run several workers."
+        )
+    # The workers of a previous run must not be summed with the new ones
+    metrics.reset_directory()
+
+
+def post_fork(server, worker):
+    # Sentry starts its threads in each worker, before the application is loaded
+    from oc_lettings_site.sentry_config import ensure_sentry
+    ensure_sentry()
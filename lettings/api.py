@@ -0,0 +1,73 @@
+from oc_lettings_site.api import Resource, api_view, export_response
+from oc_lettings_site.export import Export
+from oc_lettings_site.page_cache import cached_page
+from .models import Letting, LettingSummary
+
+
+LETTING_FIELDS = {
+    'id': 'id',
+    'title': 'title',
+    'address.number': 'address__number',
+    'address.street': 'address__street',
+    'address.city': 'address__city',
+    'address.state': 'address__state',
+    'address.zip_code': 'address__zip_code',
+    'address.country_iso_code': 'address__country_iso_code',
+}
+
+# The same fields, read from the columns of the summaries, without any join
+SUMMARY_FIELDS = {
+    name: lookup.removeprefix('address__') for name, lookup in LETTING_FIELDS.items()
+}
+
+LETTINGS = Resource(
+    LettingSummary.objects.all(),
+    key='id',
+    fields=SUMMARY_FIELDS,
+    default_fields=('title', 'address'),
+    batch_param='ids',
+    key_type=int,
+)
+
+LETTINGS_EXPORT = Export('lettings', Letting.objects.all(), LETTING_FIELDS)
+
+
+@cached_page('lettings')
+@api_view
+def letting_list(request):
+    """
+    Returns the lettings with their address, as JSON.
+    Supports the 'fields', 'after', 'limit' and 'ids' query parameters.
+    Args:
+        request (HttpRequest): The HTTP request object.
+    Returns:
+        JsonResponse: A page of lettings, or the lettings listed in 'ids'.
+    """
+    return LETTINGS.list(request)
+
+
+@cached_page('lettings')
+@api_view
+def letting_detail(request, letting_id):
+    """
+    Returns a letting with its address, as JSON.
+    Args:
+        request (HttpRequest): The HTTP request object.
+        letting_id (int): The id of the letting.
+    Returns:
+        JsonResponse: The letting, or an error with status 404.
+    """
+    return LETTINGS.detail(request, letting_id)
+
+
+@api_view
+def letting_export(request):
+    """
+    Streams every letting with its address, as CSV or NDJSON (staff only).
+    Supports the 'format', 'gzip' and 'after' query parameters.
+    Args:
+        request (HttpRequest): The HTTP request object.
+    Returns:
+        StreamingHttpResponse: The lettings export.
+    """
+    return export_response(request, LETTINGS_EXPORT)
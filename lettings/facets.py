@@ -0,0 +1,138 @@
+from asgiref.sync import sync_to_async
+from django.db.models import Count
+from django.http import QueryDict
+from oc_lettings_site import page_cache
+from .models import LettingSummary
+
+
+# Query parameter, label and LettingSummary column of each facet
+FACETS = (
+    ('country', 'Country', 'country_iso_code'),
+    ('state', 'State', 'state'),
+    ('city', 'City', 'city'),
+)
+SUMMARY_KEY = 'lettings:facet-summary:{}'
+MAX_VALUES = 20
+
+
+def facet_summary():
+    """
+    Returns the number of lettings per (country, state, city), the materialized
+    summary every facet count is derived from. It is computed with one GROUP BY
+    and cached under the 'lettings' page cache version, so that any Address or
+    Letting change (see oc_lettings_site.signals) refreshes it.
+    Returns:
+        list: (country, state, city, count) tuples.
+    """
+    cache = page_cache.get_cache()
+    key = _summary_key()
+    summary = cache.get(key)
+    if summary is None:
+        summary = list(_summary_rows())
+        cache.set(key, summary, None)
+    return summary
+
+
+async def afacet_summary():
+    """
+    Asynchronous version of facet_summary, for the async views.
+    """
+    cache = page_cache.get_cache()
+    key = await sync_to_async(_summary_key)()
+    summary = await cache.aget(key)
+    if summary is None:
+        summary = [row async for row in _summary_rows()]
+        await cache.aset(key, summary, None)
+    return summary
+
+
+def _summary_key():
+    return SUMMARY_KEY.format(page_cache.namespace_version('lettings'))
+
+
+def _summary_rows():
+    return (
+        LettingSummary.objects.values_list(*[lookup for _, _, lookup in FACETS])
+        .annotate(count=Count('id'))
+        .order_by()
+    )
+
+
+def selected_filters(query_params):
+    """
+    Returns the facet values selected in the query parameters.
+    Args:
+        query_params (QueryDict): The request query parameters.
+    Returns:
+        dict: The selected value by facet name.
+    """
+    return {
+        name: query_params[name]
+        for name, _, _ in FACETS
+        if query_params.get(name)
+    }
+
+
+def filter_lettings(queryset, selected):
+    """
+    Filters a LettingSummary queryset with the selected facet values.
+    """
+    lookups = {lookup: selected[name] for name, _, lookup in FACETS if name in selected}
+    return queryset.filter(**lookups) if lookups else queryset
+
+
+def facet_counts(query_params, summary=None):
+    """
+    Returns the facets to display, each value counted among the lettings
+    matching the values selected in the other facets.
+    Args:
+        query_params (QueryDict): The request query parameters.
+        summary (list): The facet summary, read by facet_summary() by default.
+    Returns:
+        list: One dict per facet with its 'name', 'label', 'clear_query' and
+            'values', a list of dicts with 'value', 'count', 'selected' and 'query'.
+    """
+    selected = selected_filters(query_params)
+    if summary is None:
+        summary = facet_summary()
+    facets = []
+    for position, (name, label, _) in enumerate(FACETS):
+        others = [
+            (other_position, selected[other])
+            for other_position, (other, _, _) in enumerate(FACETS)
+            if other != name and other in selected
+        ]
+        counts = {}
+        for row in summary:
+            if all(row[other_position] == value for other_position, value in others):
+                counts[row[position]] = counts.get(row[position], 0) + row[-1]
+
+        values = sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:MAX_VALUES]
+        if name in selected and selected[name] not in dict(values):
+            values.append((selected[name], counts.get(selected[name], 0)))
+        facets.append({
+            'name': name,
+            'label': label,
+            'clear_query': _query_with(query_params, name, None),
+            'values': [
+                {
+                    'value': value,
+                    'count': count,
+                    'selected': selected.get(name) == value,
+                    'query': _query_with(query_params, name, value),
+                }
+                for value, count in values
+            ],
+        })
+    return facets
+
+
+def _query_with(query_params, name, value):
+    # Changing a filter goes back to the first page
+    params = QueryDict(mutable=True)
+    params.update(query_params)
+    for param in ('after', 'before', name):
+        params.pop(param, None)
+    if value is not None:
+        params[name] = value
+    return params.urlencode()
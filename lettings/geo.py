@@ -0,0 +1,133 @@
+import csv
+import math
+from .models import Letting, ZipCentroid
+
+
+EARTH_RADIUS_MILES = 3958.8
+
+# Size of the latitude/longitude grid cells, in degrees (about 35 miles of latitude)
+CELL_SIZE = 0.5
+
+MAX_RADIUS_MILES = 250
+
+# Number of zip codes per lettings query
+ZIP_CHUNK_SIZE = 500
+
+
+def cell_of(latitude, longitude):
+    """
+    Returns the (cell_lat, cell_lon) grid cell containing a point.
+    """
+    return math.floor(latitude / CELL_SIZE), math.floor(longitude / CELL_SIZE)
+
+
+def haversine_miles(lat1, lon1, lat2, lon2):
+    """
+    Returns the great-circle distance between two points, in miles.
+    """
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_MILES * math.asin(math.sqrt(a))
+
+
+def cell_ranges(latitude, longitude, radius_miles):
+    """
+    Returns the ranges of grid cells covering a circle.
+    Args:
+        latitude (float): The latitude of the center.
+        longitude (float): The longitude of the center.
+        radius_miles (float): The radius of the circle.
+    Returns:
+        tuple: The (min, max) cell_lat and (min, max) cell_lon ranges.
+    """
+    lat_delta = math.degrees(radius_miles / EARTH_RADIUS_MILES)
+    # A degree of longitude shrinks with the cosine of the latitude
+    cos_lat = max(math.cos(math.radians(min(abs(latitude) + lat_delta, 89.9))), 0.01)
+    lon_delta = min(lat_delta / cos_lat, 180)
+    min_cell = cell_of(latitude - lat_delta, longitude - lon_delta)
+    max_cell = cell_of(latitude + lat_delta, longitude + lon_delta)
+    return (min_cell[0], max_cell[0]), (min_cell[1], max_cell[1])
+
+
+def zips_near(zip_code, radius_miles):
+    """
+    Returns the zip codes whose centroid lies within a radius of a zip code.
+    Only the centroids of the grid cells covering the circle are read, through
+    the (cell_lat, cell_lon) index, and the distance is computed per zip code.
+    Args:
+        zip_code (int): The zip code at the center.
+        radius_miles (float): The radius, capped to MAX_RADIUS_MILES.
+    Returns:
+        dict: The distance in miles by zip code, None if the zip code is unknown.
+    """
+    center = ZipCentroid.objects.filter(zip_code=zip_code).first()
+    if center is None:
+        return None
+    radius_miles = min(radius_miles, MAX_RADIUS_MILES)
+    lat_range, lon_range = cell_ranges(center.latitude, center.longitude, radius_miles)
+    candidates = ZipCentroid.objects.filter(
+        cell_lat__range=lat_range, cell_lon__range=lon_range
+    ).values_list('zip_code', 'latitude', 'longitude')
+
+    distances = {}
+    for candidate, latitude, longitude in candidates:
+        distance = haversine_miles(center.latitude, center.longitude, latitude, longitude)
+        if distance <= radius_miles:
+            distances[candidate] = distance
+    return distances
+
+
+def lettings_near(zip_code, radius_miles, limit=50):
+    """
+    Returns the lettings located within a radius of a zip code, nearest first.
+    Args:
+        zip_code (int): The zip code at the center.
+        radius_miles (float): The radius, capped to MAX_RADIUS_MILES.
+        limit (int): The maximum number of lettings.
+    Returns:
+        list: (letting, distance in miles) tuples, None if the zip code is unknown.
+    """
+    distances = zips_near(zip_code, radius_miles)
+    if distances is None:
+        return None
+    nearest = sorted(distances, key=distances.get)
+
+    # Zip codes are read nearest first, so the search stops once enough lettings are found
+    results = []
+    for start in range(0, len(nearest), ZIP_CHUNK_SIZE):
+        chunk = nearest[start:start + ZIP_CHUNK_SIZE]
+        lettings = Letting.objects.for_view('letting').filter(address__zip_code__in=chunk)
+        results.extend(
+            sorted(
+                ((letting, distances[letting.address.zip_code]) for letting in lettings),
+                key=lambda result: (result[1], result[0].id)
+            )
+        )
+        if len(results) >= limit:
+            break
+    return results[:limit]
+
+
+def read_centroids(file):
+    """
+    Reads zip code centroids from a CSV file with 'zip_code', 'latitude' and
+    'longitude' columns, or from a tab separated US Census ZCTA gazetteer file
+    ('GEOID', 'INTPTLAT' and 'INTPTLONG' columns).
+    Args:
+        file: The opened text file.
+    Yields:
+        tuple: (zip_code, latitude, longitude).
+    """
+    sample = file.readline()
+    delimiter = '\t' if '\t' in sample else ','
+    header = [column.strip() for column in sample.split(delimiter)]
+    if 'GEOID' in header:
+        columns = ('GEOID', 'INTPTLAT', 'INTPTLONG')
+    else:
+        columns = ('zip_code', 'latitude', 'longitude')
+    for row in csv.DictReader(file, fieldnames=header, delimiter=delimiter):
+        row = {key: value.strip() for key, value in row.items() if key}
+        yield int(row[columns[0]]), float(row[columns[1]]), float(row[columns[2]])
@@ -0,0 +1,51 @@
+import os
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from oc_lettings_site import page_cache, versioning
+from lettings.geo import cell_of, read_centroids
+from lettings.models import ZipCentroid
+
+
+DEFAULT_SOURCE = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'data', 'zip_centroids.csv'
+)
+BATCH_SIZE = 5000
+
+
+class Command(BaseCommand):
+    """
+    Loads the zip code centroids and their grid cells used by the proximity search.
+    """
+    help = "Builds the zip code centroids index of the proximity search."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--source',
+            default=DEFAULT_SOURCE,
+            help="CSV file (zip_code, latitude, longitude) or US Census ZCTA gazetteer file. "
+                 "Defaults to the bundled table."
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['source'], encoding='utf-8') as file:
+                centroids = [
+                    ZipCentroid(
+                        zip_code=zip_code,
+                        latitude=latitude,
+                        longitude=longitude,
+                        cell_lat=cell_lat,
+                        cell_lon=cell_lon,
+                    )
+                    for zip_code, latitude, longitude in read_centroids(file)
+                    for cell_lat, cell_lon in [cell_of(latitude, longitude)]
+                ]
+        except (OSError, KeyError, ValueError) as e:
+            raise CommandError(f"Cannot read {options['source']}: {e}")
+
+        with transaction.atomic():
+            ZipCentroid.objects.all().delete()
+            ZipCentroid.objects.bulk_create(centroids, batch_size=BATCH_SIZE)
+        versioning.bump(ZipCentroid)
+        page_cache.invalidate('lettings')
+        self.stdout.write(self.style.SUCCESS(f"{len(centroids)} zip code centroids indexed."))
@@ -0,0 +1,67 @@
+from oc_lettings_site import page_cache, versioning
+from oc_lettings_site.bulk_import import ImportCommand, reset_sequences
+from lettings import summary
+from lettings.models import Address, Letting
+
+
+ADDRESS_FIELDS = ['number', 'street', 'city', 'state', 'zip_code', 'country_iso_code']
+
+
+class Command(ImportCommand):
+    """
+    Bulk imports lettings with their address, from the columns of the lettings
+    export. A record with an 'id' updates the existing letting and its address,
+    a record without one creates a new letting.
+    """
+    help = "Imports lettings and their addresses from a CSV or NDJSON file."
+
+    columns = {
+        'id': Letting._meta.get_field('id'),
+        'title': Letting._meta.get_field('title'),
+        **{f'address.{name}': Address._meta.get_field(name) for name in ADDRESS_FIELDS},
+    }
+
+    def import_batch(self, records):
+        # The last record wins when an id is repeated, an upsert cannot change a row twice
+        records = list({
+            record.get('id') or -position: record for position, record in enumerate(records, 1)
+        }.values())
+        ids = [record['id'] for record in records if 'id' in record]
+        address_ids = dict(Letting.objects.filter(id__in=ids).values_list('id', 'address_id'))
+
+        addresses = [
+            Address(
+                id=address_ids.get(record.get('id')),
+                **{name: record[f'address.{name}'] for name in ADDRESS_FIELDS}
+            )
+            for record in records
+        ]
+        Address.objects.bulk_create(
+            [address for address in addresses if address.id],
+            update_conflicts=True,
+            unique_fields=['id'],
+            update_fields=ADDRESS_FIELDS + ['updated_at'],
+        )
+        Address.objects.bulk_create([address for address in addresses if not address.id])
+
+        lettings = [
+            Letting(id=record.get('id'), title=record['title'], address=address)
+            for record, address in zip(records, addresses)
+        ]
+        Letting.objects.bulk_create(
+            [letting for letting in lettings if letting.id],
+            update_conflicts=True,
+            unique_fields=['id'],
+            update_fields=['title', 'address', 'updated_at'],
+        )
+        Letting.objects.bulk_create([letting for letting in lettings if not letting.id])
+        summary.refresh(letting.id for letting in lettings)
+
+    def finish(self):
+        # The records with an unknown id were inserted with it, the sequence must continue after it
+        reset_sequences(Address, Letting)
+        # Bulk operations send no signals, the search index is kept by its triggers
+        # and the summaries are refreshed by each batch
+        versioning.bump(Address, Letting)
+        # Seen by the web workers through the cache they share (see page_cache.is_shared)
+        page_cache.invalidate('lettings')
@@ -0,0 +1,29 @@
+import time
+from django.core.management.base import BaseCommand
+from oc_lettings_site import page_cache, versioning
+from lettings.models import Letting
+from lettings.summary import REBUILD_CHUNK_SIZE, rebuild
+
+
+class Command(BaseCommand):
+    """
+    Rebuilds the LettingSummary read model from scratch, e.g. after rows were
+    changed by raw SQL, which neither sends signals nor refreshes the summaries.
+    """
+    help = "Rebuilds the letting summaries read by the lettings pages and API."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=REBUILD_CHUNK_SIZE,
+            help="Lettings copied per INSERT ... SELECT statement."
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        count = rebuild(chunk_size=max(options['chunk_size'], 1), stdout=self.stdout)
+        # The rebuilt rows may differ from those the cached pages and ETags were made of
+        versioning.bump(Letting)
+        page_cache.invalidate('lettings')
+        self.stdout.write(self.style.SUCCESS(
+            f"{count} letting summaries rebuilt in {time.perf_counter() - started:.2f} s."
+        ))
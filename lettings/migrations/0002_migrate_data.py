@@ -1,11 +1,13 @@
 from django.db import migrations
+from oc_lettings_site.migration_utils import copy_table, empty_table
 
 
 def forward_func(apps, schema_editor):
     """
     Migrates data from the old 'oc_lettings_site' app to the new 'lettings' app.
-    Copies all Address and Letting records from 'oc_lettings_site' to 'lettings',
-    maintaining the same IDs to preserve relationships.
+    Copies all Address and Letting records from 'oc_lettings_site' to 'lettings'
+    with set-based INSERT ... SELECT statements, maintaining the same IDs to
+    preserve relationships.
     Args:
         apps: The Django app registry.
         schema_editor: Database schema editor to apply changes.
@@ -17,38 +19,21 @@ def forward_func(apps, schema_editor):
     NewAddress = apps.get_model('lettings', 'Address')
     NewLetting = apps.get_model('lettings', 'Letting')
 
-    # Copy Address data
-    for old_address in OldAddress.objects.all():
-        new_address = NewAddress(
-            id=old_address.id,
-            number=old_address.number,
-            street=old_address.street,
-            city=old_address.city,
-            state=old_address.state,
-            zip_code=old_address.zip_code,
-            country_iso_code=old_address.country_iso_code
-        )
-        new_address.save()
-
-    # Copy Letting data
-    for old_letting in OldLetting.objects.all():
-        new_address = NewAddress.objects.get(id=old_letting.address_id)
-        new_letting = NewLetting(
-            id=old_letting.id,
-            title=old_letting.title,
-            address=new_address
-        )
-        new_letting.save()
+    # Copy Address data, then Letting data referencing the same address IDs
+    copy_table(schema_editor, OldAddress, NewAddress)
+    copy_table(schema_editor, OldLetting, NewLetting)
 
     # Drop old tables from the 'oc_lettings_site' app
-    schema_editor.delete_model(apps.get_model('oc_lettings_site', 'Address'))
-    schema_editor.delete_model(apps.get_model('oc_lettings_site', 'Letting'))
+    schema_editor.delete_model(OldLetting)
+    schema_editor.delete_model(OldAddress)
 
 
 def reverse_func(apps, schema_editor):
     """
-    Reverts the migration by copying the data back from the new 'lettings' app
-    to the old 'oc_lettings_site' app and then drops the new 'lettings' tables.
+    Reverts the migration by recreating the old 'oc_lettings_site' tables,
+    dropped by the forward migration, copying the data back from the new
+    'lettings' app and then emptying the new 'lettings' tables, which are
+    dropped by the reverse of their initial migration.
     Args:
         apps: The Django app registry.
         schema_editor: Database schema editor to apply changes.
@@ -60,32 +45,15 @@ def reverse_func(apps, schema_editor):
     OldAddress = apps.get_model('oc_lettings_site', 'Address')
     OldLetting = apps.get_model('oc_lettings_site', 'Letting')
 
-    # Copy Address data back to the old app
-    for new_address in NewAddress.objects.all():
-        old_address = OldAddress(
-            id=new_address.id,
-            number=new_address.number,
-            street=new_address.street,
-            city=new_address.city,
-            state=new_address.state,
-            zip_code=new_address.zip_code,
-            country_iso_code=new_address.country_iso_code
-        )
-        old_address.save()
-
-    # Copy Letting data back to the old app
-    for new_letting in NewLetting.objects.all():
-        old_address = OldAddress.objects.get(id=new_letting.address_id)
-        old_letting = OldLetting(
-            id=new_letting.id,
-            title=new_letting.title,
-            address=old_address
-        )
-        old_letting.save()
+    # Recreate the old tables and copy the data back to the old app
+    schema_editor.create_model(OldAddress)
+    schema_editor.create_model(OldLetting)
+    copy_table(schema_editor, NewAddress, OldAddress)
+    copy_table(schema_editor, NewLetting, OldLetting)
 
-    # Drop new tables from the 'lettings' app
-    schema_editor.delete_model(apps.get_model('lettings', 'Address'))
-    schema_editor.delete_model(apps.get_model('lettings', 'Letting'))
+    # Empty the new tables from the 'lettings' app
+    empty_table(schema_editor, NewLetting)
+    empty_table(schema_editor, NewAddress)
 
 
 class Migration(migrations.Migration):
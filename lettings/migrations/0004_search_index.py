@@ -0,0 +1,111 @@
+from django.db import migrations
+
+
+# Full-text index of the lettings, one row per letting (rowid = letting id).
+# Prefix indexes on 2 to 4 characters keep prefix queries fast.
+CREATE_INDEX = """
+    CREATE VIRTUAL TABLE lettings_search USING fts5(
+        title, street, city, state, zip_code,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3 4'
+    )
+"""
+
+INSERT_LETTING = """
+    INSERT INTO lettings_search(rowid, title, street, city, state, zip_code)
+    SELECT new.id, new.title, a.street, a.city, a.state, a.zip_code
+    FROM lettings_address a WHERE a.id = new.address_id;
+"""
+
+# Triggers keep the index up to date on every insert, update and delete,
+# including bulk operations that do not send model signals.
+CREATE_TRIGGERS = [
+    f"""
+    CREATE TRIGGER lettings_search_letting_insert AFTER INSERT ON lettings_letting
+    BEGIN
+        {INSERT_LETTING}
+    END
+    """,
+    f"""
+    CREATE TRIGGER lettings_search_letting_update
+    AFTER UPDATE OF title, address_id ON lettings_letting
+    BEGIN
+        DELETE FROM lettings_search WHERE rowid = old.id;
+        {INSERT_LETTING}
+    END
+    """,
+    """
+    CREATE TRIGGER lettings_search_letting_delete AFTER DELETE ON lettings_letting
+    BEGIN
+        DELETE FROM lettings_search WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER lettings_search_address_update
+    AFTER UPDATE OF street, city, state, zip_code ON lettings_address
+    BEGIN
+        DELETE FROM lettings_search
+        WHERE rowid IN (SELECT id FROM lettings_letting WHERE address_id = new.id);
+        INSERT INTO lettings_search(rowid, title, street, city, state, zip_code)
+        SELECT l.id, l.title, new.street, new.city, new.state, new.zip_code
+        FROM lettings_letting l WHERE l.address_id = new.id;
+    END
+    """,
+]
+
+POPULATE_INDEX = """
+    INSERT INTO lettings_search(rowid, title, street, city, state, zip_code)
+    SELECT l.id, l.title, a.street, a.city, a.state, a.zip_code
+    FROM lettings_letting l JOIN lettings_address a ON a.id = l.address_id
+"""
+
+DROP_STATEMENTS = [
+    "DROP TRIGGER IF EXISTS lettings_search_letting_insert",
+    "DROP TRIGGER IF EXISTS lettings_search_letting_update",
+    "DROP TRIGGER IF EXISTS lettings_search_letting_delete",
+    "DROP TRIGGER IF EXISTS lettings_search_address_update",
+    "DROP TABLE IF EXISTS lettings_search",
+]
+
+
+def forward_func(apps, schema_editor):
+    """
+    Creates the FTS5 search index of the lettings, its triggers, and indexes
+    the existing lettings. Only SQLite provides FTS5, other databases are skipped.
+    Args:
+        apps: The Django app registry.
+        schema_editor: Database schema editor to apply changes.
+    """
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(CREATE_INDEX)
+    for statement in CREATE_TRIGGERS:
+        schema_editor.execute(statement)
+    schema_editor.execute(POPULATE_INDEX)
+
+
+def reverse_func(apps, schema_editor):
+    """
+    Drops the search index and its triggers.
+    Args:
+        apps: The Django app registry.
+        schema_editor: Database schema editor to apply changes.
+    """
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in DROP_STATEMENTS:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+    """
+    Migration creating the full-text search index of the lettings.
+    """
+
+    dependencies = [
+        ('lettings', '0003_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(forward_func, reverse_func),
+    ]
@@ -0,0 +1,36 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """
+    Creates the 'ZipCentroid' model used by the proximity search and
+    indexes the zip code of the 'Address' model.
+    """
+
+    dependencies = [
+        ('lettings', '0004_search_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='address',
+            index=models.Index(fields=['zip_code'], name='lettings_address_zip_idx'),
+        ),
+        migrations.CreateModel(
+            name='ZipCentroid',
+            fields=[
+                ('zip_code', models.PositiveIntegerField(
+                    primary_key=True,
+                    serialize=False)),
+                ('latitude', models.FloatField()),
+                ('longitude', models.FloatField()),
+                ('cell_lat', models.IntegerField()),
+                ('cell_lon', models.IntegerField()),
+            ],
+            options={
+                'indexes': [models.Index(
+                    fields=['cell_lat', 'cell_lon'],
+                    name='lettings_zip_cell_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """
+    Indexes the state, city and country ISO code of the 'Address' model,
+    filtered by the facets of the lettings index.
+    """
+
+    dependencies = [
+        ('lettings', '0005_zipcentroid'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='address',
+            index=models.Index(fields=['state'], name='lettings_address_state_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='address',
+            index=models.Index(fields=['city'], name='lettings_address_city_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='address',
+            index=models.Index(fields=['country_iso_code'], name='lettings_address_country_idx'),
+        ),
+    ]
@@ -0,0 +1,62 @@
+from django.db import migrations, models
+from lettings.summary import rebuild
+
+
+def forward_func(apps, schema_editor):
+    """
+    Fills the 'LettingSummary' read model from the existing lettings and
+    their addresses, with set-based INSERT ... SELECT statements.
+    Args:
+        apps: The Django app registry.
+        schema_editor: Database schema editor to apply changes.
+    """
+    rebuild(
+        apps.get_model('lettings', 'Letting'),
+        apps.get_model('lettings', 'LettingSummary'),
+        using=schema_editor.connection.alias,
+    )
+
+
+class Migration(migrations.Migration):
+    """
+    Creates the 'LettingSummary' denormalized read model of the lettings
+    pages and API, indexed for the facet filters and the facet summary,
+    and fills it. The reverse migration drops the table.
+    """
+
+    dependencies = [
+        ('lettings', '0007_facet_summary_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LettingSummary',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('title', models.CharField(max_length=256)),
+                ('number', models.PositiveIntegerField()),
+                ('street', models.CharField(max_length=64)),
+                ('address_line', models.CharField(max_length=69)),
+                ('city', models.CharField(max_length=64)),
+                ('state', models.CharField(max_length=2)),
+                ('zip_code', models.PositiveIntegerField()),
+                ('country_iso_code', models.CharField(max_length=3)),
+                ('updated_at', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name_plural': 'Letting summaries',
+                'indexes': [
+                    models.Index(fields=['state', 'id'], name='lettings_summary_state_idx'),
+                    models.Index(fields=['city', 'id'], name='lettings_summary_city_idx'),
+                    models.Index(
+                        fields=['country_iso_code', 'id'], name='lettings_summary_country_idx'
+                    ),
+                    models.Index(
+                        fields=['country_iso_code', 'state', 'city'],
+                        name='lettings_summary_facets_idx'
+                    ),
+                ],
+            },
+        ),
+        migrations.RunPython(forward_func, migrations.RunPython.noop),
+    ]
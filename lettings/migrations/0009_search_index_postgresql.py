@@ -0,0 +1,51 @@
+from django.db import migrations
+from lettings.search import SEARCH_DOCUMENT
+
+
+# GIN index of the search document of the letting summaries. It serves the
+# queries of lettings.search only as long as they use the same expression.
+CREATE_INDEX = f"""
+    CREATE INDEX lettings_summary_search_idx ON lettings_lettingsummary
+    USING gin (({SEARCH_DOCUMENT}))
+"""
+
+DROP_INDEX = "DROP INDEX IF EXISTS lettings_summary_search_idx"
+
+
+def forward_func(apps, schema_editor):
+    """
+    Creates the full-text search index of the lettings on PostgreSQL, which
+    has no FTS5. SQLite keeps the index of migration 0004 and is skipped.
+    Args:
+        apps: The Django app registry.
+        schema_editor: Database schema editor to apply changes.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(CREATE_INDEX)
+
+
+def reverse_func(apps, schema_editor):
+    """
+    Drops the PostgreSQL search index.
+    Args:
+        apps: The Django app registry.
+        schema_editor: Database schema editor to apply changes.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(DROP_INDEX)
+
+
+class Migration(migrations.Migration):
+    """
+    Migration creating the full-text search index of the lettings on PostgreSQL.
+    """
+
+    dependencies = [
+        ('lettings', '0008_lettingsummary'),
+    ]
+
+    operations = [
+        migrations.RunPython(forward_func, reverse_func),
+    ]
@@ -0,0 +1,30 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """
+    Drops the state, city and facets indexes of the 'Address' model. Since
+    migration 0008, the facet filters and the facet summary read the
+    'LettingSummary' table, indexed on the same columns: the 'Address'
+    indexes no longer serve any query, and only slowed down every address
+    insert and update.
+    """
+
+    dependencies = [
+        ('lettings', '0009_search_index_postgresql'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='address',
+            name='lettings_address_state_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='address',
+            name='lettings_address_city_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='address',
+            name='lettings_address_facets_idx',
+        ),
+    ]
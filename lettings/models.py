@@ -1,6 +1,7 @@
-import sentry_sdk
 from django.db import models
 from django.core.validators import MaxValueValidator, MinLengthValidator
+from oc_lettings_site import reporting
+from oc_lettings_site.querysets import ViewQuerySet
 
 
 class Address(models.Model):
@@ -14,9 +15,14 @@ class Address(models.Model):
     state = models.CharField(max_length=2, validators=[MinLengthValidator(2)])
     zip_code = models.PositiveIntegerField(validators=[MaxValueValidator(99999)])
     country_iso_code = models.CharField(max_length=3, validators=[MinLengthValidator(3)])
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         verbose_name_plural = "Addresses"
+        indexes = [
+            # Proximity search (see lettings.geo), the facets read LettingSummary
+            models.Index(fields=['zip_code'], name='lettings_address_zip_idx'),
+        ]
 
     def __str__(self):
         """
@@ -29,17 +35,29 @@ class Address(models.Model):
             super().clean()
         except Exception as e:
             # Capturing sentry exception
-            sentry_sdk.capture_exception(e)
-            sentry_sdk.capture_message("Erreur de validation dans le modèle Address")
+            reporting.report_exception(e, "Erreur de validation dans le modèle Address")
             raise
 
 
+class LettingQuerySet(ViewQuerySet):
+    """
+    QuerySet declaring the relations read by each lettings view.
+    """
+    view_relations = {
+        'index': (),
+        'letting': ('address',),
+    }
+
+
 class Letting(models.Model):
     """
     Represents a rental listing associated with a specific address.
     """
     title = models.CharField(max_length=256)
     address = models.OneToOneField(Address, on_delete=models.CASCADE)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = LettingQuerySet.as_manager()
 
     def __str__(self):
         """
@@ -52,6 +70,68 @@ class Letting(models.Model):
             super().clean()
         except Exception as e:
             # Capturing sentry exception
-            sentry_sdk.capture_exception(e)
-            sentry_sdk.capture_message("Erreur de validation dans le modèle Letting")
+            reporting.report_exception(e, "Erreur de validation dans le modèle Letting")
             raise
+
+
+class LettingSummary(models.Model):
+    """
+    Denormalized read model of a letting and its address: one row per letting,
+    sharing its id, with the display string of the address precomputed.
+    The lettings pages and API read it without any join. Kept in sync by
+    signals and the bulk imports (see lettings.summary), rebuilt by the
+    'rebuild_letting_summaries' management command.
+    """
+    id = models.IntegerField(primary_key=True)
+    title = models.CharField(max_length=256)
+    number = models.PositiveIntegerField()
+    street = models.CharField(max_length=64)
+    # str(Address), 'number street'
+    address_line = models.CharField(max_length=69)
+    city = models.CharField(max_length=64)
+    state = models.CharField(max_length=2)
+    zip_code = models.PositiveIntegerField()
+    country_iso_code = models.CharField(max_length=3)
+    # The latest change of the letting or of its address
+    updated_at = models.DateTimeField()
+
+    class Meta:
+        verbose_name_plural = "Letting summaries"
+        indexes = [
+            # Facet filters of the lettings index, each page read in id order
+            models.Index(fields=['state', 'id'], name='lettings_summary_state_idx'),
+            models.Index(fields=['city', 'id'], name='lettings_summary_city_idx'),
+            models.Index(fields=['country_iso_code', 'id'], name='lettings_summary_country_idx'),
+            # GROUP BY of the facet summary
+            models.Index(
+                fields=['country_iso_code', 'state', 'city'], name='lettings_summary_facets_idx'
+            ),
+        ]
+
+    def __str__(self):
+        """
+        Returns the title of the letting.
+        """
+        return self.title
+
+
+class ZipCentroid(models.Model):
+    """
+    Represents the geographic centroid of a zip code, with the cell of the
+    latitude/longitude grid it belongs to (see lettings.geo).
+    Filled by the 'build_geo_index' management command.
+    """
+    zip_code = models.PositiveIntegerField(primary_key=True)
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+    cell_lat = models.IntegerField()
+    cell_lon = models.IntegerField()
+
+    class Meta:
+        indexes = [models.Index(fields=['cell_lat', 'cell_lon'], name='lettings_zip_cell_idx')]
+
+    def __str__(self):
+        """
+        Returns the zip code with its coordinates.
+        """
+        return f'{self.zip_code:05d} ({self.latitude:.4f}, {self.longitude:.4f})'
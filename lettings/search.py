@@ -0,0 +1,94 @@
+import re
+from django.db import NotSupportedError, connection
+from .models import Letting
+
+
+# Words of the query, each one matched as a prefix
+TOKEN_RE = re.compile(r'\w+')
+MAX_TOKENS = 8
+
+# bm25 weights of the title, street, city, state and zip_code columns
+SEARCH_QUERY = """
+    SELECT rowid FROM lettings_search
+    WHERE lettings_search MATCH %s
+    ORDER BY bm25(lettings_search, 10.0, 2.0, 4.0, 1.0, 1.0)
+    LIMIT %s
+"""
+
+# Document of a letting on PostgreSQL, indexed by a GIN index of its summary
+# (see migration 0009), which only serves queries using this exact expression.
+# Weights: title (A) above city (B), street (C), then state and zip code (D)
+SEARCH_DOCUMENT = (
+    "setweight(to_tsvector('simple', title), 'A')"
+    " || setweight(to_tsvector('simple', city), 'B')"
+    " || setweight(to_tsvector('simple', street), 'C')"
+    " || setweight(to_tsvector('simple', state), 'D')"
+    " || setweight(to_tsvector('simple', zip_code::text), 'D')"
+)
+
+POSTGRESQL_SEARCH_QUERY = f"""
+    SELECT id FROM lettings_lettingsummary
+    WHERE ({SEARCH_DOCUMENT}) @@ to_tsquery('simple', %s)
+    ORDER BY ts_rank({SEARCH_DOCUMENT}, to_tsquery('simple', %s)) DESC, id
+    LIMIT %s
+"""
+
+
+def build_match(query):
+    """
+    Builds an FTS5 MATCH expression requiring every word of the query as a prefix.
+    Args:
+        query (str): The text typed by the user.
+    Returns:
+        str: The MATCH expression, empty if the query has no word.
+    """
+    tokens = TOKEN_RE.findall(query.lower())[:MAX_TOKENS]
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def build_tsquery(query):
+    """
+    Builds a PostgreSQL tsquery requiring every word of the query as a prefix.
+    Args:
+        query (str): The text typed by the user.
+    Returns:
+        str: The tsquery, empty if the query has no word.
+    """
+    tokens = TOKEN_RE.findall(query.lower())[:MAX_TOKENS]
+    return ' & '.join(f'{token}:*' for token in tokens)
+
+
+def search_lettings(query, limit=50):
+    """
+    Searches the lettings by title and address, best matches first.
+    On SQLite, uses the 'lettings_search' FTS5 index maintained by database
+    triggers (see migration 0004). On PostgreSQL, uses the GIN index of the
+    letting summaries (see migration 0009). A query never scans the lettings
+    table, so the other databases are refused rather than scanned.
+    Args:
+        query (str): The text typed by the user.
+        limit (int): The maximum number of results.
+    Returns:
+        list: The matching Letting objects, with their address loaded.
+    Raises:
+        NotSupportedError: If the database is neither SQLite nor PostgreSQL.
+    """
+    match = build_match(query)
+    if not match:
+        return []
+
+    if connection.vendor == 'sqlite':
+        sql, params = SEARCH_QUERY, [match, limit]
+    elif connection.vendor == 'postgresql':
+        tsquery = build_tsquery(query)
+        sql, params = POSTGRESQL_SEARCH_QUERY, [tsquery, tsquery, limit]
+    else:
+        raise NotSupportedError(
+            f"Full-text search needs SQLite or PostgreSQL, not {connection.vendor}."
+        )
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        ids = [row[0] for row in cursor.fetchall()]
+    lettings = Letting.objects.for_view('letting').in_bulk(ids)
+    return [lettings[letting_id] for letting_id in ids if letting_id in lettings]
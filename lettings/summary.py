@@ -0,0 +1,101 @@
+from django.db import connections, router, transaction
+from django.db.models import CharField, Count, F, Max, Min, Value
+from django.db.models.functions import Cast, Concat, Greatest
+from .models import Letting, LettingSummary
+
+
+# Number of lettings copied by each INSERT ... SELECT statement of a rebuild
+REBUILD_CHUNK_SIZE = 50000
+# Number of ids refreshed per statement, well below the SQLite parameters limit
+REFRESH_CHUNK_SIZE = 500
+
+
+def summary_columns():
+    """
+    Returns the expression computing each LettingSummary column from a
+    letting and its address, in the order of the table columns.
+    Returns:
+        dict: The expression by column name.
+    """
+    return {
+        'id': F('id'),
+        'title': F('title'),
+        'number': F('address__number'),
+        'street': F('address__street'),
+        'address_line': Concat(
+            Cast('address__number', CharField()), Value(' '), 'address__street',
+            output_field=CharField()
+        ),
+        'city': F('address__city'),
+        'state': F('address__state'),
+        'zip_code': F('address__zip_code'),
+        'country_iso_code': F('address__country_iso_code'),
+        'updated_at': Greatest('updated_at', 'address__updated_at'),
+    }
+
+
+def _insert(lettings, summary_model, using):
+    # One INSERT ... SELECT: the rows never go through Python
+    columns = summary_columns()
+    aliases = {f'summary_{name}': expression for name, expression in columns.items()}
+    select = lettings.annotate(**aliases).values(*aliases).order_by()
+    sql, params = select.query.get_compiler(using=using).as_sql()
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {quote(summary_model._meta.db_table)} "
+            f"({', '.join(quote(name) for name in columns)}) {sql}",
+            params
+        )
+        return cursor.rowcount
+
+
+def refresh(ids):
+    """
+    Recomputes the summaries of the given lettings from their rows: the
+    summary of a deleted letting is deleted, the others are rewritten.
+    Called by the signals of each saved or deleted letting or address, and
+    by the bulk imports, which send no signals.
+    Args:
+        ids (iterable): The ids of the lettings.
+    """
+    ids = list(ids)
+    using = router.db_for_write(LettingSummary)
+    with transaction.atomic(using=using):
+        for start in range(0, len(ids), REFRESH_CHUNK_SIZE):
+            chunk = ids[start:start + REFRESH_CHUNK_SIZE]
+            LettingSummary.objects.using(using).filter(id__in=chunk).delete()
+            _insert(Letting.objects.using(using).filter(id__in=chunk), LettingSummary, using)
+
+
+def rebuild(letting_model=Letting, summary_model=LettingSummary, using=None,
+            chunk_size=REBUILD_CHUNK_SIZE, stdout=None):
+    """
+    Rebuilds every summary from scratch in one transaction: the table is
+    emptied, then filled with one INSERT ... SELECT statement per range of
+    chunk_size letting ids, the progress being reported after each range.
+    Args:
+        letting_model: The (historical) Letting model.
+        summary_model: The (historical) LettingSummary model.
+        using (str): The database alias, the one LettingSummary is written to by default.
+        chunk_size (int): The number of letting ids per statement.
+        stdout: The stream receiving the progress, none by default.
+    Returns:
+        int: The number of summaries.
+    """
+    using = using or router.db_for_write(summary_model)
+    lettings = letting_model._default_manager.using(using)
+    copied = 0
+    with transaction.atomic(using=using):
+        summary_model._default_manager.using(using).all().delete()
+        bounds = lettings.aggregate(low=Min('id'), high=Max('id'), total=Count('id'))
+        low, high, total = bounds['low'], bounds['high'], bounds['total']
+        starts = range(low, high + 1, chunk_size) if total else ()
+        for start in starts:
+            copied += _insert(
+                lettings.filter(id__gte=start, id__lt=start + chunk_size), summary_model, using
+            )
+            if stdout is not None:
+                stdout.write(f"{copied}/{total} summaries")
+    return copied
@@ -1,9 +1,42 @@
-import sentry_sdk
-from django.test import TestCase
+import asyncio
+import gzip
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+from io import StringIO
+from unittest import mock
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management import call_command
+from asgiref.sync import sync_to_async
+from django.test import (
+    AsyncRequestFactory, Client, TestCase, TransactionTestCase, override_settings
+)
+from django.http import QueryDict
 from django.urls import reverse
 from django.core.exceptions import ValidationError
 from django.template.exceptions import TemplateDoesNotExist
-from .models import Address, Letting
+from django.test.utils import CaptureQueriesContext
+from django.db import NotSupportedError, connection, transaction
+from oc_lettings_site.query_budget import query_budget
+from oc_lettings_site.reporting import capture_reports
+from . import views
+from .api import LETTINGS_EXPORT
+from .facets import facet_counts, facet_summary
+from .geo import cell_ranges, haversine_miles, lettings_near, zips_near
+from .models import Address, Letting, LettingSummary, ZipCentroid
+from .search import build_match, build_tsquery, search_lettings
+
+
+# What the import commands do to the cached pages, in a process of its own
+INVALIDATE_LETTINGS = (
+    "import django; django.setup(); "
+    "from oc_lettings_site import page_cache; page_cache.invalidate('lettings')"
+)
 
 
 class AddressModelTest(TestCase):
@@ -104,21 +137,8 @@ class AddressModelTest(TestCase):
     def test_address_clean_exception_sentry(self):
         """
         Test that exceptions in the clean() method of the Address model
-        are properly captured by Sentry.
+        are reported to Sentry as a single event.
         """
-        # Backup original sentry functions
-        original_capture_exception = sentry_sdk.capture_exception
-        original_capture_message = sentry_sdk.capture_message
-
-        sentry_calls = []
-
-        # Mocks for Sentry capture
-        def mock_capture_exception(exc):
-            sentry_calls.append(('exception', exc))
-
-        def mock_capture_message(msg):
-            sentry_calls.append(('message', msg))
-
         # Create an address instance to test
         address = Address.objects.create(
             number=1,
@@ -137,32 +157,20 @@ class AddressModelTest(TestCase):
             raise ValidationError("Mock validation failure")
 
         try:
-            # Apply mocks
-            sentry_sdk.capture_exception = mock_capture_exception
-            sentry_sdk.capture_message = mock_capture_message
             address.__class__.__base__.clean = mock_super_clean  # Simulate exception
 
             # Trigger the clean() method which should catch the exception
-            with self.assertRaises(ValidationError):
-                address.clean()
+            with capture_reports() as reports:
+                with self.assertRaises(ValidationError):
+                    address.clean()
 
-            # Check Sentry was called properly
-            exception_logged = any(
-                call[0] == 'exception' and isinstance(call[1], ValidationError)
-                for call in sentry_calls
-            )
-            message_logged = any(
-                call == ('message', "Erreur de validation dans le modèle Address")
-                for call in sentry_calls
-            )
-
-            self.assertTrue(exception_logged)
-            self.assertTrue(message_logged)
+            # Check the exception was reported once, with its message
+            self.assertEqual(len(reports), 1)
+            self.assertIsInstance(reports[0]['exception'], ValidationError)
+            self.assertEqual(reports[0]['message'], "Erreur de validation dans le modèle Address")
 
         finally:
             # Restore original methods
-            sentry_sdk.capture_exception = original_capture_exception
-            sentry_sdk.capture_message = original_capture_message
             address.__class__.__base__.clean = original_super_clean
 
 
@@ -222,21 +230,8 @@ class LettingModelTest(TestCase):
     def test_letting_clean_exception_sentry(self):
         """
         Test that exceptions in the clean() method of the Letting model
-        are properly captured by Sentry.
+        are reported to Sentry as a single event.
         """
-        # Backup original sentry functions
-        original_capture_exception = sentry_sdk.capture_exception
-        original_capture_message = sentry_sdk.capture_message
-
-        sentry_calls = []
-
-        # Mocks for Sentry capture
-        def mock_capture_exception(exc):
-            sentry_calls.append(('exception', exc))
-
-        def mock_capture_message(msg):
-            sentry_calls.append(('message', msg))
-
         # Use the letting instance from setUp
         letting = self.letting
 
@@ -252,33 +247,20 @@ class LettingModelTest(TestCase):
             raise CustomError("Mock letting validation failure")
 
         try:
-            # Apply mocks
-            sentry_sdk.capture_exception = mock_capture_exception
-            sentry_sdk.capture_message = mock_capture_message
             letting.__class__.__base__.clean = mock_super_clean  # Simulate exception
 
             # Trigger the clean() method which should catch the exception
-            with self.assertRaises(CustomError):
-                letting.clean()
-
-            # Check Sentry was called properly
-            exception_logged = any(
-                call[0] == 'exception' and isinstance(
-                    call[1], CustomError
-                ) for call in sentry_calls
-            )
-            message_logged = any(
-                call == ('message', "Erreur de validation dans le modèle Letting")
-                for call in sentry_calls
-            )
+            with capture_reports() as reports:
+                with self.assertRaises(CustomError):
+                    letting.clean()
 
-            self.assertTrue(exception_logged)
-            self.assertTrue(message_logged)
+            # Check the exception was reported once, with its message
+            self.assertEqual(len(reports), 1)
+            self.assertIsInstance(reports[0]['exception'], CustomError)
+            self.assertEqual(reports[0]['message'], "Erreur de validation dans le modèle Letting")
 
         finally:
             # Restore original methods
-            sentry_sdk.capture_exception = original_capture_exception
-            sentry_sdk.capture_message = original_capture_message
             letting.__class__.__base__.clean = original_super_clean
 
 
@@ -291,18 +273,19 @@ class LettingViewTest(TestCase):
         """
         Sets up test data for Letting and Address models.
         """
-        address = Address.objects.create(
-            number=1,
-            street="Test Street",
-            city="Test City",
-            state="TS",
-            zip_code=12345,
-            country_iso_code="TST"
-        )
-        self.letting = Letting.objects.create(
-            title="Test Letting",
-            address=address
-        )
+        with self.captureOnCommitCallbacks(execute=True):
+            address = Address.objects.create(
+                number=1,
+                street="Test Street",
+                city="Test City",
+                state="TS",
+                zip_code=12345,
+                country_iso_code="TST"
+            )
+            self.letting = Letting.objects.create(
+                title="Test Letting",
+                address=address
+            )
 
     def test_letting_index_view(self):
         """
@@ -348,18 +331,6 @@ class LettingViewTest(TestCase):
         # Sauvegarder les fonctions originales
         from django.template import Engine
         original_find_template = Engine.find_template
-        original_capture_exception = sentry_sdk.capture_exception
-        original_capture_message = sentry_sdk.capture_message
-
-        sentry_calls = []
-
-        def mock_capture_exception(exc):
-            sentry_calls.append(('exception', exc))
-            return None
-
-        def mock_capture_message(message):
-            sentry_calls.append(('message', message))
-            return None
 
         def mock_find_template(self, name, dirs=None, skip=None):
             if name == 'lettings/index.html':
@@ -369,33 +340,22 @@ class LettingViewTest(TestCase):
         try:
             # Appliquer les mocks
             Engine.find_template = mock_find_template
-            sentry_sdk.capture_exception = mock_capture_exception
-            sentry_sdk.capture_message = mock_capture_message
 
             # Appeler la vue
-            response = self.client.get(reverse('lettings:index'))
+            with capture_reports() as reports:
+                response = self.client.get(reverse('lettings:index'))
 
             # Vérifier que le statut 500 est retourné
             self.assertEqual(response.status_code, 500)
 
-            # Vérifier que Sentry a bien été appelé
-            self.assertTrue(len(sentry_calls) >= 1)
-            self.assertEqual(sentry_calls[0][0], 'exception')
-            self.assertTrue(isinstance(sentry_calls[0][1], TemplateDoesNotExist))
-
-            # Vérifier le message spécifique
-            message_found = False
-            for call in sentry_calls:
-                if call[0] == 'message' and call[1] == "Erreur dans lettings.views index.":
-                    message_found = True
-                    break
-            self.assertTrue(message_found)
+            # Vérifier qu'un seul événement a été envoyé à Sentry, avec le message spécifique
+            self.assertEqual(len(reports), 1)
+            self.assertIsInstance(reports[0]['exception'], TemplateDoesNotExist)
+            self.assertEqual(reports[0]['message'], "Erreur dans lettings.views index.")
 
         finally:
             # Restaurer les fonctions originales
             Engine.find_template = original_find_template
-            sentry_sdk.capture_exception = original_capture_exception
-            sentry_sdk.capture_message = original_capture_message
 
     def test_letting_detail_view_exception(self):
         """
@@ -405,18 +365,6 @@ class LettingViewTest(TestCase):
         # Sauvegarder les fonctions originales
         from django.template import Engine
         original_find_template = Engine.find_template
-        original_capture_exception = sentry_sdk.capture_exception
-        original_capture_message = sentry_sdk.capture_message
-
-        sentry_calls = []
-
-        def mock_capture_exception(exc):
-            sentry_calls.append(('exception', exc))
-            return None
-
-        def mock_capture_message(message):
-            sentry_calls.append(('message', message))
-            return None
 
         def mock_find_template(self, name, dirs=None, skip=None):
             if name == 'lettings/letting.html':
@@ -426,30 +374,1164 @@ class LettingViewTest(TestCase):
         try:
             # Appliquer les mocks
             Engine.find_template = mock_find_template
-            sentry_sdk.capture_exception = mock_capture_exception
-            sentry_sdk.capture_message = mock_capture_message
 
             # Appeler la vue
-            response = self.client.get(reverse('lettings:letting', args=[self.letting.id]))
+            with capture_reports() as reports:
+                response = self.client.get(reverse('lettings:letting', args=[self.letting.id]))
 
             # Vérifier que le statut 500 est retourné
             self.assertEqual(response.status_code, 500)
 
-            # Vérifier que Sentry a bien été appelé
-            self.assertTrue(len(sentry_calls) >= 1)
-            self.assertEqual(sentry_calls[0][0], 'exception')
-            self.assertTrue(isinstance(sentry_calls[0][1], TemplateDoesNotExist))
-
-            # Vérifier le message spécifique
-            message_found = False
-            for call in sentry_calls:
-                if call[0] == 'message' and call[1] == "Erreur dans lettings.views index.":
-                    message_found = True
-                    break
-            self.assertTrue(message_found)
+            # Vérifier qu'un seul événement a été envoyé à Sentry, avec le message spécifique
+            self.assertEqual(len(reports), 1)
+            self.assertIsInstance(reports[0]['exception'], TemplateDoesNotExist)
+            self.assertEqual(reports[0]['message'], "Erreur dans lettings.views index.")
 
         finally:
             # Restaurer les fonctions originales
             Engine.find_template = original_find_template
-            sentry_sdk.capture_exception = original_capture_exception
-            sentry_sdk.capture_message = original_capture_message
+
+
+class LettingQueryBudgetTest(TestCase):
+    """
+    Test case for the number of queries run by the Letting views.
+    """
+
+    def setUp(self):
+        """
+        Sets up several lettings so that N+1 patterns would show up.
+        """
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lettings = []
+            for i in range(1, 6):
+                address = Address.objects.create(
+                    number=i,
+                    street=f"Street {i}",
+                    city="Test City",
+                    state="TS",
+                    zip_code=12345,
+                    country_iso_code="TST"
+                )
+                self.lettings.append(Letting.objects.create(title=f"Letting {i}", address=address))
+
+    def test_letting_index_within_budget(self):
+        """
+        Tests that the index view stays within its query budget.
+        """
+        with query_budget('lettings:index'):
+            response = self.client.get(reverse('lettings:index'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Letting 5")
+
+    def test_letting_detail_within_budget(self):
+        """
+        Tests that the detail view loads the summary of the letting in one query.
+        """
+        with query_budget('lettings:letting'):
+            response = self.client.get(
+                reverse('lettings:letting', args=[self.lettings[0].id])
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Street 1")
+
+
+@override_settings(LETTINGS_PAGE_SIZE=2)
+class LettingPaginationTest(TestCase):
+    """
+    Test case for the keyset pagination of the Letting index view.
+    """
+
+    def setUp(self):
+        """
+        Sets up five lettings, i.e. three pages of two lettings.
+        """
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lettings = []
+            for i in range(1, 6):
+                address = Address.objects.create(
+                    number=i,
+                    street=f"Street {i}",
+                    city="Test City",
+                    state="TS",
+                    zip_code=12345,
+                    country_iso_code="TST"
+                )
+                self.lettings.append(Letting.objects.create(title=f"Letting {i}", address=address))
+
+    def test_first_page(self):
+        """
+        Tests that the first page lists the first lettings and links to the next page only.
+        """
+        response = self.client.get(reverse('lettings:index'))
+        page = response.context['page']
+        self.assertEqual([letting.id for letting in page],
+                         [letting.id for letting in self.lettings[:2]])
+        self.assertFalse(page.has_previous)
+        self.assertTrue(page.has_next)
+        self.assertContains(response, f'href="?after={self.lettings[1].id}"')
+
+    def test_next_and_previous_pages(self):
+        """
+        Tests that the cursors are stable in both directions.
+        """
+        response = self.client.get(reverse('lettings:index'), {'after': self.lettings[1].id})
+        page = response.context['page']
+        self.assertEqual([letting.id for letting in page],
+                         [letting.id for letting in self.lettings[2:4]])
+        self.assertTrue(page.has_previous)
+        self.assertTrue(page.has_next)
+
+        response = self.client.get(reverse('lettings:index'), {'before': page.previous_cursor})
+        page = response.context['page']
+        self.assertEqual([letting.id for letting in page],
+                         [letting.id for letting in self.lettings[:2]])
+        self.assertFalse(page.has_previous)
+
+    def test_last_page(self):
+        """
+        Tests that the last page has no next link.
+        """
+        response = self.client.get(reverse('lettings:index'), {'after': self.lettings[3].id})
+        page = response.context['page']
+        self.assertEqual([letting.id for letting in page],
+                         [letting.id for letting in self.lettings[4:]])
+        self.assertFalse(page.has_next)
+        self.assertNotContains(response, 'rel="next"')
+
+    def test_invalid_cursor(self):
+        """
+        Tests that an invalid cursor falls back to the first page.
+        """
+        response = self.client.get(reverse('lettings:index'), {'after': 'abc'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([letting.id for letting in response.context['page']],
+                         [letting.id for letting in self.lettings[:2]])
+
+    def test_page_within_budget(self):
+        """
+        Tests that a deep page still runs a single query.
+        """
+        with query_budget('lettings:index'):
+            self.client.get(reverse('lettings:index'), {'after': self.lettings[2].id})
+
+
+class LettingPageCacheTest(TestCase):
+    """
+    Test case for the cache of the rendered Letting pages.
+    """
+
+    def setUp(self):
+        """
+        Sets up a letting whose pages are cached.
+        """
+        with self.captureOnCommitCallbacks(execute=True):
+            self.address = Address.objects.create(
+                number=1,
+                street="Test Street",
+                city="Test City",
+                state="TS",
+                zip_code=12345,
+                country_iso_code="TST"
+            )
+            self.letting = Letting.objects.create(title="Test Letting", address=self.address)
+        self.url = reverse('lettings:letting', args=[self.letting.id])
+
+    def test_second_hit_served_from_cache(self):
+        """
+        Tests that a page is rendered once and then served with its validators query only.
+        """
+        self.assertEqual(self.client.get(self.url)['X-Page-Cache'], 'MISS')
+        with query_budget('lettings:letting', budget=1):
+            response = self.client.get(self.url)
+        self.assertEqual(response['X-Page-Cache'], 'HIT')
+        self.assertContains(response, "Test Street")
+
+    def test_letting_save_invalidates(self):
+        """
+        Tests that saving a letting invalidates the index and detail pages.
+        """
+        self.client.get(reverse('lettings:index'))
+        self.client.get(self.url)
+        self.letting.title = "Renamed Letting"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.letting.save()
+
+        response = self.client.get(reverse('lettings:index'))
+        self.assertEqual(response['X-Page-Cache'], 'MISS')
+        self.assertContains(response, "Renamed Letting")
+        self.assertContains(self.client.get(self.url), "Renamed Letting")
+
+    def test_address_save_invalidates(self):
+        """
+        Tests that saving an address invalidates the detail page.
+        """
+        self.client.get(self.url)
+        self.address.street = "New Street"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.address.save()
+        self.assertContains(self.client.get(self.url), "New Street")
+
+    def test_letting_delete_invalidates(self):
+        """
+        Tests that deleting a letting removes it from the cached index page.
+        """
+        self.client.get(reverse('lettings:index'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.letting.delete()
+        self.assertNotContains(self.client.get(reverse('lettings:index')), "Test Letting")
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+
+class LettingPageCacheCommitTest(TransactionTestCase):
+    """
+    Test case for the invalidation of the Letting pages by a write in a
+    transaction, read meanwhile by another thread.
+    """
+
+    def setUp(self):
+        """
+        Sets up a letting.
+        """
+        address = Address.objects.create(
+            number=1, street="Test Street", city="Test City", state="TS", zip_code=12345,
+            country_iso_code="TST"
+        )
+        self.letting = Letting.objects.create(title="Test Letting", address=address)
+        self.url = reverse('lettings:letting', args=[self.letting.id])
+
+    def concurrent_get(self):
+        """
+        Returns the response to a GET sent from another thread, i.e. through
+        another connection, which only sees the committed rows.
+        """
+        responses = []
+        thread = threading.Thread(target=lambda: responses.append(Client().get(self.url)))
+        thread.start()
+        thread.join()
+        return responses[0]
+
+    def test_read_during_transaction_not_served_after_commit(self):
+        """
+        Tests that a page rendered from the old rows while the write is not
+        committed yet is not served once it is.
+        """
+        with transaction.atomic():
+            self.letting.title = "Renamed Letting"
+            self.letting.save()
+            response = self.concurrent_get()
+            self.assertEqual(response['X-Page-Cache'], 'MISS')
+            self.assertContains(response, "Test Letting")
+
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Page-Cache'], 'MISS')
+        self.assertContains(response, "Renamed Letting")
+
+
+class LettingConditionalGetTest(TestCase):
+    """
+    Test case for the ETag and Last-Modified validators of the Letting views.
+    """
+
+    def setUp(self):
+        """
+        Sets up a letting and fetches its pages once.
+        """
+        with self.captureOnCommitCallbacks(execute=True):
+            self.address = Address.objects.create(
+                number=1,
+                street="Test Street",
+                city="Test City",
+                state="TS",
+                zip_code=12345,
+                country_iso_code="TST"
+            )
+            self.letting = Letting.objects.create(title="Test Letting", address=self.address)
+        self.url = reverse('lettings:letting', args=[self.letting.id])
+
+    def test_validators_sent(self):
+        """
+        Tests that the index and detail pages send an ETag and a Last-Modified header.
+        """
+        for url in (reverse('lettings:index'), self.url):
+            response = self.client.get(url)
+            self.assertTrue(response.has_header('ETag'))
+            self.assertTrue(response.has_header('Last-Modified'))
+
+    def test_not_modified_without_rendering(self):
+        """
+        Tests that a matching If-None-Match gets a 304 from a single query.
+        """
+        etag = self.client.get(self.url)['ETag']
+        with query_budget('lettings:letting', budget=1):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+
+    def test_address_change_changes_etag(self):
+        """
+        Tests that updating the address changes the detail page ETag.
+        """
+        etag = self.client.get(self.url)['ETag']
+        self.address.street = "New Street"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.address.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_index_etag_follows_table_version(self):
+        """
+        Tests that the index ETag changes when any letting changes.
+        """
+        url = reverse('lettings:index')
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.letting.title = "Renamed Letting"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.letting.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_missing_letting_has_no_validators(self):
+        """
+        Tests that a missing letting still renders the 404 page.
+        """
+        response = self.client.get(reverse('lettings:letting', args=[self.letting.id + 1]))
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(response.has_header('ETag'))
+
+
+class LettingAsyncViewTest(TestCase):
+    """
+    Test case for the async versions of the Letting views, served under ASGI.
+    """
+
+    def setUp(self):
+        """
+        Sets up a letting and a factory of ASGI requests.
+        """
+        with self.captureOnCommitCallbacks(execute=True):
+            address = Address.objects.create(
+                number=1,
+                street="Test Street",
+                city="Test City",
+                state="TS",
+                zip_code=12345,
+                country_iso_code="TST"
+            )
+            self.letting = Letting.objects.create(title="Test Letting", address=address)
+        self.url = reverse('lettings:letting', args=[self.letting.id])
+        self.factory = AsyncRequestFactory()
+
+    @override_settings(PAGE_CACHE_ENABLED=False)
+    async def test_same_pages_as_sync_views(self):
+        """
+        Tests that the async views render the pages and validators of the sync views.
+        """
+        pages = (
+            (views.aindex, views.index, reverse('lettings:index') + '?state=TS', ()),
+            (views.aletting, views.letting, self.url, (self.letting.id,)),
+        )
+        for async_view, sync_view, url, args in pages:
+            response = await async_view(self.factory.get(url), *args)
+            expected = await sync_to_async(sync_view)(self.factory.get(url), *args)
+            self.assertEqual(response.status_code, 200)
+            self.assertContains(response, "Test Letting")
+            self.assertEqual(response.content, expected.content)
+            self.assertEqual(response['ETag'], expected['ETag'])
+
+    async def test_cached_and_not_modified(self):
+        """
+        Tests that the async detail view is cached, answers 304 to its ETag and
+        renders the 404 page of a missing letting.
+        """
+        first = await views.aletting(self.factory.get(self.url), self.letting.id)
+        self.assertEqual(first['X-Page-Cache'], 'MISS')
+        second = await views.aletting(self.factory.get(self.url), self.letting.id)
+        self.assertEqual(second['X-Page-Cache'], 'HIT')
+        self.assertEqual(second.content, first.content)
+
+        request = self.factory.get(self.url, headers={'If-None-Match': first['ETag']})
+        self.assertEqual((await views.aletting(request, self.letting.id)).status_code, 304)
+        missing = reverse('lettings:letting', args=[self.letting.id + 1])
+        response = await views.aletting(self.factory.get(missing), self.letting.id + 1)
+        self.assertEqual(response.status_code, 404)
+
+
+class LettingSearchTest(TestCase):
+    """
+    Test case for the full-text search of the lettings.
+    """
+
+    def create_letting(self, title, street, city, state, zip_code):
+        address = Address.objects.create(
+            number=1,
+            street=street,
+            city=city,
+            state=state,
+            zip_code=zip_code,
+            country_iso_code="USA"
+        )
+        return Letting.objects.create(title=title, address=address)
+
+    def setUp(self):
+        """
+        Sets up lettings matching different columns.
+        """
+        self.oceanview = self.create_letting(
+            "Oceanview Retreat", "Harvard Street", "Newport News", "VA", 23601
+        )
+        self.cottage = self.create_letting(
+            "Silo Studio Cottage", "Ocean Avenue", "Brunswick", "GA", 31525
+        )
+        self.dome = self.create_letting(
+            "Mushroom Dome", "Military Street", "Willoughby", "OH", 44094
+        )
+
+    def test_build_match(self):
+        """
+        Tests that every word becomes a quoted prefix term and punctuation is dropped.
+        """
+        self.assertEqual(build_match('Ocean "view'), '"ocean"* "view"*')
+        self.assertEqual(build_match(' !? '), '')
+
+    def test_build_tsquery(self):
+        """
+        Tests that every word becomes a PostgreSQL prefix term, all of them required.
+        """
+        self.assertEqual(build_tsquery('Ocean "view'), 'ocean:* & view:*')
+        self.assertEqual(build_tsquery(' !? '), '')
+
+    def test_unsupported_database(self):
+        """
+        Tests that the search is refused, rather than scanning the lettings,
+        on a database without a full-text index.
+        """
+        with mock.patch.object(connection, 'vendor', 'mysql'):
+            with self.assertRaises(NotSupportedError):
+                search_lettings("ocean")
+
+    def test_prefix_match(self):
+        """
+        Tests that a word prefix matches titles.
+        """
+        self.assertEqual(search_lettings("mush"), [self.dome])
+
+    def test_address_fields_match(self):
+        """
+        Tests that the street, city, state and zip code are searchable.
+        """
+        self.assertEqual(search_lettings("brunswick"), [self.cottage])
+        self.assertEqual(search_lettings("OH"), [self.dome])
+        self.assertEqual(search_lettings("236"), [self.oceanview])
+
+    def test_all_words_required(self):
+        """
+        Tests that every word of the query must match.
+        """
+        self.assertEqual(search_lettings("street newport"), [self.oceanview])
+
+    def test_title_ranked_first(self):
+        """
+        Tests that a title match ranks above a street match.
+        """
+        self.assertEqual(search_lettings("ocean"), [self.oceanview, self.cottage])
+
+    def test_index_follows_updates(self):
+        """
+        Tests that the index is maintained on save and delete.
+        """
+        self.dome.title = "Underground Hygge"
+        self.dome.save()
+        self.assertEqual(search_lettings("mushroom"), [])
+        self.assertEqual(search_lettings("hygge"), [self.dome])
+
+        address = self.cottage.address
+        address.city = "Marquette"
+        address.save()
+        self.assertEqual(search_lettings("marquette"), [self.cottage])
+
+        self.oceanview.address.delete()
+        self.assertEqual(search_lettings("oceanview"), [])
+
+    def test_search_view(self):
+        """
+        Tests that the search page lists the results within its query budget.
+        """
+        with query_budget('lettings:search'):
+            response = self.client.get(reverse('lettings:search'), {'q': "retreat"})
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, 'lettings/search.html')
+        self.assertContains(response, "Oceanview Retreat")
+        self.assertNotContains(response, "Mushroom Dome")
+
+    def test_search_view_no_result(self):
+        """
+        Tests that the search page tells when nothing matches.
+        """
+        response = self.client.get(reverse('lettings:search'), {'q': "castle"})
+        self.assertContains(response, "No lettings match")
+
+
+class LettingProximityTest(TestCase):
+    """
+    Test case for the proximity search of the lettings.
+    """
+
+    CENTROIDS = (
+        "zip_code,latitude,longitude\n"
+        "10001,40.7506,-73.9972\n"  # New York
+        "07030,40.7453,-74.0279\n"  # Hoboken, about 2 miles away
+        "11554,40.7196,-73.5560\n"  # East Meadow, about 23 miles away
+        "19103,39.9526,-75.1724\n"  # Philadelphia, about 83 miles away
+    )
+
+    def create_letting(self, title, zip_code):
+        address = Address.objects.create(
+            number=1,
+            street="Test Street",
+            city="Test City",
+            state="NY",
+            zip_code=zip_code,
+            country_iso_code="USA"
+        )
+        return Letting.objects.create(title=title, address=address)
+
+    def setUp(self):
+        """
+        Builds the geo index from a small centroids file and sets up lettings.
+        """
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as file:
+            file.write(self.CENTROIDS)
+        self.addCleanup(os.remove, file.name)
+        call_command('build_geo_index', '--source', file.name, stdout=StringIO())
+
+        self.manhattan = self.create_letting("Manhattan Loft", 10001)
+        self.hoboken = self.create_letting("Hoboken Flat", 7030)
+        self.meadow = self.create_letting("Meadow House", 11554)
+        self.philly = self.create_letting("Philly Studio", 19103)
+
+    def test_haversine(self):
+        """
+        Tests the distance between New York and Philadelphia.
+        """
+        self.assertAlmostEqual(haversine_miles(40.7506, -73.9972, 39.9526, -75.1724), 83, delta=1)
+
+    def test_cell_ranges_cover_radius(self):
+        """
+        Tests that the cells of a circle cover points at the radius in every direction.
+        """
+        lat_range, lon_range = cell_ranges(40.75, -74.0, 85)
+        philly = ZipCentroid.objects.get(zip_code=19103)
+        self.assertTrue(lat_range[0] <= philly.cell_lat <= lat_range[1])
+        self.assertTrue(lon_range[0] <= philly.cell_lon <= lon_range[1])
+
+    def test_zips_near(self):
+        """
+        Tests that only the zip codes within the radius are returned.
+        """
+        self.assertEqual(sorted(zips_near(10001, 10)), [7030, 10001])
+        self.assertEqual(sorted(zips_near(10001, 30)), [7030, 10001, 11554])
+        self.assertIsNone(zips_near(99999, 10))
+
+    def test_lettings_near_sorted_by_distance(self):
+        """
+        Tests that lettings come nearest first, with their distance.
+        """
+        results = lettings_near(11554, 150)
+        self.assertEqual(
+            [letting for letting, _ in results],
+            [self.meadow, self.manhattan, self.hoboken, self.philly]
+        )
+        self.assertEqual(results[0][1], 0)
+        self.assertEqual(len(lettings_near(11554, 150, limit=2)), 2)
+
+    def test_near_view(self):
+        """
+        Tests that the near page lists the lettings within the radius.
+        """
+        with query_budget('lettings:near'):
+            response = self.client.get(reverse('lettings:near'), {'zip': "10001", 'miles': 5})
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, 'lettings/near.html')
+        self.assertContains(response, "Hoboken Flat")
+        self.assertNotContains(response, "Meadow House")
+
+    def test_near_view_invalid_miles(self):
+        """
+        Tests that a radius that is not a finite number falls back to the default,
+        and that one out of range is clamped.
+        """
+        for miles, expected in (("nan", 25), ("inf", 25), ("-inf", 25), ("-5", 0), ("1e9", 250)):
+            with self.subTest(miles=miles):
+                response = self.client.get(
+                    reverse('lettings:near'), {'zip': "10001", 'miles': miles}
+                )
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.context['miles'], expected)
+
+    def test_near_view_unknown_zip(self):
+        """
+        Tests that the near page tells when the zip code is unknown.
+        """
+        response = self.client.get(reverse('lettings:near'), {'zip': "99999"})
+        self.assertContains(response, "Unknown zip code")
+
+    def test_bundled_centroids(self):
+        """
+        Tests that the bundled table covers the zip codes of the sample data.
+        """
+        out = StringIO()
+        call_command('build_geo_index', stdout=out)
+        self.assertIn("zip code centroids indexed", out.getvalue())
+        self.assertTrue(ZipCentroid.objects.filter(zip_code=31525).exists())
+        self.assertFalse(ZipCentroid.objects.filter(zip_code=10001).exists())
+
+
+class LettingFacetTest(TestCase):
+    """
+    Test case for the faceted browsing of the Letting index view.
+    """
+
+    def setUp(self):
+        """
+        Sets up lettings in three cities of two states and two countries.
+        """
+        places = [
+            ("Atlanta", "GA", "USA"),
+            ("Atlanta", "GA", "USA"),
+            ("Savannah", "GA", "USA"),
+            ("Austin", "TX", "USA"),
+            ("Toronto", "ON", "CAN"),
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lettings = []
+            for i, (city, state, country) in enumerate(places, start=1):
+                address = Address.objects.create(
+                    number=i,
+                    street=f"Street {i}",
+                    city=city,
+                    state=state,
+                    zip_code=10000 + i,
+                    country_iso_code=country
+                )
+                self.lettings.append(Letting.objects.create(title=f"Letting {i}", address=address))
+
+    def facet_values(self, facets, name):
+        facet = next(facet for facet in facets if facet['name'] == name)
+        return {value['value']: value['count'] for value in facet['values']}
+
+    def test_facet_counts(self):
+        """
+        Tests the number of lettings of each facet value.
+        """
+        facets = facet_counts(QueryDict())
+        self.assertEqual(self.facet_values(facets, 'country'), {"USA": 4, "CAN": 1})
+        self.assertEqual(self.facet_values(facets, 'state'), {"GA": 3, "TX": 1, "ON": 1})
+        self.assertEqual(
+            self.facet_values(facets, 'city'),
+            {"Atlanta": 2, "Savannah": 1, "Austin": 1, "Toronto": 1}
+        )
+
+    def test_counts_follow_other_facets(self):
+        """
+        Tests that each facet is counted among the lettings selected by the others.
+        """
+        facets = facet_counts(QueryDict('state=GA'))
+        self.assertEqual(self.facet_values(facets, 'city'), {"Atlanta": 2, "Savannah": 1})
+        self.assertEqual(self.facet_values(facets, 'country'), {"USA": 3})
+        # The selected facet keeps its alternatives
+        self.assertEqual(self.facet_values(facets, 'state'), {"GA": 3, "TX": 1, "ON": 1})
+
+    def test_summary_cached(self):
+        """
+        Tests that the summary is computed once and refreshed on Address save and delete.
+        """
+        facet_summary()
+        with CaptureQueriesContext(connection) as queries:
+            facet_summary()
+        self.assertEqual(len(queries), 0)
+
+        address = self.lettings[3].address
+        address.city = "Dallas"
+        with self.captureOnCommitCallbacks(execute=True):
+            address.save()
+        self.assertIn(("USA", "TX", "Dallas", 1), facet_summary())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lettings[4].address.delete()
+        self.assertNotIn("CAN", [row[0] for row in facet_summary()])
+
+    def test_index_filtered(self):
+        """
+        Tests that the index lists the lettings of the selected facets only.
+        """
+        response = self.client.get(reverse('lettings:index'), {'state': 'GA', 'city': 'Atlanta'})
+        self.assertEqual([letting.id for letting in response.context['page']],
+                         [letting.id for letting in self.lettings[:2]])
+        self.assertContains(response, "Atlanta <span")
+
+    @override_settings(LETTINGS_PAGE_SIZE=1)
+    def test_pagination_keeps_filters(self):
+        """
+        Tests that the pagination links keep the selected facets.
+        """
+        response = self.client.get(reverse('lettings:index'), {'state': 'GA'})
+        self.assertContains(response, f'href="?state=GA&amp;after={self.lettings[0].id}"')
+
+    def test_index_within_budget(self):
+        """
+        Tests that a filtered index stays within its query budget.
+        """
+        with query_budget('lettings:index'):
+            response = self.client.get(reverse('lettings:index'), {'country': 'USA'})
+        self.assertEqual(len(response.context['page']), 4)
+
+
+class LettingApiTest(TestCase):
+    """
+    Test case for the lettings endpoints of the JSON API.
+    """
+
+    def setUp(self):
+        """
+        Sets up five lettings.
+        """
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lettings = []
+            for i in range(1, 6):
+                address = Address.objects.create(
+                    number=i,
+                    street=f"Street {i}",
+                    city="Test City",
+                    state="TS",
+                    zip_code=12345,
+                    country_iso_code="TST"
+                )
+                self.lettings.append(Letting.objects.create(title=f"Letting {i}", address=address))
+
+    def test_list_default_fields(self):
+        """
+        Tests that the list embeds the address of each letting, in one query.
+        """
+        with query_budget('api:lettings'):
+            response = self.client.get(reverse('api:lettings'))
+        self.assertEqual(response['Content-Type'], 'application/json')
+        data = response.json()
+        self.assertEqual(len(data['results']), 5)
+        self.assertEqual(data['results'][0], {
+            'id': self.lettings[0].id,
+            'title': "Letting 1",
+            'address': {
+                'number': 1,
+                'street': "Street 1",
+                'city': "Test City",
+                'state': "TS",
+                'zip_code': 12345,
+                'country_iso_code': "TST",
+            },
+        })
+        self.assertIsNone(data['next'])
+
+    def test_sparse_fields(self):
+        """
+        Tests that only the requested fields, and the id, are returned.
+        """
+        response = self.client.get(reverse('api:lettings'), {'fields': 'title,address.city'})
+        self.assertEqual(response.json()['results'][0], {
+            'id': self.lettings[0].id,
+            'title': "Letting 1",
+            'address': {'city': "Test City"},
+        })
+
+    def test_unknown_field(self):
+        """
+        Tests that an unknown field is rejected.
+        """
+        response = self.client.get(reverse('api:lettings'), {'fields': 'owner'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'error': "Unknown field 'owner'."})
+
+    def test_pagination(self):
+        """
+        Tests that the 'next' cursor continues the list.
+        """
+        data = self.client.get(reverse('api:lettings'), {'limit': 2}).json()
+        self.assertEqual([result['id'] for result in data['results']],
+                         [letting.id for letting in self.lettings[:2]])
+        data = self.client.get(reverse('api:lettings'), {'limit': 2, 'after': data['next']}).json()
+        self.assertEqual(data['results'][0]['title'], "Letting 3")
+
+    def test_batch(self):
+        """
+        Tests that many lettings are fetched in one query, the unknown ids being reported.
+        """
+        ids = f"{self.lettings[3].id},{self.lettings[1].id},999"
+        with query_budget('api:lettings'):
+            response = self.client.get(reverse('api:lettings'), {'ids': ids, 'fields': 'title'})
+        self.assertEqual(response.json(), {
+            'results': [
+                {'id': self.lettings[1].id, 'title': "Letting 2"},
+                {'id': self.lettings[3].id, 'title': "Letting 4"},
+            ],
+            'missing': [999],
+        })
+
+    @override_settings(API_MAX_BATCH_SIZE=2)
+    def test_batch_too_large(self):
+        """
+        Tests that a batch larger than API_MAX_BATCH_SIZE is rejected.
+        """
+        response = self.client.get(reverse('api:lettings'), {'ids': '1,2,3'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(reverse('api:lettings'), {'ids': '1,a'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_detail(self):
+        """
+        Tests that a letting is fetched in one query, and that a missing one is a 404.
+        """
+        with query_budget('api:letting'):
+            response = self.client.get(reverse('api:letting', args=[self.lettings[0].id]))
+        self.assertEqual(response.json()['address']['street'], "Street 1")
+        response = self.client.get(reverse('api:letting', args=[999]))
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json(), {'error': "Not found."})
+
+
+class LettingExportTest(TestCase):
+    """
+    Test case for the streamed export of the lettings.
+    """
+
+    def setUp(self):
+        """
+        Sets up three lettings and logs a staff member in.
+        """
+        self.lettings = []
+        for i in range(1, 4):
+            address = Address.objects.create(
+                number=i,
+                street=f"Street {i}",
+                city="Test City",
+                state="TS",
+                zip_code=12345,
+                country_iso_code="TST"
+            )
+            self.lettings.append(Letting.objects.create(title=f"Letting {i}", address=address))
+        self.staff = User.objects.create_user(
+            username="staff", password="testpassword", is_staff=True
+        )
+        self.client.force_login(self.staff)
+
+    def test_csv(self):
+        """
+        Tests that the lettings are streamed as CSV, in primary key order.
+        """
+        response = self.client.get(reverse('api:lettings-export'))
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertIn('filename="lettings.csv"', response['Content-Disposition'])
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], "id,title,address.number,address.street,address.city,"
+                                   "address.state,address.zip_code,address.country_iso_code")
+        self.assertEqual(lines[1], f"{self.lettings[0].id},Letting 1,1,Street 1,Test City,"
+                                   f"TS,12345,TST")
+        self.assertEqual(len(lines), 4)
+
+    def test_ndjson_resumed(self):
+        """
+        Tests that an NDJSON export resumes after the given primary key.
+        """
+        response = self.client.get(
+            reverse('api:lettings-export'), {'format': 'ndjson', 'after': self.lettings[0].id}
+        )
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([row['title'] for row in rows], ["Letting 2", "Letting 3"])
+        self.assertEqual(rows[0]['address.city'], "Test City")
+
+    def test_gzip(self):
+        """
+        Tests that the export is compressed on the fly.
+        """
+        response = self.client.get(reverse('api:lettings-export'), {'gzip': '1'})
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertIn('filename="lettings.csv.gz"', response['Content-Disposition'])
+        content = gzip.decompress(b''.join(response.streaming_content)).decode()
+        self.assertIn("Letting 3", content)
+
+    def test_staff_only(self):
+        """
+        Tests that the export is refused to other users.
+        """
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('api:lettings-export')).status_code, 403)
+
+    def test_invalid_parameters(self):
+        """
+        Tests that an unknown format or an invalid cursor is rejected.
+        """
+        url = reverse('api:lettings-export')
+        self.assertEqual(self.client.get(url, {'format': 'xml'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'after': 'abc'}).status_code, 400)
+
+
+class LettingExportAsgiTest(TransactionTestCase):
+    """
+    Test case for the export of the lettings served by the ASGI handler,
+    which runs the views in threads of their own, seeing committed rows only.
+    """
+
+    def setUp(self):
+        """
+        Sets up three lettings and the session of a staff member.
+        """
+        for i in range(1, 4):
+            address = Address.objects.create(
+                number=i, street=f"Street {i}", city="Test City", state="TS", zip_code=12345,
+                country_iso_code="TST"
+            )
+            Letting.objects.create(title=f"Letting {i}", address=address)
+        client = Client()
+        client.force_login(User.objects.create_user(username="staff", is_staff=True))
+        self.session = client.cookies[settings.SESSION_COOKIE_NAME].value
+
+    async def test_streamed_while_read(self):
+        """
+        Tests that the first chunk is sent before the last row is read.
+        """
+        events = []
+        rows = LETTINGS_EXPORT.rows
+
+        def recorded_rows(*args, **kwargs):
+            for row in rows(*args, **kwargs):
+                events.append('row')
+                yield row
+
+        requests = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+
+        async def receive():
+            if requests:
+                return requests.pop()
+            # The client stays connected
+            await asyncio.Event().wait()
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                events.append(message['status'])
+            elif message.get('body'):
+                events.append('body')
+
+        path = reverse('api:lettings-export')
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+            'method': 'GET', 'scheme': 'http', 'path': path, 'raw_path': path.encode(),
+            'query_string': b'format=ndjson', 'root_path': '',
+            'headers': [
+                (b'host', b'testserver'),
+                (b'cookie', f'{settings.SESSION_COOKIE_NAME}={self.session}'.encode()),
+            ],
+            'client': ('127.0.0.1', 50000), 'server': ('testserver', 80),
+        }
+        with mock.patch.object(LETTINGS_EXPORT, 'rows', recorded_rows), \
+                mock.patch('oc_lettings_site.export.BUFFER_SIZE', 1):
+            await ASGIHandler()(scope, receive, send)
+        self.assertEqual(events[0], 200)
+        self.assertEqual(events.count('row'), 3)
+        self.assertLess(events.index('body'), len(events) - 1 - events[::-1].index('row'))
+
+
+class ImportLettingsTest(TestCase):
+    """
+    Test case for the 'import_lettings' command.
+    """
+
+    HEADER = ("id,title,address.number,address.street,address.city,"
+              "address.state,address.zip_code,address.country_iso_code\n")
+
+    def run_import(self, content, suffix='.csv'):
+        with tempfile.NamedTemporaryFile('w', suffix=suffix, delete=False) as file:
+            file.write(content)
+        self.addCleanup(os.remove, file.name)
+        out, err = StringIO(), StringIO()
+        call_command('import_lettings', file.name, '--batch-size', '2', stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_import_csv(self):
+        """
+        Tests that new lettings are created with their address, the invalid records skipped.
+        """
+        out, err = self.run_import(
+            self.HEADER
+            + ",Letting A,1,Street A,Austin,TX,73301,USA\n"
+            + ",Letting B,2,Street B,Boston,MA,2108,USA\n"
+            + ",Letting C,10000,Street C,Denver,C,80014,USA\n"
+        )
+        self.assertIn("Imported 2 records, rejected 1", out)
+        self.assertIn("Record 3 rejected, address.number: Ensure this value is less than", err)
+        self.assertIn("address.state: Ensure this value has at least 2 characters", err)
+        letting = Letting.objects.select_related('address').get(title="Letting B")
+        self.assertEqual(letting.address.zip_code, 2108)
+        self.assertEqual(Address.objects.count(), 2)
+
+    def test_upsert_by_id(self):
+        """
+        Tests that a record with an existing id updates the letting and its address.
+        """
+        address = Address.objects.create(
+            number=1, street="Old Street", city="Austin", state="TX",
+            zip_code=73301, country_iso_code="USA"
+        )
+        letting = Letting.objects.create(title="Old Title", address=address)
+        self.run_import(
+            '{"id": %d, "title": "New Title", "address": {"number": 5, "street": "New Street", '
+            '"city": "Austin", "state": "TX", "zip_code": 73301, "country_iso_code": "USA"}}\n'
+            % letting.id,
+            suffix='.ndjson'
+        )
+        letting.refresh_from_db()
+        self.assertEqual(letting.title, "New Title")
+        self.assertEqual(letting.address_id, address.id)
+        self.assertEqual(Address.objects.get().street, "New Street")
+
+    def test_sequence_follows_imported_ids(self):
+        """
+        Tests that a letting created after importing a new id gets the next one.
+        """
+        self.run_import(
+            '{"id": 500, "title": "Imported", "address": {"number": 5, "street": "New Street", '
+            '"city": "Austin", "state": "TX", "zip_code": 73301, "country_iso_code": "USA"}}\n',
+            suffix='.ndjson'
+        )
+        address = Address.objects.create(
+            number=1, street="Old Street", city="Austin", state="TX",
+            zip_code=73301, country_iso_code="USA"
+        )
+        self.assertGreater(Letting.objects.create(title="Created", address=address).id, 500)
+
+    def test_derived_data_refreshed(self):
+        """
+        Tests that the search index and the cached pages follow the imported rows.
+        """
+        self.client.get(reverse('lettings:index'))
+        self.run_import(self.HEADER + ",Imported Cabin,1,Pine Road,Austin,TX,73301,USA\n")
+        self.assertEqual([str(letting) for letting in search_lettings("cabin")],
+                         ["Imported Cabin"])
+        self.assertContains(self.client.get(reverse('lettings:index')), "Imported Cabin")
+
+    def test_invalidation_from_another_process(self):
+        """
+        Tests that the pages invalidated by a command, run in its own process,
+        are no longer served from the cache shared with the web workers.
+        """
+        url = reverse('lettings:index')
+        with tempfile.TemporaryDirectory() as directory:
+            shared = {'default': {
+                'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                'LOCATION': directory,
+            }}
+            with override_settings(CACHES=shared):
+                self.client.get(url)
+                self.assertEqual(self.client.get(url)['X-Page-Cache'], 'HIT')
+                subprocess.run(
+                    [sys.executable, '-c', INVALIDATE_LETTINGS],
+                    env={
+                        **os.environ, 'CACHE_BACKEND': 'file', 'CACHE_LOCATION': directory,
+                        'DJANGO_SETTINGS_MODULE': 'oc_lettings_site.settings',
+                    },
+                    cwd=settings.BASE_DIR, check=True,
+                )
+                self.assertEqual(self.client.get(url)['X-Page-Cache'], 'MISS')
+
+    def test_export_round_trip(self):
+        """
+        Tests that an export can be imported back.
+        """
+        self.run_import(self.HEADER + ",Letting A,1,Street A,Austin,TX,73301,USA\n")
+        export = b''.join(LETTINGS_EXPORT.stream()).decode()
+        Letting.objects.all().delete()
+        self.run_import(export)
+        self.assertEqual(Letting.objects.get().title, "Letting A")
+
+
+class LettingSummaryTest(TestCase):
+    """
+    Test case for the LettingSummary read model, its signals and the
+    'rebuild_letting_summaries' command.
+    """
+
+    def setUp(self):
+        """
+        Sets up a letting with its address.
+        """
+        with self.captureOnCommitCallbacks(execute=True):
+            self.address = Address.objects.create(
+                number=12, street="Pine Road", city="Austin", state="TX", zip_code=73301,
+                country_iso_code="USA"
+            )
+            self.letting = Letting.objects.create(title="Sunny loft", address=self.address)
+
+    def test_summary_follows_changes(self):
+        """
+        Tests that the summary is written, updated and deleted with the letting and its address.
+        """
+        summary = LettingSummary.objects.get(id=self.letting.id)
+        self.assertEqual(
+            (summary.title, summary.address_line, summary.city, summary.zip_code),
+            ("Sunny loft", "12 Pine Road", "Austin", 73301)
+        )
+        self.assertEqual(summary.address_line, str(self.address))
+
+        self.address.street = "Oak Avenue"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.address.save()
+        summary = LettingSummary.objects.get(id=self.letting.id)
+        self.assertEqual(summary.address_line, "12 Oak Avenue")
+        self.assertEqual(summary.updated_at, self.address.updated_at)
+        self.letting.title = "Shady loft"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.letting.save()
+        self.assertEqual(LettingSummary.objects.get(id=self.letting.id).title, "Shady loft")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.address.delete()
+        self.assertFalse(LettingSummary.objects.exists())
+
+    def test_pages_read_summary(self):
+        """
+        Tests that the index, detail and API read the summaries without any join.
+        """
+        urls = [
+            reverse('lettings:index'),
+            reverse('lettings:index') + '?state=TX',
+            reverse('lettings:letting', args=[self.letting.id]),
+            reverse('api:lettings'),
+            reverse('api:letting', args=[self.letting.id]),
+        ]
+        with override_settings(PAGE_CACHE_ENABLED=False):
+            for url in urls:
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(url)
+                self.assertContains(response, "Sunny loft")
+                reads = [query['sql'] for query in queries if 'lettings_' in query['sql']]
+                self.assertTrue(reads)
+                self.assertFalse([sql for sql in reads if 'JOIN' in sql], url)
+        self.assertContains(self.client.get(urls[2]), "12 Pine Road")
+
+    def test_rebuild_command(self):
+        """
+        Tests that the command rebuilds stale and missing summaries.
+        """
+        other = Letting.objects.create(title="Cabin", address=Address.objects.create(
+            number=3, street="Lake Road", city="Denver", state="CO", zip_code=80201,
+            country_iso_code="USA"
+        ))
+        LettingSummary.objects.filter(id=self.letting.id).update(title="Stale")
+        LettingSummary.objects.filter(id=other.id).delete()
+
+        out = StringIO()
+        call_command('rebuild_letting_summaries', '--chunk-size', '1', stdout=out)
+        self.assertIn("2 letting summaries rebuilt", out.getvalue())
+        self.assertEqual(
+            sorted(LettingSummary.objects.values_list('title', 'address_line')),
+            [("Cabin", "3 Lake Road"), ("Sunny loft", "12 Pine Road")]
+        )
@@ -1,342 +1,189 @@
-import os
-import importlib.util
-from django.test import TestCase
+import time
+from io import StringIO
+from unittest import mock
+import pytest
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TransactionTestCase
 
 
-def load_migration_module():
-    """
-    Dynamically loads the migration module.
-    """
-    migration_path = os.path.join('lettings', 'migrations', '0002_migrate_data.py')
-    spec = importlib.util.spec_from_file_location("migration_module", migration_path)
-    migration_module = importlib.util.module_from_spec(spec)
-    spec.loader.exec_module(migration_module)
-    return migration_module
-
-
-class MockModel:
-    """
-    Base class for mock models used in tests.
-    """
-    def __init__(self, **kwargs):
-        for key, value in kwargs.items():
-            setattr(self, key, value)
-
-    def save(self):
-        """Simulated save method"""
-        pass
+# Minimum number of rows per second copied by the data migration, checked by
+# 'pytest -m benchmark' only: a shared or slow runner would fail it at random
+MIN_ROWS_PER_SECOND = 50000
+BENCHMARK_ROWS = 100000
 
 
-class MockQuerySet:
+class MigrationTestCase(TransactionTestCase):
     """
-    Simulates a Django QuerySet.
+    Base test case moving the test database back to 'migrate_from' before each
+    test, and forward to the latest migrations after it.
     """
-    def __init__(self, items=None):
-        self.items = items or []
-
-    def all(self):
-        return self.items
-
-    def get(self, **kwargs):
-        # Simple simulation of .get() - returns the first matching item
-        for item in self.items:
-            match = True
-            for key, value in kwargs.items():
-                # Special case for address_id
-                if key == 'id' and hasattr(item, 'id') and item.id == value:
-                    continue
-                elif not hasattr(item, key) or getattr(item, key) != value:
-                    match = False
-                    break
-            if match:
-                return item
-
-
-class MockModelManager:
-    """
-    Simulates a Django Manager.
-    """
-    def __init__(self, model_class, items=None):
-        self.model_class = model_class
-        self.queryset = MockQuerySet(items)
-
-    def all(self):
-        return self.queryset.all()
-
-    def get(self, **kwargs):
-        return self.queryset.get(**kwargs)
+    migrate_from = []
+    # Tables emptied before migrating forward again
+    tables = ('lettings_letting', 'lettings_address')
 
+    def setUp(self):
+        self.migrate(self.migrate_from)
 
-class MockAppRegistry:
-    """
-    Simulates the Django application registry.
-    """
-    def __init__(self):
-        self.models = {}
+    def tearDown(self):
+        # Emptying the tables first keeps the forward migrations fast
+        with connection.cursor() as cursor:
+            for table in self.tables:
+                cursor.execute(f"DELETE FROM {connection.ops.quote_name(table)}")
+        self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes())
 
-    def register_model(self, app_label, model_name, model_class, instances=None):
+    def migrate(self, targets):
         """
-        Registers a mock model with optional instances.
+        Migrates the test database to the given migrations.
+        Returns:
+            apps: The app registry of the resulting historical state.
         """
-        key = (app_label, model_name)
-        model_class.objects = MockModelManager(model_class, instances)
-        self.models[key] = model_class
+        self.output = StringIO()
+        with mock.patch('sys.stdout', self.output):
+            MigrationExecutor(connection).migrate(targets)
+        loader = MigrationExecutor(connection).loader
+        return loader.project_state(list(loader.applied_migrations)).apps
 
-    def get_model(self, app_label, model_name):
-        """
-        Retrieves a mock model.
-        """
-        key = (app_label, model_name)
-        return self.models.get(key)
+    def table_names(self):
+        return connection.introspection.table_names()
 
 
-class MockSchemaEditor:
-    """
-    Simulates the Django schema editor.
-    """
-    def __init__(self):
-        self.deleted_models = []
-
-    def delete_model(self, model):
-        """
-        Simulates model deletion.
-        """
-        self.deleted_models.append(model)
-
-
-class TestDataMigration(TestCase):
+class TestDataMigration(MigrationTestCase):
     """
     Complete test for data migration between applications.
     """
+    migrate_from = [('lettings', '0001_initial')]
 
-    def setUp(self):
+    def insert_old_rows(self, count):
         """
-        Sets up the test environment with mock models and data.
+        Fills the old 'oc_lettings_site' tables with synthetic addresses and lettings.
         """
-        # Create mock model classes with special methods
-        class OldAddress(MockModel):
-            def save(self):
-                # Ensure the object is available in the queryset
-                self.objects.queryset.items.append(self)
-
-        class OldLetting(MockModel):
-            def save(self):
-                # Ensure the object is available in the queryset
-                self.objects.queryset.items.append(self)
-
-        class NewAddress(MockModel):
-            def save(self):
-                # Ensure the object is available in the queryset
-                self.objects.queryset.items.append(self)
-
-        class NewLetting(MockModel):
-            def save(self):
-                # Ensure the object is available in the queryset
-                self.objects.queryset.items.append(self)
-
-        # Create data instances
-        self.old_address1 = OldAddress(
-            id=1,
-            number=1,
-            street="123 Main St",
-            city="Test City",
-            state="TS",
-            zip_code=12345,
-            country_iso_code="TST"
-        )
-
-        self.old_address2 = OldAddress(
-            id=2,
-            number=2,
-            street="456 Oak Ave",
-            city="Another City",
-            state="AC",
-            zip_code=67890,
-            country_iso_code="ANT"
-        )
-
-        self.old_letting1 = OldLetting(
-            id=1,
-            title="Nice Apartment",
-            address=self.old_address1,
-            address_id=1
-        )
-
-        self.old_letting2 = OldLetting(
-            id=2,
-            title="Cozy House",
-            address=self.old_address2,
-            address_id=2
-        )
-
-        # Ensure that address objects also have their IDs accessible
-        # for the get() function in forward_func
-        for addr in [self.old_address1, self.old_address2]:
-            addr.pk = addr.id
-
-        # Create the mock app registry
-        self.mock_apps = MockAppRegistry()
-
-        # Register models with their instances
-        self.mock_apps.register_model('oc_lettings_site', 'Address', OldAddress,
-                                      [self.old_address1, self.old_address2])
-        self.mock_apps.register_model('oc_lettings_site', 'Letting', OldLetting,
-                                      [self.old_letting1, self.old_letting2])
-        self.mock_apps.register_model('lettings', 'Address', NewAddress)
-        self.mock_apps.register_model('lettings', 'Letting', NewLetting)
-
-        # Create a mock schema editor
-        self.mock_schema_editor = MockSchemaEditor()
-
-        # Load migration functions
-        self.migration_module = load_migration_module()
-        self.forward_func = self.migration_module.forward_func
-        self.reverse_func = self.migration_module.reverse_func
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                "INSERT INTO oc_lettings_site_address "
+                "(id, number, street, city, state, zip_code, country_iso_code) "
+                "VALUES (%s, %s, %s, %s, %s, %s, %s)",
+                [
+                    (i, i % 9999 + 1, f"{i} Main St", "Test City", "TS", 12345, "TST")
+                    for i in range(1, count + 1)
+                ]
+            )
+            cursor.executemany(
+                "INSERT INTO oc_lettings_site_letting (id, title, address_id) VALUES (%s, %s, %s)",
+                [(i, f"Letting {i}", i) for i in range(1, count + 1)]
+            )
 
     def test_forward_migration(self):
         """
         Tests the forward migration (from oc_lettings_site to lettings).
         """
-        # Call the migration function
-        self.forward_func(self.mock_apps, self.mock_schema_editor)
-
-        # Verify that NewAddress models were created with the correct data
-        new_addresses = self.mock_apps.get_model('lettings', 'Address').objects.all()
-        assert len(new_addresses) == 2, "Le nombre d'adresses migrées ne correspond pas"
-
-        # Verify the attributes of the first address
-        new_address1 = next((a for a in new_addresses if a.id == 1), None)
-        assert new_address1 is not None, "L'adresse id=1 n'a pas été migrée"
-        assert new_address1.number == 1
-        assert new_address1.street == "123 Main St"
+        self.insert_old_rows(2)
+        apps = self.migrate([('lettings', '0002_migrate_data')])
+
+        # Verify that the addresses were copied with the correct data
+        NewAddress = apps.get_model('lettings', 'Address')
+        assert NewAddress.objects.count() == 2, "Le nombre d'adresses migrées ne correspond pas"
+        new_address1 = NewAddress.objects.get(id=1)
+        assert new_address1.number == 2
+        assert new_address1.street == "1 Main St"
         assert new_address1.city == "Test City"
         assert new_address1.state == "TS"
         assert new_address1.zip_code == 12345
         assert new_address1.country_iso_code == "TST"
 
-        # Verify that NewLetting models were created with the correct data
-        new_lettings = self.mock_apps.get_model('lettings', 'Letting').objects.all()
-        assert len(new_lettings) == 2, "Le nombre de locations migrées ne correspond pas"
+        # Verify that the lettings were copied with the same address IDs
+        NewLetting = apps.get_model('lettings', 'Letting')
+        assert NewLetting.objects.count() == 2, "Le nombre de locations migrées ne correspond pas"
+        new_letting2 = NewLetting.objects.get(id=2)
+        assert new_letting2.title == "Letting 2"
+        assert new_letting2.address_id == 2
 
-        # Verify the attributes of the first letting
-        new_letting1 = next((l for l in new_lettings if l.id == 1), None)
-        assert new_letting1 is not None, "La location id=1 n'a pas été migrée"
-        assert new_letting1.title == "Nice Apartment"
-
-        # Verify that the old models were deleted
-        deleted_models = self.mock_schema_editor.deleted_models
-        assert len(deleted_models) == 2, "Tous les anciens modèles n'ont pas été supprimés"
-
-        # Verify the class names of the deleted models
-        deleted_model_names = [model.__name__ for model in deleted_models]
-        assert 'OldAddress' in deleted_model_names
-        assert 'OldLetting' in deleted_model_names
+        # Verify that the old tables were deleted
+        assert 'oc_lettings_site_address' not in self.table_names()
+        assert 'oc_lettings_site_letting' not in self.table_names()
 
     def test_reverse_migration(self):
         """
         Tests the reverse migration (from lettings to oc_lettings_site).
         """
-        # To test the reverse migration, we must first have data in the new models
-        # Let's reset the apps registry
-        new_address1 = self.mock_apps.get_model('lettings', 'Address')(
-            id=1,
-            number=1,
-            street="123 Main St",
-            city="Test City",
-            state="TS",
-            zip_code=12345,
-            country_iso_code="TST"
-        )
-
-        new_address2 = self.mock_apps.get_model('lettings', 'Address')(
-            id=2,
-            number=2,
-            street="456 Oak Ave",
-            city="Another City",
-            state="AC",
-            zip_code=67890,
-            country_iso_code="ANT"
-        )
-
-        new_letting1 = self.mock_apps.get_model('lettings', 'Letting')(
-            id=1,
-            title="Nice Apartment",
-            address=new_address1,
-            address_id=1
-        )
-
-        new_letting2 = self.mock_apps.get_model('lettings', 'Letting')(
-            id=2,
-            title="Cozy House",
-            address=new_address2,
-            address_id=2
-        )
-
-        # Update the instances in the registry
-        NewAddress = self.mock_apps.get_model('lettings', 'Address')
-        NewLetting = self.mock_apps.get_model('lettings', 'Letting')
-
-        # Reset the collections
-        self.mock_apps.register_model('lettings', 'Address', NewAddress, [])
-        self.mock_apps.register_model('lettings', 'Letting', NewLetting, [])
-
-        # Add the instances
-        for addr in [new_address1, new_address2]:
-            addr.pk = addr.id
-            NewAddress.objects.queryset.items.append(addr)
-
-        for letting in [new_letting1, new_letting2]:
-            letting.pk = letting.id
-            NewLetting.objects.queryset.items.append(letting)
-
-        # Reset the old collections
-        self.mock_apps.register_model(
-            'oc_lettings_site',
-            'Address',
-            self.mock_apps.get_model('oc_lettings_site', 'Address'),
-            []
-        )
-        self.mock_apps.register_model(
-            'oc_lettings_site',
-            'Letting',
-            self.mock_apps.get_model('oc_lettings_site', 'Letting'),
-            []
+        self.insert_old_rows(2)
+        self.migrate([('lettings', '0002_migrate_data')])
+        apps = self.migrate([('lettings', '0001_initial')])
+
+        # Verify that the old tables were recreated with the data
+        OldAddress = apps.get_model('oc_lettings_site', 'Address')
+        OldLetting = apps.get_model('oc_lettings_site', 'Letting')
+        assert OldAddress.objects.count() == 2, (
+            "Le nombre d'adresses migrées vers l'ancien modèle ne correspond pas"
         )
+        assert OldAddress.objects.get(id=1).street == "1 Main St"
+        assert OldLetting.objects.get(id=1).title == "Letting 1"
 
-        # Reset the schema editor
-        self.mock_schema_editor = MockSchemaEditor()
+        # Verify that the new tables were emptied
+        assert apps.get_model('lettings', 'Letting').objects.count() == 0
+        assert apps.get_model('lettings', 'Address').objects.count() == 0
 
-        # Call the reverse migration function
-        self.reverse_func(self.mock_apps, self.mock_schema_editor)
+    def test_forward_migration_chunks(self):
+        """
+        Tests the forward migration of 100k lettings, copied in several chunks.
+        """
+        self.insert_old_rows(BENCHMARK_ROWS)
+        apps = self.migrate([('lettings', '0002_migrate_data')])
 
-        # Verify that OldAddress models were created with the correct data
-        old_addresses = self.mock_apps.get_model('oc_lettings_site', 'Address').objects.all()
-        assert len(old_addresses) == 2, (
-            "Le nombre d'adresses migrées vers l'ancien modèle ne correspond pas"
+        assert apps.get_model('lettings', 'Address').objects.count() == BENCHMARK_ROWS
+        assert apps.get_model('lettings', 'Letting').objects.count() == BENCHMARK_ROWS
+        assert f"Copied {BENCHMARK_ROWS}/{BENCHMARK_ROWS} rows to lettings_letting" in (
+            self.output.getvalue()
         )
+        last_letting = apps.get_model('lettings', 'Letting').objects.get(id=BENCHMARK_ROWS)
+        assert last_letting.title == f"Letting {BENCHMARK_ROWS}"
+        assert last_letting.address.street == f"{BENCHMARK_ROWS} Main St"
 
-        # Verify the attributes of the first address
-        old_address1 = next((a for a in old_addresses if a.id == 1), None)
-        assert old_address1 is not None, "L'adresse id=1 n'a pas été migrée vers l'ancien modèle"
-        assert old_address1.number == 1
-        assert old_address1.street == "123 Main St"
-
-        # Verify that OldLetting models were created with the correct data
-        old_lettings = self.mock_apps.get_model('oc_lettings_site', 'Letting').objects.all()
-        assert len(old_lettings) == 2, (
-            "Le nombre de locations migrées vers l'ancien modèle ne correspond pas"
+    @pytest.mark.benchmark
+    def test_forward_migration_throughput(self):
+        """
+        Benchmarks the forward migration on a synthetic dataset of 100k lettings.
+        """
+        self.insert_old_rows(BENCHMARK_ROWS)
+        started = time.perf_counter()
+        apps = self.migrate([('lettings', '0002_migrate_data')])
+        elapsed = time.perf_counter() - started
+
+        assert apps.get_model('lettings', 'Letting').objects.count() == BENCHMARK_ROWS
+        rows_per_second = 2 * BENCHMARK_ROWS / elapsed
+        assert rows_per_second >= MIN_ROWS_PER_SECOND, (
+            f"{rows_per_second:,.0f} lignes/s, {MIN_ROWS_PER_SECOND:,} attendues"
         )
 
-        # Verify the attributes of the first letting
-        old_letting1 = next((l for l in old_lettings if l.id == 1), None)
-        assert old_letting1 is not None, "La location id=1 n'a pas été migrée vers l'ancien modèle"
-        assert old_letting1.title == "Nice Apartment"
 
-        # Verify that the new models were deleted
-        deleted_models = self.mock_schema_editor.deleted_models
-        assert len(deleted_models) == 2, "Tous les nouveaux modèles n'ont pas été supprimés"
+class TestLettingSummaryMigration(MigrationTestCase):
+    """
+    Test for the migration creating and filling the LettingSummary read model.
+    """
+    migrate_from = [('lettings', '0007_facet_summary_index')]
 
-        # Verify the class names of the deleted models
-        deleted_model_names = [model.__name__ for model in deleted_models]
-        assert 'NewAddress' in deleted_model_names
-        assert 'NewLetting' in deleted_model_names
+    def test_forward_migration(self):
+        """
+        Tests that the existing lettings get their summary.
+        """
+        apps = self.migrate(self.migrate_from)
+        Address = apps.get_model('lettings', 'Address')
+        Letting = apps.get_model('lettings', 'Letting')
+        for i in range(1, 4):
+            address = Address.objects.create(
+                number=i, street="Main St", city="Test City", state="TS", zip_code=12345,
+                country_iso_code="TST"
+            )
+            Letting.objects.create(title=f"Letting {i}", address=address)
+
+        apps = self.migrate([('lettings', '0008_lettingsummary')])
+        LettingSummary = apps.get_model('lettings', 'LettingSummary')
+        assert LettingSummary.objects.count() == 3
+        summary = LettingSummary.objects.get(title="Letting 2")
+        assert summary.address_line == "2 Main St"
+        assert (summary.city, summary.state, summary.zip_code) == ("Test City", "TS", 12345)
+        assert summary.id == Letting.objects.get(title="Letting 2").id
+
+        # The reverse migration drops the table
+        self.migrate(self.migrate_from)
+        assert 'lettings_lettingsummary' not in self.table_names()
@@ -1,14 +1,26 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
 
+# The async views are served under ASGI only (see settings.ASYNC_VIEWS)
+if settings.ASYNC_VIEWS:
+    index, letting = views.aindex, views.aletting
+else:
+    index, letting = views.index, views.letting
+
 app_name = 'lettings'
 urlpatterns = [
-    path('', views.index, name='index'),
-    path('<int:letting_id>/', views.letting, name='letting'),
+    path('', index, name='index'),
+    path('search/', views.search, name='search'),
+    path('near/', views.near, name='near'),
+    path('<int:letting_id>/', letting, name='letting'),
 ]
 """
 URL configuration for the Lettings app.
-- '' → Calls the index view and lists all lettings.
-- '<int:letting_id>/' → Calls the letting view for a specific letting by ID.
+- '' → Calls the index view (aindex under ASGI) and lists all lettings.
+- 'search/' → Calls the search view and lists the lettings matching the query.
+- 'near/' → Calls the near view and lists the lettings around a zip code.
+- '<int:letting_id>/' → Calls the letting view (aletting under ASGI) for a specific
+  letting by ID.
 """
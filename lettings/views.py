@@ -1,32 +1,118 @@
-import sentry_sdk
+import math
+from django.conf import settings
 from django.http import Http404
-from django.shortcuts import render, get_object_or_404
-from .models import Letting
+from django.shortcuts import aget_object_or_404, get_object_or_404
+from django.views.decorators.http import condition
+from oc_lettings_site import reporting, versioning
+from oc_lettings_site.page_cache import cached_page
+from oc_lettings_site.pagination import KeysetPaginator
+from oc_lettings_site.sentry_config import render, span
+from .facets import afacet_summary, facet_counts, filter_lettings, selected_filters
+from .geo import MAX_RADIUS_MILES, lettings_near
+from .models import Letting, LettingSummary, Address, ZipCentroid
+from .search import search_lettings
 
 
+def letting_validators(letting_id):
+    """
+    Computes the ETag and Last-Modified of a letting page from the latest
+    change of the letting or of its address, kept by its summary.
+    """
+    updated_at = LettingSummary.objects.filter(id=letting_id).values_list(
+        'updated_at', flat=True
+    ).first()
+    if updated_at is None:
+        return None
+    return versioning.make_etag('lettings:letting', letting_id, updated_at), updated_at
+
+
+index_etag, index_last_modified = versioning.cached_validators(
+    versioning.table_validators(
+        'lettings:index', Letting, Address, extra=lambda: (settings.LETTINGS_PAGE_SIZE,)
+    )
+)
+letting_etag, letting_last_modified = versioning.cached_validators(letting_validators)
+search_etag, search_last_modified = versioning.cached_validators(
+    versioning.table_validators('lettings:search', Letting, Address)
+)
+near_etag, near_last_modified = versioning.cached_validators(
+    versioning.table_validators('lettings:near', Letting, Address, ZipCentroid)
+)
+
+
+@condition(etag_func=index_etag, last_modified_func=index_last_modified)
+@cached_page('lettings')
 def index(request):
     """
-    Renders the index page displaying a list of all lettings.
+    Renders the index page displaying a page of lettings ordered by id.
+    The lettings are filtered by the 'country', 'state' and 'city' facet query
+    parameters, and the page is selected with the 'after' or 'before' cursors.
+    Reads the id and title columns of the LettingSummary read model only.
+    Args:
+        request (HttpRequest): The HTTP request object.
+    Returns:
+        HttpResponse: The rendered 'lettings/index.html' template with the lettings page
+            and the facet counts.
+    """
+    try:
+        # Lettings.index view logic
+        with span('db', "lettings.views index"):
+            lettings = filter_lettings(
+                LettingSummary.objects.only('id', 'title'), selected_filters(request.GET)
+            )
+            paginator = KeysetPaginator(lettings, 'id', settings.LETTINGS_PAGE_SIZE, key_type=int)
+            page = paginator.get_page(request.GET)
+            facets = facet_counts(request.GET)
+        context = {
+            'lettings_list': page.object_list,
+            'page': page,
+            'facets': facets,
+        }
+        return render(request, 'lettings/index.html', context)
+    except Exception as e:
+        # Capturing sentry exception
+        reporting.report_exception(e, "Erreur dans lettings.views index.")
+        return render(request, '500.html', status=500)
+
+
+@versioning.async_condition(index_etag, index_last_modified)
+@cached_page('lettings')
+async def aindex(request):
+    """
+    Async version of the index view, served under ASGI (see ASYNC_VIEWS):
+    the lettings page and the facet summary are read with the async ORM.
     Args:
         request (HttpRequest): The HTTP request object.
     Returns:
-        HttpResponse: The rendered 'lettings/index.html' template with the lettings list.
+        HttpResponse: The rendered 'lettings/index.html' template with the lettings page
+            and the facet counts.
     """
     try:
         # Lettings.index view logic
-        lettings_list = Letting.objects.all()
-        context = {'lettings_list': lettings_list}
+        with span('db', "lettings.views index"):
+            lettings = filter_lettings(
+                LettingSummary.objects.only('id', 'title'), selected_filters(request.GET)
+            )
+            paginator = KeysetPaginator(lettings, 'id', settings.LETTINGS_PAGE_SIZE, key_type=int)
+            page = await paginator.aget_page(request.GET)
+            facets = facet_counts(request.GET, await afacet_summary())
+        context = {
+            'lettings_list': page.object_list,
+            'page': page,
+            'facets': facets,
+        }
         return render(request, 'lettings/index.html', context)
     except Exception as e:
         # Capturing sentry exception
-        sentry_sdk.capture_exception(e)
-        sentry_sdk.capture_message("Erreur dans lettings.views index.")
+        reporting.report_exception(e, "Erreur dans lettings.views index.")
         return render(request, '500.html', status=500)
 
 
+@condition(etag_func=letting_etag, last_modified_func=letting_last_modified)
+@cached_page('lettings')
 def letting(request, letting_id):
     """
-    Renders the detail page for a specific letting.
+    Renders the detail page for a specific letting, from its summary.
     Args:
         request (HttpRequest): The HTTP request object.
         letting_id (int): The id of the letting to display.
@@ -35,10 +121,11 @@ def letting(request, letting_id):
     """
     try:
         # Lettings.letting view logic
-        letting = get_object_or_404(Letting, id=letting_id)
+        with span('db', "lettings.views letting"):
+            letting = get_object_or_404(LettingSummary, id=letting_id)
         context = {
             'title': letting.title,
-            'address': letting.address,
+            'letting': letting,
         }
         return render(request, 'lettings/letting.html', context)
     except Http404:
@@ -46,6 +133,98 @@ def letting(request, letting_id):
         return render(request, '404.html', status=404)
     except Exception as e:
         # Capturing other exception
-        sentry_sdk.capture_exception(e)
-        sentry_sdk.capture_message("Erreur dans lettings.views index.")
+        reporting.report_exception(e, "Erreur dans lettings.views index.")
+        return render(request, '500.html', status=500)
+
+
+@versioning.async_condition(letting_etag, letting_last_modified)
+@cached_page('lettings')
+async def aletting(request, letting_id):
+    """
+    Async version of the letting view, served under ASGI (see ASYNC_VIEWS):
+    the summary is read with the async ORM.
+    Args:
+        request (HttpRequest): The HTTP request object.
+        letting_id (int): The id of the letting to display.
+    Returns:
+        HttpResponse: The rendered 'lettings/letting.html' template with the letting's data.
+    """
+    try:
+        # Lettings.letting view logic
+        with span('db', "lettings.views letting"):
+            letting = await aget_object_or_404(LettingSummary, id=letting_id)
+        context = {
+            'title': letting.title,
+            'letting': letting,
+        }
+        return render(request, 'lettings/letting.html', context)
+    except Http404:
+        # Letting doesn't exist, 404
+        return render(request, '404.html', status=404)
+    except Exception as e:
+        # Capturing other exception
+        reporting.report_exception(e, "Erreur dans lettings.views letting.")
+        return render(request, '500.html', status=500)
+
+
+@condition(etag_func=search_etag, last_modified_func=search_last_modified)
+@cached_page('lettings')
+def search(request):
+    """
+    Renders the search page listing the lettings matching the 'q' query parameter
+    by title or address, best matches first.
+    Args:
+        request (HttpRequest): The HTTP request object.
+    Returns:
+        HttpResponse: The rendered 'lettings/search.html' template with the results.
+    """
+    try:
+        # Lettings.search view logic
+        query = request.GET.get('q', '').strip()
+        with span('db', "lettings.views search"):
+            results = search_lettings(query, limit=settings.SEARCH_RESULTS_LIMIT) if query else []
+        context = {'query': query, 'results': results}
+        return render(request, 'lettings/search.html', context)
+    except Exception as e:
+        # Capturing sentry exception
+        reporting.report_exception(e, "Erreur dans lettings.views search.")
+        return render(request, '500.html', status=500)
+
+
+@condition(etag_func=near_etag, last_modified_func=near_last_modified)
+@cached_page('lettings')
+def near(request):
+    """
+    Renders the page listing the lettings within 'miles' miles of the 'zip' zip code,
+    nearest first.
+    Args:
+        request (HttpRequest): The HTTP request object.
+    Returns:
+        HttpResponse: The rendered 'lettings/near.html' template with the results.
+    """
+    try:
+        # Lettings.near view logic
+        zip_code = request.GET.get('zip', '').strip()
+        try:
+            miles = float(request.GET.get('miles', settings.NEAR_DEFAULT_MILES))
+        except ValueError:
+            miles = settings.NEAR_DEFAULT_MILES
+        # 'nan' and 'inf' parse as floats
+        if not math.isfinite(miles):
+            miles = settings.NEAR_DEFAULT_MILES
+        miles = min(max(miles, 0), MAX_RADIUS_MILES)
+        results = None
+        if zip_code.isdigit():
+            with span('db', "lettings.views near"):
+                results = lettings_near(int(zip_code), miles, limit=settings.SEARCH_RESULTS_LIMIT)
+        context = {
+            'zip_code': zip_code,
+            'miles': miles,
+            'results': results,
+            'unknown_zip': bool(zip_code) and results is None,
+        }
+        return render(request, 'lettings/near.html', context)
+    except Exception as e:
+        # Capturing sentry exception
+        reporting.report_exception(e, "Erreur dans lettings.views near.")
         return render(request, '500.html', status=500)
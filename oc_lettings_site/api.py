@@ -0,0 +1,211 @@
+import functools
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from . import reporting
+from .export import FORMATS
+from .pagination import KeysetPaginator
+from .sentry_config import span
+
+
+class ApiError(Exception):
+    """
+    Raised by the API views to answer with a JSON error.
+    """
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def api_view(view):
+    """
+    Decorator turning the errors of an API view into JSON responses.
+    ApiError gives its own status, any other exception is reported to Sentry
+    and answered with a status 500.
+    """
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            return view(request, *args, **kwargs)
+        except ApiError as e:
+            return JsonResponse({'error': e.message}, status=e.status)
+        except Exception as e:
+            # Capturing sentry exception
+            reporting.report_exception(e, f"Erreur dans {view.__module__} {view.__name__}.")
+            return JsonResponse({'error': "Internal server error."}, status=500)
+    return wrapper
+
+
+class Resource:
+    """
+    Read-only JSON resource over a model, answering each request with a single
+    query that reads only the requested columns through values(): no model
+    instance is built and no template is rendered.
+
+    Fields are declared as {'name': 'lookup'}, a dotted name ('address.city')
+    being nested in the output and its prefix ('address') selecting the whole group.
+    """
+
+    def __init__(self, queryset, key, fields, default_fields, batch_param, key_type=str):
+        """
+        Args:
+            queryset (QuerySet): The objects exposed by the resource.
+            key (str): The name of the unique field identifying an object, always returned.
+            fields (dict): The lookup of each exposed field by name.
+            default_fields (tuple): The fields returned when 'fields' is not given.
+            batch_param (str): The query parameter listing the keys of a batch lookup.
+            key_type (callable): Converts a key from the URL or query string.
+        """
+        self.queryset = queryset
+        self.key = key
+        self.fields = fields
+        self.default_fields = default_fields
+        self.batch_param = batch_param
+        self.key_type = key_type
+
+    def select_fields(self, query_params):
+        """
+        Returns the fields requested by the 'fields' query parameter.
+        Raises:
+            ApiError: If a field is unknown.
+        """
+        requested = [name.strip() for name in query_params.get('fields', '').split(',')]
+        requested = [name for name in requested if name]
+        if not requested:
+            requested = self.default_fields
+
+        selected = [self.key]
+        for name in requested:
+            matching = [
+                field for field in self.fields
+                if field == name or field.startswith(f'{name}.')
+            ]
+            if not matching:
+                raise ApiError(f"Unknown field '{name}'.")
+            selected.extend(field for field in matching if field not in selected)
+        return selected
+
+    def serialize(self, row, fields):
+        """
+        Returns the JSON object of a values() row, nesting the dotted fields.
+        """
+        data = {}
+        for field in fields:
+            *groups, name = field.split('.')
+            target = data
+            for group in groups:
+                target = target.setdefault(group, {})
+            target[name] = row[self.fields[field]]
+        return data
+
+    def _rows(self, queryset, fields):
+        return queryset.values(*[self.fields[field] for field in fields])
+
+    def _parse_key(self, value):
+        try:
+            return self.key_type(value)
+        except (TypeError, ValueError):
+            raise ApiError(f"Invalid {self.key} '{value}'.")
+
+    def list(self, request):
+        """
+        Returns a page of objects ordered by key, selected with the 'after' cursor
+        and 'limit' query parameters, or the objects whose keys are listed in the
+        batch parameter, e.g. '?ids=1,2,3'.
+        Args:
+            request (HttpRequest): The HTTP request object.
+        Returns:
+            JsonResponse: The 'results', with the 'next' cursor or the 'missing' keys.
+        """
+        fields = self.select_fields(request.GET)
+        lookup = self.fields[self.key]
+
+        batch = request.GET.get(self.batch_param)
+        if batch is not None:
+            keys = [self._parse_key(value) for value in batch.split(',') if value.strip()]
+            if len(keys) > settings.API_MAX_BATCH_SIZE:
+                raise ApiError(
+                    f"At most {settings.API_MAX_BATCH_SIZE} {self.batch_param} per request."
+                )
+            with span('db', f"api {self.queryset.model._meta.label_lower} batch"):
+                rows = list(self._rows(
+                    self.queryset.filter(**{f'{lookup}__in': keys}).order_by(lookup), fields
+                ))
+            results = [self.serialize(row, fields) for row in rows]
+            found = {result[self.key] for result in results}
+            return JsonResponse({
+                'results': results,
+                'missing': [key for key in dict.fromkeys(keys) if key not in found],
+            })
+
+        try:
+            limit = int(request.GET.get('limit', settings.API_PAGE_SIZE))
+        except ValueError:
+            raise ApiError("The limit must be an integer.")
+        limit = min(max(limit, 1), settings.API_MAX_BATCH_SIZE)
+        paginator = KeysetPaginator(
+            self._rows(self.queryset, fields), lookup, limit, key_type=self.key_type
+        )
+        with span('db', f"api {self.queryset.model._meta.label_lower} list"):
+            page = paginator.get_page(request.GET)
+        return JsonResponse({
+            'results': [self.serialize(row, fields) for row in page],
+            'next': page.next_cursor if page.has_next else None,
+        })
+
+    def detail(self, request, key):
+        """
+        Returns the object with the given key.
+        Args:
+            request (HttpRequest): The HTTP request object.
+            key: The key of the object.
+        Returns:
+            JsonResponse: The object, or an error with status 404.
+        """
+        fields = self.select_fields(request.GET)
+        with span('db', f"api {self.queryset.model._meta.label_lower} detail"):
+            row = self._rows(
+                self.queryset.filter(**{self.fields[self.key]: self._parse_key(key)}), fields
+            ).first()
+        if row is None:
+            raise ApiError("Not found.", status=404)
+        return JsonResponse(self.serialize(row, fields))
+
+
+def export_response(request, export):
+    """
+    Streams an export to a staff member, with the 'format' ('csv' or 'ndjson'),
+    'gzip' and 'after' (last exported primary key) query parameters.
+    Args:
+        request (HttpRequest): The HTTP request object.
+        export (Export): The export to stream.
+    Returns:
+        StreamingHttpResponse: The export, sent as an attachment.
+    Raises:
+        ApiError: If the user is not staff or a parameter is invalid.
+    """
+    if not request.user.is_staff:
+        raise ApiError("Staff access required.", status=403)
+    format = request.GET.get('format', 'csv')
+    if format not in FORMATS:
+        raise ApiError(f"Unknown format '{format}'.")
+    after = request.GET.get('after')
+    if after is not None:
+        try:
+            after = int(after)
+        except ValueError:
+            raise ApiError("The after cursor must be an integer.")
+    gzip = request.GET.get('gzip', '').lower() in ('1', 'true', 'yes')
+
+    # Under ASGI, a sync iterator would be read whole before the first byte is sent
+    stream = export.astream if isinstance(request, ASGIRequest) else export.stream
+    response = StreamingHttpResponse(
+        stream(format, after=after, gzip=gzip),
+        content_type='application/gzip' if gzip else FORMATS[format][0],
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename="{export.filename(format, gzip)}"'
+    )
+    return response
@@ -0,0 +1,24 @@
+from django.urls import path
+from lettings import api as lettings_api
+from profiles import api as profiles_api
+
+
+app_name = 'api'
+urlpatterns = [
+    path('lettings/', lettings_api.letting_list, name='lettings'),
+    path('lettings/-/export/', lettings_api.letting_export, name='lettings-export'),
+    path('lettings/<int:letting_id>/', lettings_api.letting_detail, name='letting'),
+    path('profiles/', profiles_api.profile_list, name='profiles'),
+    # Under '-/', which a single username segment never matches
+    path('profiles/-/export/', profiles_api.profile_export, name='profiles-export'),
+    path('profiles/<str:username>/', profiles_api.profile_detail, name='profile'),
+]
+"""
+URL configuration of the JSON API, version 1.
+- 'lettings/' → Returns a page of lettings, or the lettings listed in 'ids'.
+- 'lettings/-/export/' → Streams every letting as CSV or NDJSON (staff only).
+- 'lettings/<int:letting_id>/' → Returns a letting by ID.
+- 'profiles/' → Returns a page of profiles, or the profiles listed in 'usernames'.
+- 'profiles/-/export/' → Streams every profile as CSV or NDJSON (staff only).
+- 'profiles/<str:username>/' → Returns a profile by username.
+"""
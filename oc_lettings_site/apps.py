@@ -9,3 +9,6 @@ class OCLettingsSiteConfig(AppConfig):
 
     def ready(self):
         import oc_lettings_site.signals  # noqa: F401
+        from django.core.signals import request_started
+        from oc_lettings_site.sentry_config import init_on_request
+        request_started.connect(init_on_request, dispatch_uid='oc_lettings_site.sentry')
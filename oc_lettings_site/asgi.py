@@ -1,11 +1,17 @@
 import os
 from django.core.asgi import get_asgi_application
+from oc_lettings_site.sentry_config import ensure_sentry
 
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'oc_lettings_site.settings')
+# Served by an event loop: the async versions of the pages are routed (see settings.ASYNC_VIEWS)
+os.environ.setdefault('ASYNC_VIEWS', 'True')
+# Initialized in the serving process only, before the application is loaded
+ensure_sentry()
 application = get_asgi_application()
 """
 Sets the default Django settings module for
 the 'oc_lettings_site' project and exposes
-the ASGI application callable as 'application'.
+the ASGI application callable as 'application',
+serving the async views.
 """
@@ -0,0 +1,641 @@
+import http.client
+import io
+import math
+import os
+import random
+import resource
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from urllib.parse import urlencode, urlsplit
+from wsgiref.util import setup_testing_defaults
+from django.db import connection
+from django.urls import URLResolver, get_resolver, reverse
+from oc_lettings_site.database import SQLITE_PROFILES, sqlite_options, sqlite_pragmas
+
+
+# The admin is only benchmarked through its login page
+ADMIN_ROUTES = ('admin:login',)
+
+# Streaming exports read whole tables, these routes are restricted to the staff
+SKIPPED_ROUTES = ('api:lettings-export', 'api:profiles-export', 'profiling')
+
+# Relative increase of the p95 latency, or decrease of the throughput, seen as a regression
+DEFAULT_TOLERANCE = 0.2
+
+# Latency differences below this many milliseconds are noise
+MIN_LATENCY_DELTA_MS = 1.0
+
+# SERVER_MODE of gunicorn.conf.py by benchmarked server: sync workers or uvicorn workers
+SERVER_MODES = {'gunicorn': 'wsgi', 'uvicorn': 'asgi'}
+
+# Pages served by async views under ASGI, compared by the concurrency benchmark
+CONCURRENCY_ROUTES = ('lettings:index', 'lettings:letting', 'profiles:index', 'profiles:profile')
+
+
+def named_routes(resolver=None, namespace=''):
+    """
+    Lists the named routes of the URL configuration.
+    Yields:
+        tuple: The route name, with its namespace, and the names of its parameters.
+    """
+    resolver = resolver or get_resolver()
+    for pattern in resolver.url_patterns:
+        if isinstance(pattern, URLResolver):
+            prefix = f'{namespace}{pattern.namespace}:' if pattern.namespace else namespace
+            yield from named_routes(pattern, prefix)
+        elif pattern.name:
+            yield f'{namespace}{pattern.name}', tuple(getattr(pattern.pattern, 'converters', {}))
+
+
+def sample_urls(routes=None):
+    """
+    Builds a URL for each benchmarked route, with parameters taken from the
+    first letting and profile of the database.
+    Args:
+        routes (list): The route names to benchmark, every route by default.
+    Returns:
+        dict: The URL by route name.
+    """
+    from lettings.models import Letting
+    from profiles.models import Profile
+
+    letting = Letting.objects.select_related('address').order_by('id').first()
+    profile = Profile.objects.select_related('user').order_by('id').first()
+    kwargs = {
+        'letting_id': letting.id if letting else None,
+        'username': profile.user.username if profile else None,
+    }
+    queries = {
+        'lettings:search': {'q': letting.title.split()[0] if letting else 'a'},
+        'lettings:near': {'zip': letting.address.zip_code if letting else '', 'miles': 50},
+        'profiles:autocomplete': {'q': kwargs['username'][:2] if profile else 'a'},
+    }
+
+    urls = {}
+    for name, parameters in named_routes():
+        if routes is not None:
+            if name not in routes:
+                continue
+        elif name in SKIPPED_ROUTES or (name.startswith('admin:') and name not in ADMIN_ROUTES):
+            continue
+        if any(kwargs.get(parameter) is None for parameter in parameters):
+            continue
+        url = reverse(name, kwargs={parameter: kwargs[parameter] for parameter in parameters})
+        if name in queries:
+            url = f'{url}?{urlencode(queries[name])}'
+        urls[name] = url
+    return urls
+
+
+def percentile(values, fraction):
+    """
+    Returns the nearest-rank percentile of the sorted values.
+    """
+    if not values:
+        return None
+    # Rounded first, so that 0.95 * 100 is rank 95 and not 96
+    rank = math.ceil(round(fraction * len(values), 6))
+    return values[min(len(values), max(rank, 1)) - 1]
+
+
+class WSGIDriver:
+    """
+    Sends the requests to the WSGI application of oc_lettings_site.wsgi in
+    the current process, counting the SQL queries of each request.
+    """
+    counts_queries = True
+
+    def __init__(self):
+        from oc_lettings_site.wsgi import application
+        self.application = application
+
+    def request(self, url):
+        """
+        Returns the status code and the number of queries of a GET request.
+        """
+        path, _, query = url.partition('?')
+        environ = {
+            'PATH_INFO': path,
+            'QUERY_STRING': query,
+            'HTTP_HOST': 'localhost',
+            'SERVER_NAME': 'localhost',
+            'wsgi.input': io.BytesIO(),
+        }
+        setup_testing_defaults(environ)
+        statuses = []
+        queries = []
+
+        def start_response(status, headers, exc_info=None):
+            statuses.append(int(status.split()[0]))
+
+        def count(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count):
+            response = self.application(environ, start_response)
+            try:
+                for _ in response:
+                    pass
+            finally:
+                response.close()
+        return statuses[0], len(queries)
+
+    def peak_rss_mb(self):
+        # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+class HTTPDriver:
+    """
+    Sends the requests to a running server, one keep-alive connection per thread.
+    """
+    counts_queries = False
+
+    def __init__(self, base_url, server_pid=None):
+        parts = urlsplit(base_url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.server_pid = server_pid
+        self.local = threading.local()
+
+    def request(self, url):
+        """
+        Returns the status code of a GET request, and None as number of queries.
+        """
+        for attempt in range(2):
+            if getattr(self.local, 'connection', None) is None:
+                self.local.connection = http.client.HTTPConnection(
+                    self.host, self.port, timeout=30
+                )
+            try:
+                self.local.connection.request('GET', url, headers={'Host': 'localhost'})
+                response = self.local.connection.getresponse()
+                response.read()
+                return response.status, None
+            except (http.client.HTTPException, OSError):
+                # The server closed the kept-alive connection, retry on a new one
+                self.local.connection.close()
+                self.local.connection = None
+                if attempt:
+                    raise
+
+    def peak_rss_mb(self):
+        """
+        Returns the peak RSS of the server process and its workers, None if unknown.
+        """
+        if self.server_pid is None:
+            return None
+        peaks = [_status_kb(pid, 'VmHWM') for pid in self._processes()]
+        peaks = [peak for peak in peaks if peak is not None]
+        return round(max(peaks) / 1024, 1) if peaks else None
+
+    def rss_mb(self):
+        """
+        Returns the current RSS of the server process and its workers added
+        up, the memory the server holds, None if unknown.
+        """
+        if self.server_pid is None:
+            return None
+        sizes = [_status_kb(pid, 'VmRSS') for pid in self._processes()]
+        sizes = [size for size in sizes if size is not None]
+        return round(sum(sizes) / 1024, 1) if sizes else None
+
+    def _processes(self):
+        return [self.server_pid, *_children(self.server_pid)]
+
+
+def _children(pid):
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as file:
+            return [int(child) for child in file.read().split()]
+    except OSError:
+        return []
+
+
+def _status_kb(pid, field):
+    # VmHWM is the peak resident set size of a Linux process, VmRSS the current one
+    try:
+        with open(f'/proc/{pid}/status') as file:
+            for line in file:
+                if line.startswith(f'{field}:'):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+
+
+def start_gunicorn(workers, port=None, timeout=30, server_mode='wsgi'):
+    """
+    Starts gunicorn with the repository configuration on a local port.
+    Args:
+        workers (int): The number of workers.
+        port (int): The local port, a free one by default.
+        timeout (float): The seconds given to the server to start.
+        server_mode (str): The SERVER_MODE of gunicorn.conf.py, 'wsgi' for the
+            sync workers or 'asgi' for the uvicorn workers.
+    Returns:
+        tuple: The gunicorn process and the base URL of the server.
+    """
+    if port is None:
+        with socket.socket() as probe:
+            probe.bind(('127.0.0.1', 0))
+            port = probe.getsockname()[1]
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--config', 'gunicorn.conf.py',
+         '--bind', f'127.0.0.1:{port}', '--workers', str(workers)],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        env=dict(os.environ, SERVER_MODE=server_mode),
+    )
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("gunicorn exited during startup.")
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return process, f'http://127.0.0.1:{port}'
+        except OSError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("gunicorn did not start in time.")
+
+
+def benchmark_url(driver, url, requests, concurrency, warmup=0):
+    """
+    Sends the requests of one route and measures them.
+    Args:
+        driver: The WSGIDriver or HTTPDriver sending the requests.
+        url (str): The URL of the route.
+        requests (int): The number of measured requests.
+        concurrency (int): The number of concurrent clients.
+        warmup (int): The number of requests sent before measuring.
+    Returns:
+        dict: The latency percentiles in milliseconds, the throughput, the
+            number of errors and the mean number of queries per request.
+    """
+    for _ in range(warmup):
+        driver.request(url)
+
+    def timed(_):
+        started = time.perf_counter()
+        status, queries = driver.request(url)
+        return time.perf_counter() - started, status, queries
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(timed, range(requests)))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(result[0] * 1000 for result in results)
+    queries = [result[2] for result in results if result[2] is not None]
+    return {
+        'url': url,
+        'requests': requests,
+        'errors': sum(1 for result in results if result[1] >= 400),
+        'p50_ms': round(percentile(latencies, 0.50), 3),
+        'p95_ms': round(percentile(latencies, 0.95), 3),
+        'p99_ms': round(percentile(latencies, 0.99), 3),
+        'requests_per_second': round(requests / elapsed, 1),
+        'queries_per_request': round(sum(queries) / len(queries), 2) if queries else None,
+    }
+
+
+def run_benchmark(driver, urls, requests=200, concurrency=4, warmup=10):
+    """
+    Benchmarks each route in turn.
+    Returns:
+        dict: The results, ready to be stored as JSON.
+    """
+    return {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'commit': _git_commit(),
+        'driver': type(driver).__name__,
+        'concurrency': concurrency,
+        'routes': {
+            name: benchmark_url(driver, url, requests, concurrency, warmup)
+            for name, url in urls.items()
+        },
+        'peak_rss_mb': driver.peak_rss_mb(),
+    }
+
+
+def compare(baseline, results, tolerance=DEFAULT_TOLERANCE):
+    """
+    Compares results with a baseline run.
+    Returns:
+        list: The description of each regression, empty if none.
+    """
+    regressions = []
+    for name, result in results['routes'].items():
+        before = baseline.get('routes', {}).get(name)
+        if before is None:
+            continue
+        if (result['p95_ms'] > before['p95_ms'] * (1 + tolerance)
+                and result['p95_ms'] - before['p95_ms'] > MIN_LATENCY_DELTA_MS):
+            regressions.append(f"{name}: p95 {before['p95_ms']} ms -> {result['p95_ms']} ms")
+        if result['requests_per_second'] < before['requests_per_second'] * (1 - tolerance):
+            regressions.append(
+                f"{name}: {before['requests_per_second']} -> {result['requests_per_second']} req/s"
+            )
+        queries = (before['queries_per_request'], result['queries_per_request'])
+        if None not in queries and queries[1] > queries[0]:
+            regressions.append(f"{name}: {queries[0]} -> {queries[1]} queries per request")
+        if result['errors'] > before['errors']:
+            regressions.append(f"{name}: {before['errors']} -> {result['errors']} errors")
+    return regressions
+
+
+def sqlite_read_sql():
+    """
+    Returns the query of the lettings list read by the SQLite benchmark, with
+    an OFFSET parameter.
+    """
+    from lettings.models import Address, Letting
+
+    letting, address = Letting._meta, Address._meta
+    return (
+        f'SELECT l.id, l.title, a.city, a.state FROM {letting.db_table} l '
+        f'JOIN {address.db_table} a ON a.id = l.address_id '
+        'ORDER BY l.id LIMIT 20 OFFSET ?'
+    )
+
+
+def _sqlite_connect(path, options):
+    connection = sqlite3.connect(path, isolation_level=None)
+    for command in options.get('init_command', '').split(';'):
+        if command.strip():
+            connection.execute(command)
+    return connection
+
+
+def sqlite_workload(path, options, persistent, role, start, duration, read_sql, rows):
+    """
+    Reads or writes a SQLite database, like one gunicorn worker would, from
+    start to start + duration (time.time() values).
+    Args:
+        path (str): The database file.
+        options (dict): The OPTIONS of the sqlite3 backend, see sqlite_options.
+        persistent (bool): False to open a connection per operation, as
+            with CONN_MAX_AGE = 0.
+        role (str): 'read' or 'write'.
+        read_sql (str): The read query, see sqlite_read_sql.
+        rows (int): The number of rows of the read table.
+    Returns:
+        dict: The sorted latencies in seconds, and the number of operations
+            which failed on a lock.
+    """
+    begin = f"BEGIN {options.get('transaction_mode', 'DEFERRED')}"
+    latencies, errors = [], 0
+    connection = _sqlite_connect(path, options) if persistent else None
+    time.sleep(max(0.0, start - time.time()))
+    while time.time() < start + duration:
+        started = time.perf_counter()
+        try:
+            if not persistent:
+                connection = _sqlite_connect(path, options)
+            if role == 'read':
+                connection.execute(read_sql, (random.randrange(max(rows, 1)),)).fetchall()
+            else:
+                connection.execute(begin)
+                connection.execute(
+                    'INSERT INTO benchmark_writes (value) VALUES (?)', (random.random(),)
+                )
+                connection.execute('COMMIT')
+            latencies.append(time.perf_counter() - started)
+        except sqlite3.OperationalError:
+            errors += 1
+            if connection is not None and connection.in_transaction:
+                connection.execute('ROLLBACK')
+        finally:
+            if not persistent and connection is not None:
+                connection.close()
+                connection = None
+    if persistent:
+        connection.close()
+    return {'latencies': sorted(latencies), 'errors': errors}
+
+
+def _latency_summary(latencies, duration):
+    return {
+        'per_second': round(len(latencies) / duration, 1),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3) if latencies else None,
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3) if latencies else None,
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3) if latencies else None,
+    }
+
+
+def run_sqlite_benchmark(source, profiles=tuple(SQLITE_PROFILES), readers=4, writers=1,
+                         duration=5.0):
+    """
+    Runs concurrent reader and writer processes on a copy of a SQLite
+    database, once per profile, with persistent connections for the
+    'performance' profile only, as in the settings.
+    Args:
+        source (str): The database file, left untouched.
+        profiles (tuple): The profiles compared.
+        readers (int): The reading processes.
+        writers (int): The writing processes.
+        duration (float): The seconds of each run.
+    Returns:
+        dict: The read and write throughput and latencies of each profile.
+    """
+    from lettings.models import Letting
+
+    read_sql = sqlite_read_sql()
+    results = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'commit': _git_commit(),
+        'readers': readers,
+        'writers': writers,
+        'duration': duration,
+        'profiles': {},
+    }
+    for profile in profiles:
+        options = sqlite_options(sqlite_pragmas(profile))
+        persistent = profile == 'performance'
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'benchmark.sqlite3')
+            # A consistent copy, reset to the rollback journal before the profile applies
+            original, copy = sqlite3.connect(source), sqlite3.connect(path)
+            original.backup(copy)
+            original.close()
+            copy.execute('PRAGMA journal_mode=DELETE')
+            copy.execute('CREATE TABLE benchmark_writes (id INTEGER PRIMARY KEY, value REAL)')
+            rows = copy.execute(f'SELECT COUNT(*) FROM {Letting._meta.db_table}').fetchone()[0]
+            copy.close()
+            connection = _sqlite_connect(path, options)
+            journal_mode = connection.execute('PRAGMA journal_mode').fetchone()[0]
+            connection.close()
+
+            roles = ['read'] * readers + ['write'] * writers
+            start = time.time() + 0.5
+            with ProcessPoolExecutor(max_workers=len(roles)) as pool:
+                runs = list(pool.map(
+                    sqlite_workload, [path] * len(roles), [options] * len(roles),
+                    [persistent] * len(roles), roles, [start] * len(roles),
+                    [duration] * len(roles), [read_sql] * len(roles), [rows] * len(roles),
+                ))
+        latencies = {'read': [], 'write': []}
+        for run, role in zip(runs, roles):
+            latencies[role] += run['latencies']
+        results['profiles'][profile] = {
+            'journal_mode': journal_mode,
+            'persistent_connections': persistent,
+            'reads': _latency_summary(sorted(latencies['read']), duration),
+            'writes': _latency_summary(sorted(latencies['write']), duration),
+            'errors': sum(run['errors'] for run in runs),
+        }
+    return results
+
+
+def slow_request(host, port, url, seconds, timeout=30):
+    """
+    Sends a GET request like a client on a slow network: its header lines
+    are trickled over the given seconds, then the response is read.
+    Returns:
+        int: The status code.
+    """
+    lines = [f'GET {url} HTTP/1.1', 'Host: localhost', 'Accept: text/html', 'Connection: close']
+    with socket.create_connection((host, port), timeout=timeout) as client:
+        for line in lines:
+            client.sendall(f'{line}\r\n'.encode())
+            time.sleep(seconds / len(lines))
+        client.sendall(b'\r\n')
+        with client.makefile('rb') as response:
+            status = int(response.readline().split()[1])
+            response.read()
+    return status
+
+
+def run_concurrency_benchmark(driver, urls, clients=8, slow_clients=4, duration=5.0,
+                              slow_seconds=1.0):
+    """
+    Sends requests to a running server for the given duration, from clients
+    sending each request at once while slow clients trickle theirs, and
+    samples the memory the server holds meanwhile.
+    Args:
+        driver (HTTPDriver): The driver of the server, given its process id.
+        urls (list): The URLs requested in turn.
+        clients (int): The clients sending their requests at once.
+        slow_clients (int): The clients taking slow_seconds to send each request.
+        duration (float): The seconds of the run.
+        slow_seconds (float): The seconds taken by a slow client to send a request.
+    Returns:
+        dict: The latency percentiles and throughput of the fast clients, the
+            errors, the slow requests served, the peak total RSS of the server
+            and the throughput per 100 MB of it.
+    """
+    deadline = time.monotonic() + duration
+    peak_rss = []
+
+    def fast_client(position):
+        latencies, errors = [], 0
+        while time.monotonic() < deadline:
+            url = urls[(position + len(latencies) + errors) % len(urls)]
+            started = time.perf_counter()
+            try:
+                status, _ = driver.request(url)
+            except (http.client.HTTPException, OSError):
+                status = None
+            if status is None or status >= 400:
+                errors += 1
+            else:
+                latencies.append((time.perf_counter() - started) * 1000)
+        return latencies, errors
+
+    def slow_client(position):
+        served, errors = 0, 0
+        while time.monotonic() < deadline:
+            url = urls[(position + served + errors) % len(urls)]
+            try:
+                status = slow_request(driver.host, driver.port, url, slow_seconds)
+            except (OSError, ValueError, IndexError):
+                status = None
+            if status is None or status >= 400:
+                errors += 1
+            else:
+                served += 1
+        return served, errors
+
+    def sample_memory():
+        while time.monotonic() < deadline:
+            peak_rss.append(driver.rss_mb() or 0)
+            time.sleep(0.1)
+
+    with ThreadPoolExecutor(max_workers=clients + slow_clients + 1) as pool:
+        memory = pool.submit(sample_memory)
+        slow = [pool.submit(slow_client, position) for position in range(slow_clients)]
+        fast = [pool.submit(fast_client, position) for position in range(clients)]
+        fast_results = [future.result() for future in fast]
+        slow_results = [future.result() for future in slow]
+        memory.result()
+
+    latencies = sorted(latency for result in fast_results for latency in result[0])
+    throughput = len(latencies) / duration
+    rss = max(peak_rss, default=0) or None
+    return {
+        'requests': len(latencies),
+        'requests_per_second': round(throughput, 1),
+        'p50_ms': round(percentile(latencies, 0.50), 3) if latencies else None,
+        'p95_ms': round(percentile(latencies, 0.95), 3) if latencies else None,
+        'p99_ms': round(percentile(latencies, 0.99), 3) if latencies else None,
+        'errors': sum(result[1] for result in fast_results + slow_results),
+        'slow_requests': sum(result[0] for result in slow_results),
+        'rss_mb': rss,
+        'requests_per_second_per_100_mb': round(throughput * 100 / rss, 1) if rss else None,
+    }
+
+
+def compare_servers(urls, modes=tuple(SERVER_MODES), workers=2, clients=8, slow_clients=4,
+                    duration=5.0, slow_seconds=1.0, warmup=10):
+    """
+    Runs the concurrency benchmark against a local gunicorn started in each
+    mode with the same number of workers: the sync workers serving the WSGI
+    application, or the uvicorn workers serving the ASGI one.
+    Args:
+        urls (list): The URLs requested in turn.
+        modes (tuple): The servers compared, keys of SERVER_MODES.
+        workers (int): The workers of every server.
+        warmup (int): The requests sent to each URL before measuring.
+        Other arguments: See run_concurrency_benchmark.
+    Returns:
+        dict: The results of each server, ready to be stored as JSON.
+    """
+    results = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'commit': _git_commit(),
+        'workers': workers,
+        'clients': clients,
+        'slow_clients': slow_clients,
+        'slow_seconds': slow_seconds,
+        'duration': duration,
+        'servers': {},
+    }
+    for mode in modes:
+        server, base_url = start_gunicorn(workers, server_mode=SERVER_MODES[mode])
+        try:
+            driver = HTTPDriver(base_url, server_pid=server.pid)
+            for url in urls:
+                for _ in range(warmup):
+                    driver.request(url)
+            results['servers'][mode] = run_concurrency_benchmark(
+                driver, urls, clients, slow_clients, duration, slow_seconds
+            )
+        finally:
+            server.terminate()
+            server.wait()
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
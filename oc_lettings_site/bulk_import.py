@@ -0,0 +1,228 @@
+import csv
+import gzip
+import json
+import sys
+import time
+from contextlib import contextmanager
+from itertools import islice
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+
+
+@contextmanager
+def open_source(path):
+    """
+    Opens an import file as text, '-' being the standard input and a '.gz'
+    file being decompressed on the fly.
+    """
+    if path == '-':
+        yield sys.stdin
+        return
+    try:
+        if path.endswith('.gz'):
+            file = gzip.open(path, 'rt', encoding='utf-8', newline='')
+        else:
+            file = open(path, encoding='utf-8', newline='')
+    except OSError as e:
+        raise CommandError(f"Cannot read {path}: {e}")
+    with file:
+        yield file
+
+
+def source_format(path):
+    """
+    Returns the format of an import file from its extension, 'csv' by default.
+    """
+    name = path[:-3] if path.endswith('.gz') else path
+    return 'ndjson' if name.endswith(('.ndjson', '.jsonl')) else 'csv'
+
+
+def read_records(file, format):
+    """
+    Reads the records of a CSV or NDJSON file one at a time.
+    Nested JSON objects are flattened to dotted keys, e.g. {'address': {'city': …}}
+    gives 'address.city', the column names of the exports.
+    Args:
+        file: The opened text file.
+        format (str): 'csv' or 'ndjson'.
+    Yields:
+        dict: The record values by column name.
+    """
+    if format == 'csv':
+        yield from csv.DictReader(file)
+        return
+    for line in file:
+        if line.strip():
+            yield _flatten(json.loads(line))
+
+
+def _flatten(record, prefix=''):
+    flat = {}
+    for key, value in record.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f'{prefix}{key}.'))
+        else:
+            flat[f'{prefix}{key}'] = value
+    return flat
+
+
+def reset_sequences(*models):
+    """
+    Moves the primary key sequences of the given models past their highest
+    id, after rows were inserted with explicit primary keys, which the
+    PostgreSQL sequences do not follow. A no-op on SQLite.
+    Args:
+        *models: The model classes whose sequences are reset.
+    """
+    with connection.cursor() as cursor:
+        for statement in connection.ops.sequence_reset_sql(no_style(), models):
+            cursor.execute(statement)
+
+
+class RowValidator:
+    """
+    Validates records against model fields, running the conversion and the
+    validators of each field (e.g. MaxValueValidator, MinLengthValidator and
+    max_length) without building model instances or calling full_clean(),
+    whose uniqueness checks would query the database for every row.
+    """
+
+    def __init__(self, columns):
+        """
+        Args:
+            columns (dict): The model field of each column.
+        """
+        self.columns = columns
+
+    def clean(self, record):
+        """
+        Converts and validates a record.
+        Args:
+            record (dict): The raw values by column name.
+        Returns:
+            tuple: The cleaned values and the error messages, by column name.
+                A missing optional column is left out of the cleaned values,
+                so that an upsert leaves the existing value untouched, an
+                empty one is given its default.
+        """
+        values, errors = {}, {}
+        for column, field in self.columns.items():
+            raw = record.get(column)
+            if isinstance(raw, str):
+                raw = raw.strip()
+            if raw is None or raw == '':
+                if field.primary_key or field.has_default():
+                    continue
+                if field.blank and column not in record:
+                    continue
+                if field.blank:
+                    values[column] = field.get_default()
+                else:
+                    errors[column] = field.error_messages['blank']
+                continue
+            try:
+                value = field.to_python(raw)
+                field.run_validators(value)
+            except ValidationError as e:
+                errors[column] = ' '.join(e.messages)
+                continue
+            values[column] = value
+        return values, errors
+
+
+class ImportCommand(BaseCommand):
+    """
+    Base class of the bulk import commands. Records are streamed from the
+    input file, validated and imported by batches, each batch in its own
+    transaction, so that a large file is loaded with constant memory use
+    and a few queries per batch. Invalid records are reported and skipped.
+
+    Subclasses declare the model field of each column in 'columns', import
+    a batch of cleaned records in import_batch() and may refresh derived
+    data in finish(), since bulk operations send no model signals.
+    """
+    columns = {}
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'source', help="CSV or NDJSON file ('.gz' files are decompressed, '-' reads stdin)."
+        )
+        parser.add_argument(
+            '--format', choices=['csv', 'ndjson'],
+            help="Input format, from the file extension by default."
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=settings.IMPORT_BATCH_SIZE,
+            help="Records validated and written per transaction."
+        )
+        parser.add_argument(
+            '--max-errors', type=int, default=100,
+            help="Abort after this many invalid records."
+        )
+
+    def import_batch(self, records):
+        """
+        Writes a batch of cleaned records to the database.
+        """
+        raise NotImplementedError
+
+    def finish(self):
+        """
+        Refreshes the data derived from the imported rows.
+        """
+
+    def handle(self, *args, **options):
+        validator = RowValidator(self.columns)
+        batch_size = max(options['batch_size'], 1)
+        imported = rejected = 0
+        started = time.perf_counter()
+
+        with open_source(options['source']) as file:
+            records = enumerate(
+                read_records(file, options['format'] or source_format(options['source'])),
+                start=1
+            )
+            try:
+                while True:
+                    batch = list(islice(records, batch_size))
+                    if not batch:
+                        break
+                    cleaned = []
+                    for number, record in batch:
+                        values, errors = validator.clean(record)
+                        if errors:
+                            rejected += 1
+                            self.report_errors(number, errors)
+                            if rejected > options['max_errors']:
+                                raise CommandError(
+                                    f"More than {options['max_errors']} invalid records, aborting."
+                                )
+                        else:
+                            cleaned.append(values)
+                    if cleaned:
+                        with transaction.atomic():
+                            self.import_batch(cleaned)
+                        imported += len(cleaned)
+                    self.report_progress(imported, rejected, started)
+            except (csv.Error, json.JSONDecodeError, UnicodeDecodeError) as e:
+                raise CommandError(f"Cannot parse the input: {e}")
+            finally:
+                if imported:
+                    self.finish()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {imported} records, rejected {rejected}, "
+            f"in {time.perf_counter() - started:.1f}s."
+        ))
+
+    def report_errors(self, number, errors):
+        details = '; '.join(f"{column}: {message}" for column, message in errors.items())
+        self.stderr.write(f"Record {number} rejected, {details}")
+
+    def report_progress(self, imported, rejected, started):
+        elapsed = time.perf_counter() - started
+        rate = imported / elapsed if elapsed else 0
+        self.stdout.write(f"{imported} imported, {rejected} rejected ({rate:,.0f} records/s)")
@@ -0,0 +1,176 @@
+import datetime
+import gzip
+import json
+import random
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+
+# States with their zip code range and their main cities, most populated first
+STATES = [
+    ('CA', (90001, 96162), ['Los Angeles', 'San Diego', 'San Jose', 'San Francisco',
+                            'Fresno', 'Sacramento', 'Oakland', 'Long Beach']),
+    ('TX', (75001, 79999), ['Houston', 'San Antonio', 'Dallas', 'Austin', 'Fort Worth',
+                            'El Paso', 'Arlington']),
+    ('FL', (32003, 34997), ['Jacksonville', 'Miami', 'Tampa', 'Orlando', 'St. Petersburg',
+                            'Hialeah']),
+    ('NY', (10001, 14925), ['New York', 'Buffalo', 'Rochester', 'Yonkers', 'Syracuse',
+                            'Albany']),
+    ('PA', (15001, 19640), ['Philadelphia', 'Pittsburgh', 'Allentown', 'Erie', 'Reading']),
+    ('IL', (60001, 62999), ['Chicago', 'Aurora', 'Naperville', 'Joliet', 'Rockford']),
+    ('GA', (30002, 31999), ['Atlanta', 'Columbus', 'Augusta', 'Savannah', 'Athens']),
+    ('WA', (98001, 99403), ['Seattle', 'Spokane', 'Tacoma', 'Vancouver', 'Bellevue']),
+    ('MA', (1001, 2791), ['Boston', 'Worcester', 'Springfield', 'Cambridge', 'Lowell']),
+    ('CO', (80001, 81658), ['Denver', 'Colorado Springs', 'Aurora', 'Fort Collins']),
+]
+
+# Exponent of the Zipf distributions: the n-th state or city gets 1 / n**s of the rows
+ZIPF_EXPONENT = 1.1
+
+ADJECTIVES = [
+    'Charming', 'Spacious', 'Sunny', 'Cozy', 'Modern', 'Renovated', 'Quiet', 'Bright',
+    'Elegant', 'Rustic', 'Luxurious', 'Historic', 'Airy', 'Stylish', 'Peaceful',
+]
+KINDS = [
+    'studio', 'loft', 'apartment', 'condo', 'townhouse', 'cottage', 'bungalow',
+    'family home', 'duplex', 'penthouse', 'cabin',
+]
+FEATURES = [
+    'with rooftop terrace', 'with private garden', 'close to downtown', 'near the park',
+    'with ocean view', 'with skyline view', 'steps from public transit', 'with home office',
+    'with two parking spaces', 'pet friendly', 'fully furnished', 'with heated pool',
+    'with open kitchen', 'in a gated community', 'with fireplace', 'walking distance to shops',
+]
+STREET_NAMES = [
+    'Main', 'Oak', 'Pine', 'Maple', 'Cedar', 'Elm', 'Washington', 'Lake', 'Hill', 'Park',
+    'Sunset', 'River', 'Lincoln', 'Jackson', 'Highland', 'Church', 'Spring', 'Forest',
+]
+STREET_SUFFIXES = ['Street', 'Avenue', 'Road', 'Boulevard', 'Lane', 'Drive', 'Court', 'Way']
+FIRST_NAMES = [
+    'James', 'Mary', 'Robert', 'Patricia', 'John', 'Jennifer', 'Michael', 'Linda', 'David',
+    'Elizabeth', 'William', 'Barbara', 'Richard', 'Susan', 'Joseph', 'Jessica', 'Thomas',
+    'Sarah', 'Charles', 'Karen', 'Daniel', 'Nancy', 'Matthew', 'Lisa', 'Anthony', 'Betty',
+]
+LAST_NAMES = [
+    'Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis',
+    'Rodriguez', 'Martinez', 'Hernandez', 'Lopez', 'Gonzalez', 'Wilson', 'Anderson',
+    'Thomas', 'Taylor', 'Moore', 'Jackson', 'Martin', 'Lee', 'Perez', 'Thompson', 'White',
+]
+
+# Share of the profiles without a favorite city
+NO_CITY_RATIO = 0.1
+
+
+def zipf_weights(count, exponent=ZIPF_EXPONENT):
+    """
+    Returns the weights of a Zipf distribution over count ranked values.
+    """
+    return [1 / rank ** exponent for rank in range(1, count + 1)]
+
+
+class DatasetGenerator:
+    """
+    Generates realistic lettings and profiles from a seed: the same seed always
+    gives the same rows. States and cities follow Zipf distributions, zip codes
+    are taken from a sub-range of the state range per city, and titles combine
+    several features, some of them close to the 256 characters limit.
+    """
+
+    def __init__(self, seed=0):
+        self.random = random.Random(seed)
+        self.state_weights = zipf_weights(len(STATES))
+        self.city_weights = {state: zipf_weights(len(cities)) for state, _, cities in STATES}
+        self.cities = [city for _, _, cities in STATES for city in cities]
+        self.favorite_city_weights = zipf_weights(len(self.cities))
+        self.joined_from = timezone.make_aware(datetime.datetime(2015, 1, 1))
+
+    def place(self):
+        """
+        Returns a (state, city, zip_code) drawn from the skewed distributions.
+        """
+        state, (low, high), cities = self.random.choices(STATES, self.state_weights)[0]
+        position = self.random.choices(range(len(cities)), self.city_weights[state])[0]
+        # Each city owns a contiguous share of the zip codes of its state
+        span = (high - low) // len(cities)
+        start = low + position * span
+        return state, cities[position], self.random.randint(start, start + span - 1)
+
+    def title(self, city):
+        """
+        Returns a letting title of one to six features, at most 256 characters long.
+        """
+        features = self.random.sample(FEATURES, self.random.choices(
+            range(1, 7), [30, 25, 20, 12, 8, 5])[0])
+        title = (
+            f"{self.random.choice(ADJECTIVES)} {self.random.choice(ADJECTIVES).lower()} "
+            f"{self.random.choice(KINDS)} {', '.join(features)} in {city}"
+        )
+        return title[:256]
+
+    def letting(self):
+        """
+        Returns the address and letting fields of a generated letting.
+        """
+        state, city, zip_code = self.place()
+        street = f"{self.random.choice(STREET_NAMES)} {self.random.choice(STREET_SUFFIXES)}"
+        address = {
+            'number': self.random.randint(1, 9999),
+            'street': street,
+            'city': city,
+            'state': state,
+            'zip_code': zip_code,
+            'country_iso_code': 'USA',
+        }
+        return address, {'title': self.title(city)}
+
+    def profile(self, user_id):
+        """
+        Returns the user and profile fields of a generated profile.
+        """
+        first_name = self.random.choice(FIRST_NAMES)
+        last_name = self.random.choice(LAST_NAMES)
+        username = f"{first_name}{last_name}{user_id}".lower()
+        user = {
+            'username': username,
+            'first_name': first_name,
+            'last_name': last_name,
+            'email': f"{username}@example.com",
+            # Unusable password, seeded so that the snapshots are reproducible
+            'password': f"!{self.random.getrandbits(128):032x}",
+            'date_joined': self.joined_from + datetime.timedelta(
+                minutes=self.random.randint(0, 10 * 365 * 24 * 60)
+            ),
+        }
+        favorite_city = ''
+        if self.random.random() >= NO_CITY_RATIO:
+            favorite_city = self.random.choices(self.cities, self.favorite_city_weights)[0]
+        return user, {'favorite_city': favorite_city}
+
+
+class FixtureWriter:
+    """
+    Writes objects to a JSON fixture, loadable with 'manage.py loaddata', one
+    object at a time. A '.gz' path is compressed.
+    """
+
+    def __init__(self, path):
+        if path.endswith('.gz'):
+            self.file = gzip.open(path, 'wt', encoding='utf-8')
+        else:
+            self.file = open(path, 'w', encoding='utf-8')
+        self.file.write('[')
+        self.empty = True
+
+    def write(self, model, pk, fields):
+        """
+        Writes an object of the given model label, e.g. 'lettings.address'.
+        """
+        self.file.write('\n' if self.empty else ',\n')
+        self.file.write(json.dumps(
+            {'model': model, 'pk': pk, 'fields': fields}, cls=DjangoJSONEncoder
+        ))
+        self.empty = False
+
+    def close(self):
+        self.file.write('\n]\n')
+        self.file.close()
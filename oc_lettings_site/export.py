@@ -0,0 +1,137 @@
+import csv
+import json
+import zlib
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+
+FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+}
+
+# Size of the encoded output gathered before being compressed or sent
+BUFFER_SIZE = 64 * 1024
+
+
+class Export:
+    """
+    Streams every row of a queryset, ordered by primary key, as CSV or NDJSON.
+    Rows are read through values().iterator(), chunk_size rows at a time, and
+    encoded one by one, so memory use does not depend on the size of the table.
+    """
+
+    def __init__(self, name, queryset, fields):
+        """
+        Args:
+            name (str): The name of the export, used as file name.
+            queryset (QuerySet): The exported objects.
+            fields (dict): The lookup of each exported column by name, starting
+                with the primary key 'id' used to resume an export.
+        """
+        self.name = name
+        self.queryset = queryset
+        self.fields = fields
+
+    def rows(self, after=None, chunk_size=None):
+        """
+        Yields the exported rows as tuples, in primary key order.
+        Args:
+            after (int): Only the rows with a greater primary key are exported.
+            chunk_size (int): The number of rows fetched at a time.
+        """
+        queryset = self.queryset
+        if after is not None:
+            queryset = queryset.filter(pk__gt=after)
+        return queryset.order_by('pk').values_list(*self.fields.values()).iterator(
+            chunk_size=chunk_size or settings.EXPORT_CHUNK_SIZE
+        )
+
+    def encode(self, rows, format):
+        """
+        Yields the rows encoded in the given format, one line at a time.
+        """
+        if format == 'csv':
+            writer = csv.writer(_Echo())
+            yield writer.writerow(self.fields)
+            for row in rows:
+                yield writer.writerow(row)
+        else:
+            names = list(self.fields)
+            for row in rows:
+                yield json.dumps(dict(zip(names, row)), cls=DjangoJSONEncoder) + '\n'
+
+    def stream(self, format='csv', after=None, gzip=False, chunk_size=None):
+        """
+        Returns the export as an iterator of byte chunks.
+        Args:
+            format (str): 'csv' or 'ndjson'.
+            after (int): Resumes the export after this primary key.
+            gzip (bool): Compresses the output on the fly.
+            chunk_size (int): The number of rows fetched at a time.
+        Returns:
+            iterator: The encoded, optionally compressed, chunks.
+        """
+        chunks = _buffered(self.encode(self.rows(after, chunk_size), format))
+        return _gzipped(chunks) if gzip else chunks
+
+    async def astream(self, format='csv', after=None, gzip=False, chunk_size=None):
+        """
+        Async version of stream(), for the responses served under ASGI, which
+        would otherwise read a sync iterator whole before sending it. Each
+        chunk is produced in a thread, the same one for the whole export, as
+        the rows are read from a database cursor.
+        Args:
+            format (str): 'csv' or 'ndjson'.
+            after (int): Resumes the export after this primary key.
+            gzip (bool): Compresses the output on the fly.
+            chunk_size (int): The number of rows fetched at a time.
+        Yields:
+            bytes: The encoded, optionally compressed, chunks.
+        """
+        chunks = self.stream(format, after, gzip, chunk_size)
+        next_chunk = sync_to_async(next)
+        try:
+            while True:
+                chunk = await next_chunk(chunks, None)
+                if chunk is None:
+                    return
+                yield chunk
+        finally:
+            # Closes the cursor when the client went away before the end
+            await sync_to_async(chunks.close)()
+
+    def filename(self, format, gzip=False):
+        """
+        Returns the file name of the export.
+        """
+        return f"{self.name}.{FORMATS[format][1]}{'.gz' if gzip else ''}"
+
+
+class _Echo:
+    # File-like object returning what csv.writer writes, instead of storing it
+    def write(self, value):
+        return value
+
+
+def _buffered(lines):
+    buffer, size = [], 0
+    for line in lines:
+        data = line.encode()
+        buffer.append(data)
+        size += len(data)
+        if size >= BUFFER_SIZE:
+            yield b''.join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def _gzipped(chunks):
+    compressor = zlib.compressobj(wbits=31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,159 @@
+import re
+from urllib.parse import urlencode
+from django.conf import settings
+from django.db import NotSupportedError, connection
+from django.test.utils import override_settings
+from django.urls import reverse
+from oc_lettings_site import page_cache
+from oc_lettings_site.benchmark import WSGIDriver, sample_urls
+
+
+# Plan details of a full table scan and of a sort or grouping in a temporary index
+TABLE_SCAN = re.compile(r'^SCAN (\S+)$')
+TEMP_BTREE = re.compile(r'USE TEMP B-TREE FOR (.+)$')
+
+LIMIT = re.compile(r'\bLIMIT\b', re.IGNORECASE)
+WHERE = re.compile(r'\bWHERE\b', re.IGNORECASE)
+
+# Issues left on purpose, as (statement pattern, issue, reason) entries
+ACCEPTED_ISSUES = ()
+
+
+def scenarios():
+    """
+    Lists the URLs replayed by the audit: a URL per named route (see
+    benchmark.sample_urls), plus the facet filters, the following pages and
+    the batch lookups, built from the first letting summary, the table the
+    lettings pages read, and the first profile.
+    Returns:
+        list: (route name, URL) pairs.
+    """
+    from lettings.models import LettingSummary
+    from profiles.models import Profile
+
+    urls = list(sample_urls().items())
+    letting = LettingSummary.objects.order_by('id').first()
+    profile = Profile.objects.select_related('user').order_by('id').first()
+    if letting is not None:
+        index = reverse('lettings:index')
+        api = reverse('api:lettings')
+        urls += [
+            ('lettings:index', f"{index}?{urlencode({'state': letting.state})}"),
+            ('lettings:index', f"{index}?{urlencode({'city': letting.city})}"),
+            ('lettings:index', f"{index}?{urlencode({'country': letting.country_iso_code})}"),
+            ('lettings:index', f"{index}?{urlencode({'after': letting.id})}"),
+            ('lettings:index', f"{index}?{urlencode({'before': letting.id + 1})}"),
+            ('api:lettings', f"{api}?{urlencode({'after': letting.id})}"),
+            ('api:lettings', f"{api}?{urlencode({'ids': letting.id})}"),
+        ]
+    if profile is not None:
+        username = profile.user.username
+        urls += [
+            ('profiles:index', f"{reverse('profiles:index')}?{urlencode({'after': username})}"),
+            ('api:profiles', f"{reverse('api:profiles')}?{urlencode({'after': username})}"),
+            ('api:profiles', f"{reverse('api:profiles')}?{urlencode({'usernames': username})}"),
+        ]
+    return urls
+
+
+def explain(sql, params):
+    """
+    Returns the details of the SQLite query plan of a statement.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        return [row[3] for row in cursor.fetchall()]
+
+
+def accepted_reason(sql, issue):
+    """
+    Returns why an issue of a statement is accepted, None if it is not.
+    """
+    for pattern, accepted_issue, reason in ACCEPTED_ISSUES:
+        if issue == accepted_issue and pattern.search(sql):
+            return reason
+    return None
+
+
+def plan_issues(sql, plan):
+    """
+    Finds the full table scans and temporary B-trees of a query plan. A scan
+    is accepted when the statement has no WHERE clause and a LIMIT, walking a
+    page of the table in primary key order, and a temporary B-tree when it
+    sorts the rows matched by a full-text index.
+    Returns:
+        list: The description of each issue, empty if none.
+    """
+    issues = []
+    bounded = LIMIT.search(sql) and not WHERE.search(sql)
+    full_text = any('VIRTUAL TABLE' in detail for detail in plan)
+    for detail in plan:
+        scan = TABLE_SCAN.match(detail)
+        if scan and not bounded:
+            issues.append(f"full scan of {scan[1]}")
+        temp = TEMP_BTREE.search(detail)
+        if temp and not full_text:
+            issues.append(f"temporary B-tree for {temp[1]}")
+    return issues
+
+
+def audit(urls=None):
+    """
+    Replays each URL through the WSGI application, with the page cache
+    disabled and throwaway local memory caches, so that the cached pages of
+    the site are left alone, and explains every distinct query it runs.
+    Args:
+        urls (list): (route name, URL) pairs, the scenarios by default.
+    Returns:
+        list: One dict per distinct query, with its 'route', 'url', 'sql',
+            'plan', 'issues' and 'accepted' issues (see ACCEPTED_ISSUES).
+    Raises:
+        NotSupportedError: If the database is not SQLite.
+    """
+    if connection.vendor != 'sqlite':
+        raise NotSupportedError("The index audit reads SQLite query plans.")
+    with override_settings(PAGE_CACHE_ENABLED=False, CACHES=_throwaway_caches()):
+        return _replay(scenarios() if urls is None else urls)
+
+
+def _throwaway_caches():
+    # One local memory cache per alias, emptied before each replayed URL
+    return {
+        alias: {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': f'index-audit-{alias}',
+        }
+        for alias in settings.CACHES
+    }
+
+
+def _replay(urls):
+    driver = WSGIDriver()
+    results, seen = [], set()
+    for route, url in urls:
+        queries = []
+
+        def capture(execute, sql, params, many, context):
+            if not many:
+                queries.append((sql, params))
+            return execute(sql, params, many, context)
+
+        # The cached facet summary and validators would hide the queries
+        page_cache.get_cache().clear()
+        with connection.execute_wrapper(capture):
+            driver.request(url)
+        for sql, params in queries:
+            if sql in seen or not sql.lstrip().upper().startswith('SELECT'):
+                continue
+            seen.add(sql)
+            plan = explain(sql, params)
+            issues = plan_issues(sql, plan)
+            results.append({
+                'route': route,
+                'url': url,
+                'sql': sql,
+                'plan': plan,
+                'issues': [issue for issue in issues if accepted_reason(sql, issue) is None],
+                'accepted': [issue for issue in issues if accepted_reason(sql, issue)],
+            })
+    return results
@@ -0,0 +1,292 @@
+import threading
+import time
+from collections import Counter
+from hashlib import sha256
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.exceptions import PermissionDenied
+from oc_lettings_site import reporting
+
+
+FAILURES_KEY = 'login-guard:failures:{}:{}:{}'
+LOCK_KEY = 'login-guard:lock:{}:{}'
+STRIKES_KEY = 'login-guard:strikes:{}:{}'
+EXISTS_KEY = 'login-guard:exists:{}'
+
+# Each sliding window is split into this many buckets
+BUCKETS = 10
+
+# Categories of the failed logins, with the message of the first one of an interval
+MESSAGES = {
+    'existing': "Échec de connexion pour l'utilisateur existant: {}",
+    'unknown': "Échec de connexion pour l'utilisateur inexistant: {}",
+    'no_username': "Échec de connexion sans nom d'utilisateur fourni.",
+    'locked': "Échec de connexion bloqué pour: {}",
+}
+LABELS = {
+    'existing': "utilisateurs existants",
+    'unknown': "utilisateurs inexistants",
+    'no_username': "sans nom d'utilisateur",
+    'locked': "bloqués",
+}
+
+# Most frequent usernames and addresses listed in a summary
+SUMMARY_TOP = 5
+
+
+def get_cache():
+    """
+    Returns the cache backend holding the counters, locks and existence flags.
+    """
+    return caches[settings.LOGIN_GUARD_CACHE_ALIAS]
+
+
+def _digest(value):
+    # Usernames are user input: hashed, they make valid keys for every backend
+    return sha256(str(value).encode()).hexdigest()[:32]
+
+
+def client_ip(request):
+    """
+    Returns the address of the client of a request, None without request.
+    Behind LOGIN_GUARD_TRUSTED_PROXIES proxies, each appending the address it
+    received the request from to the LOGIN_GUARD_PROXY_HEADER header (e.g.
+    X-Forwarded-For), it is the address appended by the first proxy: the ones
+    before it are written by the client, and could be forged.
+    """
+    if request is None:
+        return None
+    header = settings.LOGIN_GUARD_PROXY_HEADER
+    proxies = settings.LOGIN_GUARD_TRUSTED_PROXIES
+    if header and proxies > 0:
+        hops = [hop.strip() for hop in request.META.get(header, '').split(',') if hop.strip()]
+        if len(hops) >= proxies:
+            return hops[-proxies]
+    return request.META.get('REMOTE_ADDR')
+
+
+def _window():
+    window = settings.LOGIN_GUARD_WINDOW
+    size = max(1, window // BUCKETS)
+    return window, size, int(time.time()) // size
+
+
+def count_failure(kind, value):
+    """
+    Counts a failed login in the sliding window of a username or address.
+    Args:
+        kind (str): 'username' or 'ip'.
+        value: The (username, address) pair, or the address.
+    Returns:
+        int: The failures in the last LOGIN_GUARD_WINDOW seconds, this one included.
+    """
+    cache = get_cache()
+    window, size, bucket = _window()
+    digest = _digest(value)
+    key = FAILURES_KEY.format(kind, digest, bucket)
+    cache.add(key, 0, window + size)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Evicted between add and incr
+        cache.set(key, 1, window + size)
+    return failures(kind, value)
+
+
+def failures(kind, value):
+    """
+    Returns the failed logins of a username or address in the last
+    LOGIN_GUARD_WINDOW seconds.
+    """
+    _, _, bucket = _window()
+    digest = _digest(value)
+    keys = [FAILURES_KEY.format(kind, digest, bucket - i) for i in range(BUCKETS)]
+    return sum(get_cache().get_many(keys).values())
+
+
+def clear_failures(kind, value):
+    """
+    Forgets the failed logins of a username or address, e.g. after a successful login.
+    """
+    _, _, bucket = _window()
+    digest = _digest(value)
+    get_cache().delete_many(
+        [FAILURES_KEY.format(kind, digest, bucket - i) for i in range(BUCKETS)]
+    )
+
+
+def is_locked(kind, value):
+    """
+    Returns True if a username or address is locked out.
+    """
+    if value is None:
+        return False
+    return get_cache().get(LOCK_KEY.format(kind, _digest(value))) is not None
+
+
+def lock(kind, value):
+    """
+    Locks out a username or address, for twice as long as its previous lockout.
+    Returns:
+        int: The lockout duration in seconds.
+    """
+    cache = get_cache()
+    digest = _digest(value)
+    strikes_key = STRIKES_KEY.format(kind, digest)
+    strikes = cache.get(strikes_key, 0)
+    duration = min(
+        settings.LOGIN_GUARD_LOCKOUT * 2 ** strikes, settings.LOGIN_GUARD_MAX_LOCKOUT
+    )
+    cache.set(LOCK_KEY.format(kind, digest), True, duration)
+    # Strikes are forgotten once a source behaves for the longest lockout
+    cache.set(strikes_key, strikes + 1, duration + settings.LOGIN_GUARD_MAX_LOCKOUT)
+    return duration
+
+
+def username_exists(username):
+    """
+    Returns True if a user has this username, cached for
+    LOGIN_GUARD_EXISTS_TIMEOUT seconds, unknown usernames too.
+    """
+    cache = get_cache()
+    key = EXISTS_KEY.format(_digest(username))
+    exists = cache.get(key)
+    if exists is None:
+        exists = User.objects.filter(username=username).exists()
+        cache.set(key, exists, settings.LOGIN_GUARD_EXISTS_TIMEOUT)
+    return exists
+
+
+def set_username_exists(username, exists):
+    """
+    Updates the existence cache of a username, when a user is saved or deleted.
+    """
+    get_cache().set(
+        EXISTS_KEY.format(_digest(username)), exists, settings.LOGIN_GUARD_EXISTS_TIMEOUT
+    )
+
+
+class FailureSummary:
+    """
+    Aggregates the failed logins reported to Sentry: the first failure of each
+    category is reported at once, the following ones of the same
+    LOGIN_GUARD_SUMMARY_INTERVAL are counted, then reported as one summary by
+    a background thread.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reported = set()
+        self.counts = Counter()
+        self.usernames = Counter()
+        self.addresses = Counter()
+        self.started = time.monotonic()
+        self.thread = None
+
+    def add(self, category, username, ip):
+        """
+        Reports a failed login, or counts it for the next summary.
+        """
+        with self.lock:
+            if category not in self.reported:
+                self.reported.add(category)
+                self._start()
+                reporting.report_message(MESSAGES[category].format(username or ip))
+                return
+            self.counts[category] += 1
+            if username:
+                self.usernames[username] += 1
+            if ip:
+                self.addresses[ip] += 1
+
+    def flush(self):
+        """
+        Reports the failed logins counted since the last summary, if any.
+        Returns:
+            str: The summary message, None if there was nothing to report.
+        """
+        with self.lock:
+            counts, usernames, addresses = self.counts, self.usernames, self.addresses
+            elapsed = time.monotonic() - self.started
+            self.reported, self.counts = set(), Counter()
+            self.usernames, self.addresses = Counter(), Counter()
+            self.started = time.monotonic()
+        if not counts:
+            return None
+        message = f"Échecs de connexion en {round(elapsed)} s: " + ", ".join(
+            f"{count} {LABELS[category]}" for category, count in sorted(counts.items())
+        )
+        if usernames:
+            message += " ; utilisateurs: " + ", ".join(
+                f"{username} ({count})" for username, count in usernames.most_common(SUMMARY_TOP)
+            )
+        if addresses:
+            message += " ; adresses: " + ", ".join(
+                f"{ip} ({count})" for ip, count in addresses.most_common(SUMMARY_TOP)
+            )
+        reporting.report_message(message, level='warning')
+        return message
+
+    def _start(self):
+        if self.thread is None or not self.thread.is_alive():
+            self.thread = threading.Thread(target=self._run, name='login-guard', daemon=True)
+            self.thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(settings.LOGIN_GUARD_SUMMARY_INTERVAL)
+            self.flush()
+
+
+summary = FailureSummary()
+
+
+def record_failure(username, request):
+    """
+    Records a failed login: counts it per username and per address, locks
+    out the sources over their limit, and reports it. The attempts refused
+    by a lockout are only reported, without any query.
+    Args:
+        username (str): The username tried, None if missing.
+        request (HttpRequest): The login request, None outside a request.
+    """
+    ip = client_ip(request)
+    if getattr(request, 'login_guard_locked', False):
+        summary.add('locked', username, ip)
+        return
+    # A username is only locked out for the address which failed, so that
+    # nobody can lock a real user out of the admin by failing as them
+    if username and (
+        count_failure('username', (username, ip)) >= settings.LOGIN_GUARD_USERNAME_LIMIT
+    ):
+        lock('username', (username, ip))
+    if ip and count_failure('ip', ip) >= settings.LOGIN_GUARD_IP_LIMIT:
+        lock('ip', ip)
+
+    if not username:
+        summary.add('no_username', None, ip)
+    elif username_exists(username):
+        summary.add('existing', username, ip)
+    else:
+        summary.add('unknown', username, ip)
+
+
+class LoginGuardBackend(ModelBackend):
+    """
+    Authentication backend refusing the logins of locked out addresses, and
+    of the usernames locked out for the address, before any query or
+    password hashing.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(User.USERNAME_FIELD)
+        ip = client_ip(request)
+        if is_locked('username', (username, ip)) or is_locked('ip', ip):
+            if request is not None:
+                request.login_guard_locked = True
+            # Stops the other backends too, user_login_failed is still sent
+            raise PermissionDenied
+        return super().authenticate(request, username, password, **kwargs)
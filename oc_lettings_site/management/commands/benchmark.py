@@ -0,0 +1,102 @@
+import json
+import os
+from django.core.management.base import BaseCommand, CommandError
+from oc_lettings_site.benchmark import (
+    DEFAULT_TOLERANCE, SERVER_MODES, HTTPDriver, WSGIDriver, compare, run_benchmark, sample_urls,
+    start_gunicorn
+)
+
+
+DEFAULT_OUTPUT = os.path.join('reports', 'benchmark.json')
+
+
+class Command(BaseCommand):
+    """
+    Benchmarks every named route of the site, through the WSGI application in
+    the current process, under a local gunicorn with sync or uvicorn workers,
+    or against a running server, and stores the results as JSON. Given a
+    baseline file, the command fails when a route regressed, so that it can
+    gate a deployment.
+    """
+    help = "Measures the latency, throughput and queries of every named route."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--mode', choices=['wsgi', *SERVER_MODES], default='wsgi',
+            help="Serve the site in-process ('wsgi'), or with a local gunicorn with sync "
+                 "('gunicorn') or uvicorn ('uvicorn') workers."
+        )
+        parser.add_argument('--url', help="Benchmark a running server, e.g. http://host:8000")
+        parser.add_argument('--workers', type=int, default=2, help="gunicorn workers.")
+        parser.add_argument('--routes', nargs='+', help="Route names, every route by default.")
+        parser.add_argument('--requests', type=int, default=200, help="Requests per route.")
+        parser.add_argument('--concurrency', type=int, default=4, help="Concurrent clients.")
+        parser.add_argument('--warmup', type=int, default=10, help="Warmup requests per route.")
+        parser.add_argument('--output', default=DEFAULT_OUTPUT, help="JSON results file.")
+        parser.add_argument('--baseline', help="JSON results of a previous run to compare with.")
+        parser.add_argument(
+            '--tolerance', type=float, default=DEFAULT_TOLERANCE,
+            help="Relative slowdown accepted before reporting a regression."
+        )
+
+    def handle(self, *args, **options):
+        urls = sample_urls(options['routes'])
+        if not urls:
+            raise CommandError("No route to benchmark.")
+        baseline = None
+        if options['baseline']:
+            try:
+                with open(options['baseline'], encoding='utf-8') as file:
+                    baseline = json.load(file)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Cannot read {options['baseline']}: {e}")
+
+        server = None
+        try:
+            if options['url']:
+                driver = HTTPDriver(options['url'])
+            elif options['mode'] in SERVER_MODES:
+                server, base_url = start_gunicorn(
+                    options['workers'], server_mode=SERVER_MODES[options['mode']]
+                )
+                driver = HTTPDriver(base_url, server_pid=server.pid)
+            else:
+                driver = WSGIDriver()
+            results = run_benchmark(
+                driver, urls, options['requests'], max(options['concurrency'], 1),
+                options['warmup']
+            )
+        except RuntimeError as e:
+            raise CommandError(str(e))
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait()
+
+        self.report(results)
+        directory = os.path.dirname(options['output'])
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(options['output'], 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+        self.stdout.write(f"Results written to {options['output']}.")
+
+        if baseline is not None:
+            regressions = compare(baseline, results, options['tolerance'])
+            if regressions:
+                raise CommandError("Regressions found:\n" + '\n'.join(regressions))
+            self.stdout.write(self.style.SUCCESS("No regression against the baseline."))
+
+    def report(self, results):
+        self.stdout.write(
+            f"{'route':<24}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'req/s':>9}"
+            f"{'queries':>9}{'errors':>8}"
+        )
+        for name, result in results['routes'].items():
+            queries = result['queries_per_request']
+            self.stdout.write(
+                f"{name:<24}{result['p50_ms']:>9.2f}{result['p95_ms']:>9.2f}"
+                f"{result['p99_ms']:>9.2f}{result['requests_per_second']:>9.1f}"
+                f"{'-' if queries is None else queries:>9}{result['errors']:>8}"
+            )
+        self.stdout.write(f"Peak RSS: {results['peak_rss_mb'] or '-'} MB")
@@ -0,0 +1,69 @@
+import json
+import os
+from django.core.management.base import BaseCommand, CommandError
+from oc_lettings_site.benchmark import (
+    CONCURRENCY_ROUTES, SERVER_MODES, compare_servers, sample_urls
+)
+
+
+DEFAULT_OUTPUT = os.path.join('reports', 'concurrency_benchmark.json')
+
+
+class Command(BaseCommand):
+    """
+    Compares a local gunicorn with sync workers serving the WSGI application
+    and one with as many uvicorn workers serving the ASGI application, under
+    clients sending their requests at once and slow clients trickling theirs,
+    and stores the results as JSON.
+    """
+    help = "Measures the throughput of the WSGI and ASGI servers per worker and per MB."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--modes', nargs='+', choices=list(SERVER_MODES), default=list(SERVER_MODES),
+            help="The servers compared."
+        )
+        parser.add_argument('--workers', type=int, default=2, help="Workers of every server.")
+        parser.add_argument(
+            '--routes', nargs='+', default=list(CONCURRENCY_ROUTES), help="Route names."
+        )
+        parser.add_argument('--clients', type=int, default=8, help="Fast clients.")
+        parser.add_argument('--slow-clients', type=int, default=4, help="Slow clients.")
+        parser.add_argument(
+            '--slow-seconds', type=float, default=1.0,
+            help="Seconds taken by a slow client to send its request."
+        )
+        parser.add_argument('--duration', type=float, default=5.0, help="Seconds per server.")
+        parser.add_argument('--warmup', type=int, default=10, help="Warmup requests per route.")
+        parser.add_argument('--output', default=DEFAULT_OUTPUT, help="JSON results file.")
+
+    def handle(self, *args, **options):
+        urls = list(sample_urls(options['routes']).values())
+        if not urls:
+            raise CommandError("No route to benchmark.")
+        try:
+            results = compare_servers(
+                urls, options['modes'], max(options['workers'], 1), max(options['clients'], 1),
+                max(options['slow_clients'], 0), options['duration'], options['slow_seconds'],
+                options['warmup'],
+            )
+        except RuntimeError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(
+            f"{'server':<10}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'errors':>8}"
+            f"{'slow':>6}{'RSS MB':>9}{'req/s/100MB':>13}"
+        )
+        for mode, result in results['servers'].items():
+            self.stdout.write(
+                f"{mode:<10}{result['requests_per_second']:>9.1f}{str(result['p50_ms']):>9}"
+                f"{str(result['p95_ms']):>9}{result['errors']:>8}{result['slow_requests']:>6}"
+                f"{str(result['rss_mb']):>9}{str(result['requests_per_second_per_100_mb']):>13}"
+            )
+
+        directory = os.path.dirname(options['output'])
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(options['output'], 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+        self.stdout.write(f"Results written to {options['output']}.")
@@ -0,0 +1,63 @@
+import json
+import os
+import sqlite3
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from oc_lettings_site.benchmark import run_sqlite_benchmark
+from oc_lettings_site.database import SQLITE_PROFILES
+
+
+DEFAULT_OUTPUT = os.path.join('reports', 'sqlite_benchmark.json')
+
+
+class Command(BaseCommand):
+    """
+    Compares the SQLite profiles of oc_lettings_site.database under
+    concurrent readers and writers, each profile on its own copy of the
+    database, and stores the results as JSON.
+    """
+    help = "Measures the read concurrency and write latency of each SQLite profile."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database', default=str(settings.DATABASES['default']['NAME']),
+            help="The SQLite file copied, the default database by default."
+        )
+        parser.add_argument(
+            '--profiles', nargs='+', choices=list(SQLITE_PROFILES), default=list(SQLITE_PROFILES),
+            help="The profiles compared."
+        )
+        parser.add_argument('--readers', type=int, default=4, help="Reading processes.")
+        parser.add_argument('--writers', type=int, default=1, help="Writing processes.")
+        parser.add_argument('--duration', type=float, default=5.0, help="Seconds per profile.")
+        parser.add_argument('--output', default=DEFAULT_OUTPUT, help="JSON results file.")
+
+    def handle(self, *args, **options):
+        if not os.path.exists(options['database']):
+            raise CommandError(f"{options['database']} does not exist.")
+        try:
+            results = run_sqlite_benchmark(
+                options['database'], options['profiles'], options['readers'],
+                options['writers'], options['duration'],
+            )
+        except sqlite3.Error as e:
+            raise CommandError(f"The benchmark failed, is the database migrated? {e}")
+
+        self.stdout.write(
+            f"{'profile':<14}{'journal':>8}{'reads/s':>10}{'read p95':>10}"
+            f"{'writes/s':>10}{'write p50':>11}{'write p95':>11}{'errors':>8}"
+        )
+        for profile, result in results['profiles'].items():
+            reads, writes = result['reads'], result['writes']
+            self.stdout.write(
+                f"{profile:<14}{result['journal_mode']:>8}{reads['per_second']:>10}"
+                f"{str(reads['p95_ms']):>10}{writes['per_second']:>10}"
+                f"{str(writes['p50_ms']):>11}{str(writes['p95_ms']):>11}{result['errors']:>8}"
+            )
+
+        directory = os.path.dirname(options['output'])
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(options['output'], 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+        self.stdout.write(f"Results written to {options['output']}.")
@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand, CommandError
+from lettings.api import LETTINGS_EXPORT
+from oc_lettings_site.export import FORMATS
+from profiles.api import PROFILES_EXPORT
+
+
+EXPORTS = {
+    'lettings': LETTINGS_EXPORT,
+    'profiles': PROFILES_EXPORT,
+}
+
+
+class Command(BaseCommand):
+    """
+    Streams the lettings or profiles to a file or to the standard output,
+    with the same constant memory use as the export endpoints.
+    """
+    help = "Exports the lettings or profiles as CSV or NDJSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', choices=sorted(EXPORTS), help="The data to export.")
+        parser.add_argument('--format', choices=sorted(FORMATS), default='csv')
+        parser.add_argument('--gzip', action='store_true', help="Compress the output.")
+        parser.add_argument(
+            '--after', type=int, help="Resume after this primary key (last exported 'id')."
+        )
+        parser.add_argument('--chunk-size', type=int, help="Rows fetched at a time.")
+        parser.add_argument('--output', '-o', help="Output file, the standard output by default.")
+
+    def handle(self, *args, **options):
+        export = EXPORTS[options['name']]
+        chunks = export.stream(
+            options['format'],
+            after=options['after'],
+            gzip=options['gzip'],
+            chunk_size=options['chunk_size'],
+        )
+        if not options['output']:
+            output = getattr(self.stdout._out, 'buffer', None)
+            if output is None and options['gzip']:
+                raise CommandError("Use --output to write a compressed export.")
+            for chunk in chunks:
+                if output is None:
+                    self.stdout.write(chunk.decode(), ending='')
+                else:
+                    output.write(chunk)
+            if output is not None:
+                output.flush()
+            return
+
+        try:
+            with open(options['output'], 'wb') as output:
+                for chunk in chunks:
+                    output.write(chunk)
+        except OSError as e:
+            raise CommandError(f"Cannot write {options['output']}: {e}")
+        self.stderr.write(
+            self.style.SUCCESS(f"Exported {options['name']} to {options['output']}.")
+        )
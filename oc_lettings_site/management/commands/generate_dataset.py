@@ -0,0 +1,114 @@
+import time
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from lettings import summary
+from lettings.models import Address, Letting
+from oc_lettings_site import page_cache, versioning
+from oc_lettings_site.bulk_import import reset_sequences
+from oc_lettings_site.dataset import DatasetGenerator, FixtureWriter
+from profiles.autocomplete import AUTOCOMPLETERS
+from profiles.models import Profile
+
+
+class Command(BaseCommand):
+    """
+    Generates a synthetic dataset at production scale, written with bulk
+    inserts and optionally saved as a fixture snapshot reloadable with
+    'manage.py loaddata'. The rows only depend on the seed and on the highest
+    ids already in the database, from which the new ids follow.
+    """
+    help = "Generates synthetic lettings and profiles for scale testing."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lettings', type=int, default=10000, help="Lettings to generate.")
+        parser.add_argument('--profiles', type=int, default=10000, help="Profiles to generate.")
+        parser.add_argument('--seed', type=int, default=0, help="Seed of the random generator.")
+        parser.add_argument('--batch-size', type=int, default=5000, help="Rows per bulk insert.")
+        parser.add_argument(
+            '--snapshot', help="Also writes the rows to this fixture file ('.json' or '.json.gz')."
+        )
+
+    def handle(self, *args, **options):
+        generator = DatasetGenerator(options['seed'])
+        # loaddata does not fill the auto_now fields
+        self.updated_at = timezone.now()
+        batch_size = max(options['batch_size'], 1)
+        started = time.perf_counter()
+        try:
+            snapshot = FixtureWriter(options['snapshot']) if options['snapshot'] else None
+        except OSError as e:
+            raise CommandError(f"Cannot write {options['snapshot']}: {e}")
+
+        try:
+            self.generate_lettings(generator, options['lettings'], batch_size, snapshot)
+            self.generate_profiles(generator, options['profiles'], batch_size, snapshot)
+        finally:
+            if snapshot:
+                snapshot.close()
+            # The primary keys were inserted explicitly, the sequences must continue after them
+            reset_sequences(Address, Letting, User, Profile)
+            # Bulk inserts send no signals
+            versioning.bump(Address, Letting, Profile, User)
+            page_cache.invalidate('lettings', 'profiles')
+            for autocompleter in AUTOCOMPLETERS.values():
+                autocompleter.invalidate()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {options['lettings']} lettings and {options['profiles']} profiles "
+            f"in {time.perf_counter() - started:.1f}s."
+        ))
+
+    def generate_lettings(self, generator, count, batch_size, snapshot):
+        address_id = (Address.objects.aggregate(Max('id'))['id__max'] or 0) + 1
+        letting_id = (Letting.objects.aggregate(Max('id'))['id__max'] or 0) + 1
+        for start in range(0, count, batch_size):
+            addresses, lettings = [], []
+            for offset in range(min(batch_size, count - start)):
+                address_fields, letting_fields = generator.letting()
+                addresses.append(Address(id=address_id + start + offset, **address_fields))
+                lettings.append(Letting(
+                    id=letting_id + start + offset,
+                    address_id=address_id + start + offset,
+                    **letting_fields
+                ))
+                if snapshot:
+                    snapshot.write('lettings.address', addresses[-1].id,
+                                   {**address_fields, 'updated_at': self.updated_at})
+                    snapshot.write('lettings.letting', lettings[-1].id, {
+                        **letting_fields,
+                        'address': addresses[-1].id,
+                        'updated_at': self.updated_at,
+                    })
+            with transaction.atomic():
+                Address.objects.bulk_create(addresses)
+                Letting.objects.bulk_create(lettings)
+                summary.refresh(letting.id for letting in lettings)
+            self.stdout.write(f"{start + len(lettings)}/{count} lettings")
+
+    def generate_profiles(self, generator, count, batch_size, snapshot):
+        user_id = (User.objects.aggregate(Max('id'))['id__max'] or 0) + 1
+        profile_id = (Profile.objects.aggregate(Max('id'))['id__max'] or 0) + 1
+        for start in range(0, count, batch_size):
+            users, profiles = [], []
+            for offset in range(min(batch_size, count - start)):
+                user_fields, profile_fields = generator.profile(user_id + start + offset)
+                users.append(User(id=user_id + start + offset, **user_fields))
+                profiles.append(Profile(
+                    id=profile_id + start + offset,
+                    user_id=user_id + start + offset,
+                    **profile_fields
+                ))
+                if snapshot:
+                    snapshot.write('auth.user', users[-1].id, user_fields)
+                    snapshot.write('profiles.profile', profiles[-1].id, {
+                        **profile_fields,
+                        'user': users[-1].id,
+                        'updated_at': self.updated_at,
+                    })
+            with transaction.atomic():
+                User.objects.bulk_create(users)
+                Profile.objects.bulk_create(profiles)
+            self.stdout.write(f"{start + len(profiles)}/{count} profiles")
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import NotSupportedError
+from oc_lettings_site.index_audit import accepted_reason, audit
+
+
+class Command(BaseCommand):
+    """
+    Replays the queries of every view and explains them with SQLite's
+    EXPLAIN QUERY PLAN, flagging the full table scans and temporary B-trees.
+    Fails when a query has an issue which is not accepted on purpose, so that
+    it can gate a deployment.
+    """
+    help = "Flags the table scans and temporary B-trees of the queries of each view."
+
+    def handle(self, *args, **options):
+        try:
+            results = audit()
+        except NotSupportedError as e:
+            raise CommandError(str(e))
+
+        verbose = options['verbosity'] > 1
+        for result in results:
+            if not (result['issues'] or result['accepted'] or verbose):
+                continue
+            self.stdout.write(f"{result['route']} {result['url']}")
+            self.stdout.write(f"  {result['sql']}")
+            for detail in result['plan']:
+                self.stdout.write(f"    {detail}")
+            for issue in result['issues']:
+                self.stdout.write(self.style.ERROR(f"  ISSUE: {issue}"))
+            for issue in result['accepted']:
+                self.stdout.write(
+                    f"  accepted: {issue} ({accepted_reason(result['sql'], issue)})"
+                )
+
+        issues = sum(len(result['issues']) for result in results)
+        self.stdout.write(f"{len(results)} queries explained, {issues} issue(s).")
+        if issues:
+            raise CommandError(f"{issues} query plan issue(s), see above.")
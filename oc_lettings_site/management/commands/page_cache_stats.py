@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from oc_lettings_site import page_cache
+
+
+class Command(BaseCommand):
+    """
+    Displays the hit and miss counters of the rendered pages cache.
+    """
+    help = "Displays the page cache hit and miss counters."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset', action='store_true', help="Reset the counters after displaying them."
+        )
+
+    def handle(self, *args, **options):
+        stats = page_cache.stats()
+        ratio = stats['hit_ratio']
+        self.stdout.write(f"Hits: {stats['hits']}")
+        self.stdout.write(f"Misses: {stats['misses']}")
+        self.stdout.write(f"Hit ratio: {'n/a' if ratio is None else f'{ratio:.1%}'}")
+        if options['reset']:
+            page_cache.reset_stats()
+            self.stdout.write(self.style.SUCCESS("Counters reset."))
@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from oc_lettings_site.profiling import MODES, make_token
+
+
+class Command(BaseCommand):
+    """
+    Prints a signed token profiling the requests which send it in their
+    'X-Profile' header, e.g. curl -H "X-Profile: <token>" https://site/lettings/
+    """
+    help = "Prints a signed 'X-Profile' header value profiling a request."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mode', choices=MODES, default='cprofile', help="The profiler.")
+
+    def handle(self, *args, **options):
+        self.stdout.write(make_token(options['mode']))
+        self.stderr.write(f"Valid {settings.PROFILING_TOKEN_MAX_AGE} seconds.")
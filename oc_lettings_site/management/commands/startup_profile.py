@@ -0,0 +1,44 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from oc_lettings_site.startup import PHASES, profile_startup
+
+
+class Command(BaseCommand):
+    """
+    Measures the cold start of the site in fresh interpreters: the time of
+    each startup phase up to the first request, and the slowest imports as
+    reported by python -X importtime.
+    """
+    help = "Reports the startup phases and the import times of a cold start."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='/', help="The URL of the first request.")
+        parser.add_argument('--runs', type=int, default=3, help="Cold starts, the median is kept.")
+        parser.add_argument('--top', type=int, default=15, help="Imports and packages listed.")
+        parser.add_argument('--json', action='store_true', help="Print the results as JSON.")
+
+    def handle(self, *args, **options):
+        try:
+            results = profile_startup(options['url'], max(1, options['runs']))
+        except RuntimeError as e:
+            raise CommandError(f"The startup failed: {e}")
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        self.stdout.write(f"Cold start, median of {results['runs']} run(s):")
+        for phase in PHASES:
+            self.stdout.write(f"  {phase:<16}{results['phases_ms'][phase]:>10.2f} ms")
+        self.stdout.write(f"  {'total':<16}{results['total_ms']:>10.2f} ms")
+        if results['sentry_init_ms'] is not None:
+            self.stdout.write(f"  Sentry initialized in {results['sentry_init_ms']} ms, "
+                              "during 'application'.")
+        self.stdout.write(f"  First request status: {results['status']}")
+
+        self.stdout.write("\nOwn import time by package:")
+        for package, ms in results['packages_ms'][:options['top']]:
+            self.stdout.write(f"  {package:<40}{ms:>10.2f} ms")
+        self.stdout.write("\nSlowest top-level imports (cumulative):")
+        for module, ms in results['imports_ms'][:options['top']]:
+            self.stdout.write(f"  {module:<40}{ms:>10.2f} ms")
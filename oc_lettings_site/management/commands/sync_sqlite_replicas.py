@@ -0,0 +1,33 @@
+import sqlite3
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    """
+    Copies the SQLite primary database onto the SQLite replicas of
+    DATABASE_REPLICA_URLS, standing in for the replication of a real
+    database server when testing the replica routing locally.
+    """
+    help = "Copies the SQLite primary onto the SQLite replicas."
+
+    def handle(self, *args, **options):
+        primary = settings.DATABASES['default']
+        replicas = [settings.DATABASES[alias] for alias in settings.DATABASE_REPLICAS]
+        if not replicas:
+            raise CommandError("No replica, set DATABASE_REPLICA_URLS.")
+        if any(db['ENGINE'] != 'django.db.backends.sqlite3' for db in (primary, *replicas)):
+            raise CommandError("Only SQLite databases can be copied, a server replicates itself.")
+
+        source = sqlite3.connect(primary['NAME'])
+        try:
+            for alias, replica in zip(settings.DATABASE_REPLICAS, replicas):
+                target = sqlite3.connect(replica['NAME'])
+                try:
+                    # A consistent snapshot, even while the site writes to the primary
+                    source.backup(target)
+                finally:
+                    target.close()
+                self.stdout.write(f"{alias}: {replica['NAME']}")
+        finally:
+            source.close()
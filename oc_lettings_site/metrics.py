@@ -0,0 +1,475 @@
+import atexit
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from oc_lettings_site import profiling
+
+
+# Upper bounds of the histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+QUERY_TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+TEMPLATE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5)
+
+# Name, type, help text and buckets of each metric
+METRICS = {
+    'oc_lettings_http_request_duration_seconds': (
+        'histogram', "Request latency by URL name.", LATENCY_BUCKETS
+    ),
+    'oc_lettings_http_responses_total': (
+        'counter', "Responses by URL name and status code.", None
+    ),
+    'oc_lettings_db_queries_per_request': (
+        'histogram', "SQL queries run by a request, by URL name.", QUERY_COUNT_BUCKETS
+    ),
+    'oc_lettings_db_query_seconds_per_request': (
+        'histogram', "Time spent in SQL queries by a request, by URL name.", QUERY_TIME_BUCKETS
+    ),
+    'oc_lettings_template_render_seconds': (
+        'histogram', "Render time of a template, included templates counted too.",
+        TEMPLATE_BUCKETS
+    ),
+    'oc_lettings_page_cache_requests_total': (
+        'counter', "Page cache lookups by URL name and result (hit or miss).", None
+    ),
+    'oc_lettings_reports_total': (
+        'counter', "Errors and messages reported to Sentry, by outcome.", None
+    ),
+}
+
+# Label of the requests which did not resolve to a named route
+UNMATCHED = '<unmatched>'
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Shard of each live thread, and the totals of the threads which exited
+_shards = {}
+_residual = {}
+_lock = threading.Lock()
+_local = threading.local()
+_flusher = None
+_atexit_registered = False
+_started = time.time()
+
+
+def _shard():
+    # Each thread writes to its own shard, so that recording never takes a lock
+    shard = getattr(_local, 'shard', None)
+    if shard is None:
+        shard = _local.shard = {}
+        with _lock:
+            _shards[threading.current_thread()] = shard
+        _start_flusher()
+    return shard
+
+
+def _add(merged, shard):
+    for key, value in list(shard.items()):
+        if isinstance(value, list):
+            total = merged.setdefault(key, [0] * len(value))
+            for i, count in enumerate(list(value)):
+                total[i] += count
+        else:
+            merged[key] = merged.get(key, 0) + value
+
+
+def _after_fork():
+    # A forked worker starts from empty metrics, written to its own file
+    global _flusher, _started, _lock
+    _shards.clear()
+    _residual.clear()
+    _local.__dict__.clear()
+    _lock = threading.Lock()
+    _flusher, _started = None, time.time()
+
+
+os.register_at_fork(after_in_child=_after_fork)
+
+
+def inc(name, labels, value=1):
+    """
+    Increments a counter.
+    Args:
+        name (str): The counter, declared in METRICS.
+        labels (tuple): The (label, value) pairs.
+        value (float): The increment.
+    """
+    shard = _shard()
+    key = (name, labels)
+    shard[key] = shard.get(key, 0) + value
+
+
+def observe(name, labels, value):
+    """
+    Records a value in a histogram.
+    Args:
+        name (str): The histogram, declared in METRICS.
+        labels (tuple): The (label, value) pairs.
+        value (float): The observed value.
+    """
+    shard = _shard()
+    key = (name, labels)
+    state = shard.get(key)
+    if state is None:
+        # One count per bucket, plus the +Inf bucket, the sum and the count
+        state = shard[key] = [0] * (len(METRICS[name][2]) + 3)
+    buckets = METRICS[name][2]
+    state[bisect_left(buckets, value)] += 1
+    state[-2] += value
+    state[-1] += 1
+
+
+def snapshot():
+    """
+    Merges the shards of the current process.
+    Returns:
+        dict: The counter value or histogram state by (name, labels).
+    """
+    with _lock:
+        # The shards of the exited threads are folded, so that a thread per
+        # request server does not keep one for each request it served
+        for thread in [thread for thread in _shards if not thread.is_alive()]:
+            _add(_residual, _shards.pop(thread))
+        shards = [_residual, *_shards.values()]
+        merged = {}
+        for shard in shards:
+            _add(merged, shard)
+    return merged
+
+
+# Totals of the workers which exited, and the lock of the process folding them
+DEAD = 'dead.json'
+DEAD_LOCK = 'dead.lock'
+# Age after which the lock of a process killed while folding is ignored
+STALE_LOCK_SECONDS = 60
+
+
+def _path():
+    # Named after the start time too, so that a reused pid never overwrites the
+    # file of the exited worker
+    return os.path.join(settings.METRICS_DIR, f'{os.getpid()}-{int(_started * 1000)}.json')
+
+
+def flush():
+    """
+    Writes the metrics of the current process to its file of METRICS_DIR,
+    where the scrapes of every worker aggregate them.
+    """
+    os.makedirs(settings.METRICS_DIR, exist_ok=True)
+    data = {
+        'pid': os.getpid(),
+        'started': _started,
+        'metrics': [[name, labels, value] for (name, labels), value in snapshot().items()],
+    }
+    # Written then renamed, so that a scrape never reads a partial file
+    path = _path()
+    with open(f'{path}.tmp', 'w', encoding='utf-8') as file:
+        json.dump(data, file)
+    os.replace(f'{path}.tmp', path)
+
+
+def _start_flusher():
+    global _flusher, _atexit_registered
+    if _flusher is None:
+        _flusher = threading.Thread(target=_flush_periodically, name='metrics-flush', daemon=True)
+        _flusher.start()
+        # Once per process: a forked worker inherits the handler of its parent
+        if not _atexit_registered:
+            _atexit_registered = True
+            atexit.register(flush)
+
+
+def _flush_periodically():
+    while True:
+        time.sleep(settings.METRICS_FLUSH_INTERVAL)
+        try:
+            flush()
+        except OSError:
+            pass
+
+
+def reset_directory():
+    """
+    Deletes the metrics files of the previous runs, called by gunicorn on startup.
+    """
+    try:
+        names = os.listdir(settings.METRICS_DIR)
+    except FileNotFoundError:
+        return
+    for name in names:
+        if name.endswith('.json') or name == DEAD_LOCK:
+            os.remove(os.path.join(settings.METRICS_DIR, name))
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _merge(merged, metrics):
+    for metric, labels, value in metrics:
+        key = (metric, tuple(tuple(pair) for pair in labels))
+        if isinstance(value, list):
+            total = merged.setdefault(key, [0] * len(value))
+            for i, count in enumerate(value):
+                total[i] += count
+        else:
+            merged[key] = merged.get(key, 0) + value
+
+
+def _load(name):
+    with open(os.path.join(settings.METRICS_DIR, name), encoding='utf-8') as file:
+        return json.load(file)
+
+
+def _load_dead():
+    try:
+        return _load(DEAD)
+    except FileNotFoundError:
+        return {'folded': [], 'metrics': []}
+
+
+def _worker_files(folded):
+    # Loads the files of the workers which are not folded yet, by file name
+    files = {}
+    for name in sorted(os.listdir(settings.METRICS_DIR)):
+        if not name.endswith('.json') or name == DEAD or name in folded:
+            continue
+        try:
+            files[name] = _load(name)
+        except ValueError:
+            continue
+    return files
+
+
+def _live(files):
+    # The newest file of each pid is the live worker's, if that pid runs
+    newest = {}
+    for name, data in files.items():
+        if data['started'] >= newest.get(data['pid'], (None, -1))[1]:
+            newest[data['pid']] = (name, data['started'])
+    return {name for pid, (name, _) in newest.items() if _alive(pid)}
+
+
+def fold_dead():
+    """
+    Adds the files of the workers which exited to the totals of DEAD, then
+    deletes them, so that a scrape reads a bounded number of files. Skipped
+    while another process folds.
+    """
+    lock = os.path.join(settings.METRICS_DIR, DEAD_LOCK)
+    try:
+        descriptor = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        try:
+            if time.time() - os.path.getmtime(lock) > STALE_LOCK_SECONDS:
+                os.remove(lock)
+        except OSError:
+            pass
+        return
+    try:
+        dead = _load_dead()
+        files = _worker_files(set(dead['folded']))
+        live = _live(files)
+        exited = [name for name in files if name not in live]
+        if not exited:
+            return
+        merged = {}
+        _merge(merged, dead['metrics'])
+        for name in exited:
+            _merge(merged, files[name]['metrics'])
+        # The folded files are listed until deleted, so that a scrape reading
+        # both the new totals and one of them counts it once
+        names = set(os.listdir(settings.METRICS_DIR))
+        folded = [name for name in dead['folded'] if name in names] + exited
+        data = {
+            'folded': folded,
+            'metrics': [[name, labels, value] for (name, labels), value in merged.items()],
+        }
+        path = os.path.join(settings.METRICS_DIR, DEAD)
+        with open(f'{path}.tmp', 'w', encoding='utf-8') as file:
+            json.dump(data, file)
+        os.replace(f'{path}.tmp', path)
+        for name in folded:
+            try:
+                os.remove(os.path.join(settings.METRICS_DIR, name))
+            except FileNotFoundError:
+                pass
+    finally:
+        os.close(descriptor)
+        os.remove(lock)
+
+
+def collect():
+    """
+    Aggregates the metrics of every process. The workers which exited are
+    summed through the totals of DEAD, so that the counters never go backwards.
+    Returns:
+        tuple: The merged metrics by (name, labels), and the live workers as
+            (pid, start time) pairs.
+    """
+    flush()
+    fold_dead()
+    while True:
+        dead = _load_dead()
+        try:
+            files = _worker_files(set(dead['folded']))
+        except FileNotFoundError:
+            # Folded by another process since DEAD was read: read again
+            continue
+        merged = {}
+        _merge(merged, dead['metrics'])
+        for data in files.values():
+            _merge(merged, data['metrics'])
+        live = _live(files)
+        workers = [(data['pid'], data['started']) for name, data in files.items() if name in live]
+        return merged, workers
+
+
+def _labels(pairs):
+    if not pairs:
+        return ''
+    escaped = (
+        (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in pairs
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render():
+    """
+    Renders the aggregated metrics in the Prometheus text exposition format.
+    Returns:
+        str: The exposition.
+    """
+    merged, workers = collect()
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+        for (metric, labels), value in sorted(merged.items()):
+            if metric != name:
+                continue
+            if kind == 'counter':
+                lines.append(f'{name}{_labels(labels)} {_number(value)}')
+                continue
+            cumulative = 0
+            for bound, count in zip((*buckets, float('inf')), value):
+                cumulative += count
+                lines.append(
+                    f"{name}_bucket{_labels((*labels, ('le', _number(bound))))} {cumulative}"
+                )
+            lines.append(f'{name}_sum{_labels(labels)} {_number(value[-2])}')
+            lines.append(f'{name}_count{_labels(labels)} {value[-1]}')
+
+    lookups = {'hit': 0, 'miss': 0}
+    for (metric, labels), value in merged.items():
+        if metric == 'oc_lettings_page_cache_requests_total':
+            result = dict(labels)['result']
+            lookups[result] = lookups.get(result, 0) + value
+    lines += [
+        '# HELP oc_lettings_page_cache_hit_ratio Share of the page cache lookups which hit.',
+        '# TYPE oc_lettings_page_cache_hit_ratio gauge',
+    ]
+    if lookups['hit'] + lookups['miss']:
+        ratio = lookups['hit'] / (lookups['hit'] + lookups['miss'])
+        lines.append(f'oc_lettings_page_cache_hit_ratio {_number(round(ratio, 6))}')
+
+    lines += [
+        '# HELP oc_lettings_worker_info Live worker processes, by process id.',
+        '# TYPE oc_lettings_worker_info gauge',
+    ]
+    lines += [f'oc_lettings_worker_info{_labels((("pid", pid),))} 1' for pid, _ in workers]
+    lines += [
+        '# HELP oc_lettings_worker_start_time_seconds Start time of the live workers.',
+        '# TYPE oc_lettings_worker_start_time_seconds gauge',
+    ]
+    lines += [
+        f'oc_lettings_worker_start_time_seconds{_labels((("pid", pid),))} {_number(started)}'
+        for pid, started in workers
+    ]
+    return '\n'.join(lines) + '\n'
+
+
+def view_labels(request):
+    """
+    Returns the labels of the route which served a request.
+    Args:
+        request (HttpRequest): The request, resolved or not.
+    Returns:
+        tuple: The ('view', name) pair, UNMATCHED for an unnamed route.
+    """
+    match = request.resolver_match
+    return (('view', match.view_name if match and match.url_name else UNMATCHED),)
+
+
+class MetricsMiddleware:
+    """
+    Records the latency, status code, SQL queries and template render times of
+    every request, labelled by URL name. The page cache counts its own lookups
+    (see page_cache.cached_page).
+    """
+    async_capable = True
+    sync_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        profiling.install_template_timer()
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        queries, templates = [0, 0.0], []
+        started = time.perf_counter()
+        with profiling.query_recorder(self.count_query(queries)):
+            with profiling.record_templates(templates):
+                response = self.get_response(request)
+        self.record(request, response, time.perf_counter() - started, queries, templates)
+        return response
+
+    async def __acall__(self, request):
+        queries, templates = [0, 0.0], []
+        started = time.perf_counter()
+        with profiling.query_recorder(self.count_query(queries)):
+            with profiling.record_templates(templates):
+                response = await self.get_response(request)
+        self.record(request, response, time.perf_counter() - started, queries, templates)
+        return response
+
+    def record(self, request, response, duration, queries, templates):
+        """
+        Records the metrics of a served request.
+        """
+        view = view_labels(request)
+        observe('oc_lettings_http_request_duration_seconds', view, duration)
+        inc('oc_lettings_http_responses_total', (*view, ('status', str(response.status_code))))
+        observe('oc_lettings_db_queries_per_request', view, queries[0])
+        observe('oc_lettings_db_query_seconds_per_request', view, queries[1])
+        for template in templates:
+            observe(
+                'oc_lettings_template_render_seconds',
+                (('template', template['name'] or '<string>'),), template['ms'] / 1000
+            )
+
+    @staticmethod
+    def count_query(queries):
+        def recorder(sql, seconds):
+            queries[0] += 1
+            queries[1] += seconds
+        return recorder
@@ -0,0 +1,56 @@
+import sys
+from django.core.management.color import no_style
+
+
+# Number of primary keys covered by each INSERT ... SELECT statement
+COPY_CHUNK_SIZE = 50000
+
+
+def copy_table(schema_editor, source, target, chunk_size=COPY_CHUNK_SIZE, stdout=None):
+    """
+    Copies every row of a model table into the table of another model with the
+    same columns, keeping the primary keys. The copy is set-based: one
+    INSERT ... SELECT statement per range of chunk_size primary keys, so the
+    rows never go through Python, and the progress is reported after each range.
+    Args:
+        schema_editor: Database schema editor of the running migration.
+        source: The (historical) model whose rows are copied.
+        target: The (historical) model receiving the rows.
+        chunk_size (int): The number of primary keys per statement.
+        stdout: The stream receiving the progress, the standard output by default.
+    Returns:
+        int: The number of copied rows.
+    """
+    stdout = stdout or sys.stdout
+    connection = schema_editor.connection
+    quote = schema_editor.quote_name
+    columns = ', '.join(quote(field.column) for field in target._meta.local_concrete_fields)
+    pk = quote(source._meta.pk.column)
+    source_table = quote(source._meta.db_table)
+    target_table = quote(target._meta.db_table)
+
+    copied = 0
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT MIN({pk}), MAX({pk}), COUNT(*) FROM {source_table}")
+        low, high, total = cursor.fetchone()
+        starts = range(low, high + 1, chunk_size) if total else ()
+        for start in starts:
+            cursor.execute(
+                f"INSERT INTO {target_table} ({columns}) SELECT {columns} FROM {source_table} "
+                f"WHERE {pk} >= %s AND {pk} < %s",
+                [start, start + chunk_size]
+            )
+            copied += cursor.rowcount
+            stdout.write(f"\n    Copied {copied}/{total} rows to {target._meta.db_table}")
+            stdout.flush()
+        # The primary keys were inserted explicitly, the sequences must continue after them
+        for statement in connection.ops.sequence_reset_sql(no_style(), [target]):
+            cursor.execute(statement)
+    return copied
+
+
+def empty_table(schema_editor, model):
+    """
+    Deletes every row of a model table with a single statement.
+    """
+    schema_editor.execute(f"DELETE FROM {schema_editor.quote_name(model._meta.db_table)}")
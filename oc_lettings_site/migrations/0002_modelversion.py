@@ -0,0 +1,40 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """
+    Removes the models moved to the 'lettings' and 'profiles' apps from the
+    migration state (their tables were dropped by the data migrations) and
+    creates the 'ModelVersion' model.
+    """
+
+    dependencies = [
+        ('oc_lettings_site', '0001_initial'),
+        ('lettings', '0002_migrate_data'),
+        ('profiles', '0002_migrate_data'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.RemoveField(model_name='letting', name='address'),
+                migrations.RemoveField(model_name='profile', name='user'),
+                migrations.DeleteModel(name='Address'),
+                migrations.DeleteModel(name='Letting'),
+                migrations.DeleteModel(name='Profile'),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ModelVersion',
+            fields=[
+                ('id', models.BigAutoField(
+                    auto_created=True,
+                    primary_key=True,
+                    serialize=False,
+                    verbose_name='ID')),
+                ('label', models.CharField(max_length=100, unique=True)),
+                ('version', models.PositiveBigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
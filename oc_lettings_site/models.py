@@ -0,0 +1,18 @@
+from django.db import models
+
+
+class ModelVersion(models.Model):
+    """
+    Monotonically increasing version counter of a model table.
+    Bumped whenever a row of the table is saved or deleted, it lets views
+    compute HTTP validators without reading the table itself.
+    """
+    label = models.CharField(max_length=100, unique=True)
+    version = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        """
+        Returns the model label with its current version.
+        """
+        return f'{self.label} v{self.version}'
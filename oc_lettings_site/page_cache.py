@@ -0,0 +1,184 @@
+import time
+from functools import wraps
+from hashlib import md5
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.http import HttpResponse
+from oc_lettings_site import metrics
+from oc_lettings_site.routers import primary_reads
+
+
+VERSION_KEY = 'page-cache:version:{}'
+PAGE_KEY = 'page-cache:page:{}:{}:{}'
+STATS_BASELINE_KEY = 'page-cache:stats-baseline'
+
+
+def get_cache():
+    """
+    Returns the cache backend configured for rendered pages.
+    """
+    return caches[settings.PAGE_CACHE_ALIAS]
+
+
+def is_shared(alias=None):
+    """
+    Tells whether a cache is shared by the processes of the site, which a
+    per-process cache (locmem, dummy) is not: a page invalidated by one worker
+    would still be served by the others.
+    Args:
+        alias (str): The cache alias, PAGE_CACHE_ALIAS by default.
+    Returns:
+        bool: False for a per-process cache.
+    """
+    cache = caches[alias or settings.PAGE_CACHE_ALIAS]
+    return not isinstance(cache, (LocMemCache, DummyCache))
+
+
+def namespace_version(namespace):
+    """
+    Returns the current version of a namespace of cached pages.
+    A missing version is replaced by the current time, so that pages cached
+    under an evicted version can never be served again.
+    Args:
+        namespace (str): The namespace, e.g. 'lettings' or 'profiles'.
+    Returns:
+        int: The namespace version.
+    """
+    cache = get_cache()
+    key = VERSION_KEY.format(namespace)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def invalidate(*namespaces):
+    """
+    Invalidates every cached page of the given namespaces by bumping their version.
+    Args:
+        *namespaces (str): The namespaces to invalidate.
+    """
+    cache = get_cache()
+    for namespace in namespaces:
+        key = VERSION_KEY.format(namespace)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), None)
+
+
+def _count(request, result):
+    # Counted in the metrics shards of the process, so that a hit writes nothing
+    # to the cache backend, possibly a file
+    metrics.inc(
+        'oc_lettings_page_cache_requests_total',
+        (*metrics.view_labels(request), ('result', result))
+    )
+
+
+def _totals():
+    # The lookups of every worker, summed from their metrics files
+    merged, _ = metrics.collect()
+    totals = {'hit': 0, 'miss': 0}
+    for (name, labels), value in merged.items():
+        if name == 'oc_lettings_page_cache_requests_total':
+            result = dict(labels)['result']
+            totals[result] = totals.get(result, 0) + value
+    return totals
+
+
+def stats():
+    """
+    Returns the hit and miss counters of the page cache, summed over the
+    workers since the last reset_stats().
+    Returns:
+        dict: 'hits', 'misses' and 'hit_ratio' (None before the first lookup).
+    """
+    totals = _totals()
+    baseline = get_cache().get(STATS_BASELINE_KEY) or {}
+    hits = totals['hit'] - baseline.get('hit', 0)
+    misses = totals['miss'] - baseline.get('miss', 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': hits / total if total else None,
+    }
+
+
+def reset_stats():
+    """
+    Resets the hit and miss counters of the page cache. The metrics counters
+    never go backwards: their current totals become the baseline of stats().
+    """
+    get_cache().set(STATS_BASELINE_KEY, _totals(), None)
+
+
+def _lookup(namespace, request):
+    # The key of the page, and its cached response, None on a miss
+    cache = get_cache()
+    path_hash = md5(request.get_full_path().encode(), usedforsecurity=False).hexdigest()
+    key = PAGE_KEY.format(namespace, namespace_version(namespace), path_hash)
+    cached = cache.get(key)
+    if cached is None:
+        _count(request, 'miss')
+        return key, None
+    _count(request, 'hit')
+    content, content_type = cached
+    response = HttpResponse(content, content_type=content_type)
+    response['X-Page-Cache'] = 'HIT'
+    return key, response
+
+
+def _store(key, response):
+    if response.status_code == 200 and not response.streaming:
+        get_cache().set(
+            key,
+            (response.content, response['Content-Type']),
+            settings.PAGE_CACHE_TIMEOUT
+        )
+    response['X-Page-Cache'] = 'MISS'
+
+
+def cached_page(namespace):
+    """
+    Caches the successful GET responses of a view under a namespace.
+    Pages are stored without timeout and dropped when the namespace is
+    invalidated (see oc_lettings_site.signals), so they are rendered from
+    the primary database, never from a lagging replica. The cache of an async view
+    is read and written from a thread, its backend possibly being remote.
+    Args:
+        namespace (str): The namespace the view's pages belong to.
+    Returns:
+        callable: The view decorator.
+    """
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                if not settings.PAGE_CACHE_ENABLED or request.method not in ('GET', 'HEAD'):
+                    return await view(request, *args, **kwargs)
+                key, response = await sync_to_async(_lookup)(namespace, request)
+                if response is None:
+                    with primary_reads():
+                        response = await view(request, *args, **kwargs)
+                    await sync_to_async(_store)(key, response)
+                return response
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not settings.PAGE_CACHE_ENABLED or request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            key, response = _lookup(namespace, request)
+            if response is None:
+                with primary_reads():
+                    response = view(request, *args, **kwargs)
+                _store(key, response)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,153 @@
+from django.http import QueryDict
+
+
+class KeysetPage:
+    """
+    A page of results produced by KeysetPaginator, with the cursors
+    needed to build the previous and next links.
+    """
+
+    def __init__(self, object_list, query_params, has_previous, has_next,
+                 previous_cursor, next_cursor):
+        self.object_list = object_list
+        self.has_previous = has_previous
+        self.has_next = has_next
+        self.previous_cursor = previous_cursor
+        self.next_cursor = next_cursor
+        self._query_params = query_params
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def _query_with(self, name, value):
+        params = self._query_params.copy()
+        params.pop('after', None)
+        params.pop('before', None)
+        params[name] = value
+        return params.urlencode()
+
+    @property
+    def previous_query(self):
+        """
+        Returns the query string of the previous page, keeping the other parameters.
+        """
+        return self._query_with('before', self.previous_cursor)
+
+    @property
+    def next_query(self):
+        """
+        Returns the query string of the next page, keeping the other parameters.
+        """
+        return self._query_with('after', self.next_cursor)
+
+
+class KeysetPaginator:
+    """
+    Paginates a queryset on a unique key with 'after'/'before' cursors.
+    Each page is a single indexed range query (WHERE key > cursor ORDER BY key
+    LIMIT n), so its cost does not depend on how deep the user pages.
+    """
+
+    def __init__(self, queryset, key, page_size, key_type=str):
+        """
+        Args:
+            queryset (QuerySet): The queryset to paginate.
+            key (str): The unique lookup used as cursor, e.g. 'id' or 'user__username'.
+            page_size (int): The number of objects per page.
+            key_type (callable): Converts a cursor from the query string.
+        """
+        self.queryset = queryset
+        self.key = key
+        self.page_size = page_size
+        self.key_type = key_type
+
+    def _parse_cursor(self, value):
+        if value in (None, ''):
+            return None
+        try:
+            return self.key_type(value)
+        except (TypeError, ValueError):
+            return None
+
+    def _key_of(self, obj):
+        if isinstance(obj, dict):
+            # Row of a values() queryset
+            return obj[self.key]
+        value = obj
+        for attribute in self.key.split('__'):
+            value = getattr(value, attribute)
+        return value
+
+    def get_page(self, query_params=None):
+        """
+        Returns the page designated by the 'after' or 'before' cursor.
+        Args:
+            query_params (QueryDict): The request query parameters.
+        Returns:
+            KeysetPage: The requested page, the first one if no valid cursor is given.
+        """
+        query_params, after, before = self._cursors(query_params)
+        if before is not None:
+            rows = list(self._rows_before(before))
+            if rows:
+                return self._page_before(rows, query_params)
+            after = None
+        return self._page_after(list(self._rows_after(after)), query_params, after)
+
+    async def aget_page(self, query_params=None):
+        """
+        Asynchronous version of get_page, for the async views.
+        """
+        query_params, after, before = self._cursors(query_params)
+        if before is not None:
+            rows = [row async for row in self._rows_before(before)]
+            if rows:
+                return self._page_before(rows, query_params)
+            after = None
+        rows = [row async for row in self._rows_after(after)]
+        return self._page_after(rows, query_params, after)
+
+    def _cursors(self, query_params):
+        if query_params is None:
+            query_params = QueryDict()
+        after = self._parse_cursor(query_params.get('after'))
+        before = self._parse_cursor(query_params.get('before'))
+        return query_params, after, before
+
+    def _rows_before(self, before):
+        return (
+            self.queryset.filter(**{f'{self.key}__lt': before})
+            .order_by(f'-{self.key}')[:self.page_size + 1]
+        )
+
+    def _rows_after(self, after):
+        queryset = self.queryset
+        if after is not None:
+            queryset = queryset.filter(**{f'{self.key}__gt': after})
+        return queryset.order_by(self.key)[:self.page_size + 1]
+
+    def _page_before(self, rows, query_params):
+        has_previous = len(rows) > self.page_size
+        return self._page(rows[:self.page_size][::-1], query_params, has_previous, True)
+
+    def _page_after(self, rows, query_params, after):
+        has_next = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        page = self._page(rows, query_params, after is not None, has_next)
+        if not rows and after is not None:
+            # Past the last page: the previous link goes back before the cursor
+            page.previous_cursor = after
+        return page
+
+    def _page(self, rows, query_params, has_previous, has_next):
+        return KeysetPage(
+            rows,
+            query_params,
+            has_previous=has_previous,
+            has_next=has_next,
+            previous_cursor=self._key_of(rows[0]) if rows else None,
+            next_cursor=self._key_of(rows[-1]) if rows else None,
+        )
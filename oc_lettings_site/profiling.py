@@ -0,0 +1,484 @@
+import contextvars
+import cProfile
+import datetime
+import json
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from asgiref.sync import async_to_sync, iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core import signing
+from django.template import base
+from oc_lettings_site import reporting
+
+
+# Request header carrying a signed profiling token (see make_token)
+HEADER = 'HTTP_X_PROFILE'
+TOKEN_SALT = 'oc_lettings_site.profiling'
+
+# Profilers: deterministic cProfile, or statistical stack sampling
+MODES = ('cprofile', 'sample')
+
+# Longest SQL statement kept in a capture
+MAX_SQL_LENGTH = 2000
+
+# Recorders of the current request. Context variables follow a request into
+# the threads running the queries of its async views, and keep apart the
+# requests served concurrently by one event loop.
+_query_recorders = contextvars.ContextVar('query_recorders', default=())
+_template_recorders = contextvars.ContextVar('template_recorders', default=())
+
+
+def make_token(mode='cprofile'):
+    """
+    Signs a token which, sent in the 'X-Profile' header, profiles the request.
+    Args:
+        mode (str): 'cprofile' or 'sample'.
+    Returns:
+        str: The header value, valid PROFILING_TOKEN_MAX_AGE seconds.
+    """
+    return signing.dumps({'mode': mode}, salt=TOKEN_SALT)
+
+
+def read_token(value):
+    """
+    Returns the profiler requested by a signed token, None if the token is
+    invalid or expired.
+    """
+    try:
+        mode = signing.loads(
+            value, salt=TOKEN_SALT, max_age=settings.PROFILING_TOKEN_MAX_AGE
+        ).get('mode')
+    except (signing.BadSignature, AttributeError):
+        return None
+    return mode if mode in MODES else None
+
+
+def frame_name(code):
+    """
+    Returns the flamegraph label of a code object, e.g. 'index (lettings/views.py:38)'.
+    """
+    return f'{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})'
+
+
+def _short_path(filename):
+    for prefix in sorted((str(settings.BASE_DIR), *sys.path), key=len, reverse=True):
+        if prefix and filename.startswith(prefix + os.sep):
+            return filename[len(prefix) + 1:]
+    return filename
+
+
+class StackSampler:
+    """
+    Samples, every interval seconds, the Python stack of the threads which
+    registered themselves. A single daemon thread serves every request, and
+    sleeps while no thread is registered.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.stacks = {}
+        self.condition = threading.Condition()
+        self.thread = None
+
+    def start(self):
+        """
+        Registers the current thread.
+        """
+        with self.condition:
+            self.stacks[threading.get_ident()] = Counter()
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(
+                    target=self.run, name='profiling-sampler', daemon=True
+                )
+                self.thread.start()
+            self.condition.notify()
+
+    def stop(self):
+        """
+        Unregisters the current thread.
+        Returns:
+            Counter: The number of samples of each collapsed stack.
+        """
+        with self.condition:
+            return self.stacks.pop(threading.get_ident(), Counter())
+
+    def run(self):
+        sampler = threading.get_ident()
+        while True:
+            with self.condition:
+                while not self.stacks:
+                    self.condition.wait()
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self.condition:
+                for thread_id, stacks in self.stacks.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None and thread_id != sampler:
+                        stacks[self.collapse(frame)] += 1
+
+    @staticmethod
+    def collapse(frame):
+        names = []
+        while frame is not None:
+            names.append(frame_name(frame.f_code))
+            frame = frame.f_back
+        return ';'.join(reversed(names))
+
+
+_sampler = None
+
+
+def get_sampler():
+    global _sampler
+    if _sampler is None:
+        _sampler = StackSampler(settings.PROFILING_SAMPLE_INTERVAL)
+    return _sampler
+
+
+def collapsed_stacks(stats, max_depth=100, min_time=1e-5):
+    """
+    Converts cProfile statistics into collapsed stacks. cProfile only records
+    caller/callee pairs, so the time of a function is split between its call
+    paths in proportion to the time spent through each caller, and recursive
+    calls are folded into the outermost one.
+    Args:
+        stats (pstats.Stats): The statistics of a profile.
+        max_depth (int): The deepest path followed.
+        min_time (float): The shortest time, in seconds, of a path followed,
+            which bounds the number of paths.
+    Returns:
+        Counter: The own time in microseconds of each collapsed stack.
+    """
+    entries = stats.stats
+    callees = {}
+    for function, (_, _, _, _, callers) in entries.items():
+        for caller, edge in callers.items():
+            callees.setdefault(caller, []).append((function, edge[3]))
+    stacks = Counter()
+
+    def label(function):
+        filename, line, name = function
+        if filename == '~':
+            return name
+        return f'{name} ({_short_path(filename)}:{line})'
+
+    def visit(function, path, share):
+        own_time = entries[function][2]
+        path = path + (label(function),)
+        if own_time * share >= 1e-6:
+            stacks[';'.join(path)] += round(own_time * share * 1e6)
+        if len(path) >= max_depth:
+            return
+        for callee, edge_time in callees.get(function, ()):
+            callee_total = entries[callee][3]
+            if share * edge_time >= min_time and label(callee) not in path:
+                visit(callee, path, share * edge_time / callee_total)
+
+    for function, entry in entries.items():
+        # The roots were called from outside the profile: not every call has a recorded caller
+        if entry[1] > sum(edge[0] for edge in entry[4].values()):
+            visit(function, (), 1.0)
+    return stacks
+
+
+@contextmanager
+def _recording(variable, recorder):
+    token = variable.set((*variable.get(), recorder))
+    try:
+        yield
+    finally:
+        variable.reset(token)
+
+
+def _timed_query(execute, sql, params, many, context):
+    recorders = _query_recorders.get()
+    if not recorders:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        seconds = time.perf_counter() - started
+        for recorder in recorders:
+            recorder(sql, seconds)
+
+
+def install_query_timer(connection):
+    """
+    Times the queries of a database connection inside the query_recorder
+    blocks. Called for each new connection, see oc_lettings_site.signals.
+    """
+    if _timed_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_timed_query)
+
+
+def query_recorder(recorder):
+    """
+    Calls recorder(sql, seconds) for each query run in the block, on any
+    database and in any thread the block's context is copied to.
+    """
+    return _recording(_query_recorders, recorder)
+
+
+def record_queries(queries):
+    """
+    Appends the SQL and duration in milliseconds of each query run in the block.
+    """
+    def recorder(sql, seconds):
+        queries.append({'sql': sql[:MAX_SQL_LENGTH], 'ms': round(seconds * 1000, 3)})
+
+    return query_recorder(recorder)
+
+
+def _timed_render(render):
+    def timed_render(self, context):
+        recorders = _template_recorders.get()
+        if not recorders:
+            return render(self, context)
+        started = time.perf_counter()
+        try:
+            return render(self, context)
+        finally:
+            timing = {
+                'name': self.origin.template_name if self.origin else None,
+                'ms': round((time.perf_counter() - started) * 1000, 3),
+            }
+            for templates in recorders:
+                templates.append(timing)
+    timed_render.profiling = True
+    return timed_render
+
+
+def install_template_timer():
+    """
+    Times the rendering of the Django templates, included ones too, inside
+    the record_templates blocks.
+    """
+    if not getattr(base.Template.render, 'profiling', False):
+        base.Template.render = _timed_render(base.Template.render)
+
+
+def record_templates(templates):
+    """
+    Appends the name and render time in milliseconds of each template rendered
+    in the block. install_template_timer must have run.
+    """
+    return _recording(_template_recorders, templates)
+
+
+class CaptureStore:
+    """
+    Bounded on-disk ring buffer of the profiles: one JSON file per capture,
+    plus the raw cProfile statistics, the oldest captures being deleted once
+    there are more than max_captures.
+    """
+
+    def __init__(self, directory, max_captures):
+        self.directory = directory
+        self.max_captures = max_captures
+
+    def path(self, capture_id, extension='json'):
+        return os.path.join(self.directory, f'{capture_id}.{extension}')
+
+    def save(self, capture, profile=None):
+        """
+        Writes a capture, then deletes the oldest ones over the limit.
+        Returns:
+            str: The capture id, sortable by date.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        capture_id = f"{datetime.datetime.now():%Y%m%d-%H%M%S-%f}-{uuid.uuid4().hex[:6]}"
+        capture['id'] = capture_id
+        if profile is not None:
+            profile.dump_stats(self.path(capture_id, 'prof'))
+        # Written then renamed, so that readers never see a partial capture
+        temporary = self.path(capture_id, 'tmp')
+        with open(temporary, 'w', encoding='utf-8') as file:
+            json.dump(capture, file)
+        os.replace(temporary, self.path(capture_id))
+        for old_id in self.ids()[self.max_captures:]:
+            self.delete(old_id)
+        return capture_id
+
+    def ids(self):
+        """
+        Returns the capture ids, most recent first.
+        """
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return sorted((name[:-5] for name in names if name.endswith('.json')), reverse=True)
+
+    def load(self, capture_id):
+        """
+        Returns a capture, None if it does not exist.
+        """
+        if capture_id not in self.ids():
+            return None
+        try:
+            with open(self.path(capture_id), encoding='utf-8') as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return None
+
+    def delete(self, capture_id):
+        for extension in ('json', 'prof'):
+            try:
+                os.remove(self.path(capture_id, extension))
+            except FileNotFoundError:
+                pass
+
+
+def get_store():
+    return CaptureStore(settings.PROFILING_DIR, settings.PROFILING_MAX_CAPTURES)
+
+
+class ProfilingMiddleware:
+    """
+    Profiles the requests picked by one of the triggers:
+    - 'sampled': a random PROFILING_SAMPLE_RATE share of the requests,
+    - 'header': an 'X-Profile' header carrying a token signed by make_token,
+    - 'slow': with PROFILING_SLOW_MS set, every request is stack sampled and
+      kept when it took longer than this many milliseconds. Under ASGI, it is
+      only timed ('timer' mode, without stacks): the profilers would hold a
+      thread for the whole request, serializing the async views.
+    A capture holds the collapsed stacks, the SQL queries and the template
+    render times, and is stored in the ring buffer of CaptureStore.
+    """
+    async_capable = True
+    sync_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        install_template_timer()
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        mode, trigger = self.trigger(request)
+        if mode is None and not settings.PROFILING_SLOW_MS:
+            return self.get_response(request)
+        return self.profile(request, self.get_response, mode, trigger)
+
+    async def __acall__(self, request):
+        mode, trigger = self.trigger(request)
+        if mode is None:
+            if not settings.PROFILING_SLOW_MS:
+                return await self.get_response(request)
+            return await self.time(request)
+        # Profiled in a thread, as under WSGI: the profilers only see the thread they run in
+        return await sync_to_async(self.profile)(
+            request, async_to_sync(self.get_response), mode, trigger
+        )
+
+    async def time(self, request):
+        """
+        Serves an async request under a timer only, and saves the capture,
+        without stacks, when the request proved slow.
+        Returns:
+            HttpResponse: The response of get_response.
+        """
+        queries, templates = [], []
+        started = time.perf_counter()
+        with record_queries(queries), record_templates(templates):
+            response = await self.get_response(request)
+        duration_ms = (time.perf_counter() - started) * 1000
+        if duration_ms >= settings.PROFILING_SLOW_MS:
+            await sync_to_async(self.save)(
+                request, response, duration_ms, 'slow', 'timer', queries, templates, Counter()
+            )
+        return response
+
+    def profile(self, request, get_response, mode, trigger):
+        """
+        Serves a request under a profiler, and saves the capture when the
+        request was triggered or proved slow.
+        Returns:
+            HttpResponse: The response of get_response.
+        """
+        slow_ms = settings.PROFILING_SLOW_MS
+        # Without an explicit trigger, only the cheap sampler runs until the request proves slow
+        mode = mode or 'sample'
+        profile = cProfile.Profile() if mode == 'cprofile' else None
+        queries, templates = [], []
+        started = time.perf_counter()
+        with record_queries(queries), record_templates(templates):
+            if profile is not None:
+                try:
+                    profile.enable()
+                except ValueError:
+                    # Python 3.12+ runs a single cProfile at a time per process
+                    profile, mode = None, 'sample'
+            if profile is None:
+                get_sampler().start()
+            try:
+                response = get_response(request)
+            finally:
+                if profile is not None:
+                    profile.disable()
+                else:
+                    samples = get_sampler().stop()
+        duration_ms = (time.perf_counter() - started) * 1000
+
+        if trigger is None:
+            if duration_ms < slow_ms:
+                return response
+            trigger = 'slow'
+        self.save(
+            request, response, duration_ms, trigger, mode, queries, templates,
+            None if profile else samples, profile
+        )
+        return response
+
+    def save(self, request, response, duration_ms, trigger, mode, queries, templates, stacks,
+             profile=None):
+        """
+        Stores the capture of a served request, the stacks being collapsed
+        from the cProfile statistics when there are some. The errors are
+        reported rather than raised, so that the response is still sent.
+        """
+        try:
+            if profile is not None:
+                stacks = collapsed_stacks(pstats.Stats(profile))
+            get_store().save({
+                'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+                'method': request.method,
+                'path': request.get_full_path(),
+                'status': response.status_code,
+                'duration_ms': round(duration_ms, 3),
+                'trigger': trigger,
+                'mode': mode,
+                'queries': queries,
+                'templates': templates,
+                'stacks': dict(stacks.most_common()),
+            }, profile)
+        except Exception as e:
+            # Capturing sentry exception
+            reporting.report_exception(
+                e, "Erreur dans oc_lettings_site.profiling ProfilingMiddleware."
+            )
+
+    def trigger(self, request):
+        """
+        Returns the profiler and the trigger of a request, (None, None) when
+        it is not profiled upfront.
+        """
+        token = request.META.get(HEADER)
+        if token:
+            mode = read_token(token)
+            if mode is not None:
+                return mode, 'header'
+        rate = settings.PROFILING_SAMPLE_RATE
+        if rate and random.random() < rate:
+            return settings.PROFILING_MODE, 'sampled'
+        return None, None
@@ -0,0 +1,54 @@
+from contextlib import contextmanager
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+# Maximum number of SQL queries allowed per named route
+# (one query computes the ETag and Last-Modified, one renders the page,
+# the lettings index reads the facet summary when it is not cached)
+QUERY_BUDGETS = {
+    'index': 0,
+    'lettings:index': 3,
+    'lettings:letting': 2,
+    'lettings:search': 3,
+    'lettings:near': 4,
+    'profiles:index': 2,
+    'profiles:profile': 2,
+    'profiles:autocomplete': 0,
+    'api:lettings': 1,
+    'api:letting': 1,
+    'api:profiles': 1,
+    'api:profile': 1,
+}
+
+
+class QueryBudgetExceeded(AssertionError):
+    """
+    Raised when a view runs more SQL queries than its budget allows.
+    """
+
+
+@contextmanager
+def query_budget(view_name, budget=None):
+    """
+    Fails when the wrapped block runs more queries than the view's budget.
+    Args:
+        view_name (str): The route name, as used with reverse().
+        budget (int): Overrides the budget declared in QUERY_BUDGETS.
+    Yields:
+        CaptureQueriesContext: The captured queries.
+    Raises:
+        QueryBudgetExceeded: If the block exceeds the budget.
+    """
+    if budget is None:
+        budget = QUERY_BUDGETS[view_name]
+
+    with CaptureQueriesContext(connection) as context:
+        yield context
+
+    executed = len(context)
+    if executed > budget:
+        queries = '\n'.join(query['sql'] for query in context.captured_queries)
+        raise QueryBudgetExceeded(
+            f"{view_name} ran {executed} queries, budget is {budget}:\n{queries}"
+        )
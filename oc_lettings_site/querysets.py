@@ -0,0 +1,23 @@
+from django.db import models
+
+
+class ViewQuerySet(models.QuerySet):
+    """
+    Base QuerySet declaring, for each view, the relations its template reads.
+    Subclasses fill 'view_relations' so that a view only has to call
+    'for_view()' to load every needed relation in one joined query.
+    """
+    view_relations = {}
+
+    def for_view(self, view_name):
+        """
+        Returns the queryset with the relations declared for the given view.
+        Args:
+            view_name (str): The key of the view in 'view_relations'.
+        Returns:
+            QuerySet: The queryset joined with the declared relations.
+        """
+        relations = self.view_relations.get(view_name, ())
+        if not relations:
+            return self.all()
+        return self.select_related(*relations)
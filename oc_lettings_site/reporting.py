@@ -0,0 +1,246 @@
+import os
+import queue
+import random
+import sys
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+from django.conf import settings
+from oc_lettings_site import metrics, sentry_config
+
+
+# Outcomes of a report, counted by the 'oc_lettings_reports_total' metric
+OUTCOMES = ('queued', 'deduplicated', 'sampled_out', 'rate_limited', 'queue_full')
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+class SentryTransport:
+    """
+    Sends the reports to Sentry, in the scopes of the request which made them.
+    """
+
+    def send(self, report):
+        import sentry_sdk
+        from sentry_sdk.scope import use_isolation_scope, use_scope
+
+        # The reports of the management commands initialize Sentry too
+        sentry_config.ensure_sentry()
+        isolation_scope = report.get('isolation_scope') or sentry_sdk.get_isolation_scope().fork()
+        current_scope = report.get('scope') or sentry_sdk.get_current_scope().fork()
+        with use_isolation_scope(isolation_scope), use_scope(current_scope):
+            scope = sentry_sdk.get_current_scope()
+            # Time of the error, not of its sending (see sentry_config.add_timestamp)
+            scope.set_tag('timestamp', time.strftime(
+                TIMESTAMP_FORMAT, time.localtime(report['created'])
+            ))
+            if report['duplicates']:
+                scope.set_extra('duplicates', report['duplicates'])
+            if report['exception'] is None:
+                sentry_sdk.capture_message(report['message'], level=report['level'])
+            else:
+                scope.set_extra('message', report['message'])
+                sentry_sdk.capture_exception(report['exception'])
+
+
+class MemoryTransport:
+    """
+    Keeps the reports in memory, to test the reporting offline.
+    """
+
+    def __init__(self):
+        self.reports = []
+
+    def send(self, report):
+        self.reports.append({
+            key: report[key]
+            for key in ('exception', 'message', 'level', 'duplicates', 'created')
+        })
+
+
+TRANSPORTS = {
+    'sentry': SentryTransport,
+    'memory': MemoryTransport,
+}
+
+
+class Reporter:
+    """
+    Reports errors and messages without ever blocking the caller: a report is
+    sampled, deduplicated and rate limited in the calling thread, then put on
+    a bounded queue that a background thread sends to the transport. Reports
+    which cannot be queued at once are dropped and counted.
+    """
+
+    def __init__(self, transport):
+        self.transport = transport
+        self.queue = queue.Queue(maxsize=settings.REPORTING_QUEUE_SIZE)
+        self.lock = threading.Lock()
+        # Identical reports seen in the current window: key -> [window start, duplicates]
+        self.recent = {}
+        self.tokens = settings.REPORTING_RATE_BURST
+        self.refilled = time.monotonic()
+        self.thread = None
+        self.pid = os.getpid()
+
+    def report(self, exception, message, level):
+        """
+        Queues a report, unless it is a duplicate, sampled out or rate limited.
+        Returns:
+            str: The outcome, one of OUTCOMES.
+        """
+        rate = (
+            settings.REPORTING_ERROR_SAMPLE_RATE if exception is not None
+            else settings.REPORTING_MESSAGE_SAMPLE_RATE
+        )
+        if rate < 1 and random.random() >= rate:
+            return self._count('sampled_out')
+
+        now = time.monotonic()
+        key = self._key(exception, message)
+        with self.lock:
+            seen = self.recent.get(key)
+            if seen is not None and now - seen[0] < settings.REPORTING_DEDUP_WINDOW:
+                seen[1] += 1
+                return self._count('deduplicated')
+            duplicates = seen[1] if seen is not None else 0
+            self.recent[key] = [now, 0]
+            if len(self.recent) > settings.REPORTING_MAX_KEYS:
+                self._forget(now)
+
+            self.tokens = min(
+                settings.REPORTING_RATE_BURST,
+                self.tokens + (now - self.refilled) * settings.REPORTING_RATE_LIMIT
+            )
+            self.refilled = now
+            if self.tokens < 1:
+                return self._count('rate_limited')
+            self.tokens -= 1
+
+        report = {
+            'exception': exception,
+            'message': message,
+            'level': level,
+            # Reports of the previous window folded into this one
+            'duplicates': duplicates,
+            'created': time.time(),
+        }
+        sdk = sys.modules.get('sentry_sdk')
+        if sdk is not None:
+            # Without the SDK loaded, no scope holds request data yet
+            report['isolation_scope'] = sdk.get_isolation_scope().fork()
+            report['scope'] = sdk.get_current_scope().fork()
+        self._start()
+        try:
+            self.queue.put_nowait(report)
+        except queue.Full:
+            return self._count('queue_full')
+        return self._count('queued')
+
+    @staticmethod
+    def _key(exception, message):
+        if exception is None:
+            return (None, message)
+        # The same error is raised by the same line, whatever its arguments
+        frames = traceback.extract_tb(exception.__traceback__)
+        origin = (frames[-1].filename, frames[-1].lineno) if frames else None
+        return (type(exception).__qualname__, message, origin)
+
+    def _forget(self, now):
+        window = settings.REPORTING_DEDUP_WINDOW
+        self.recent = {
+            key: seen for key, seen in self.recent.items() if now - seen[0] < window
+        }
+
+    def _count(self, outcome):
+        metrics.inc('oc_lettings_reports_total', (('outcome', outcome),))
+        return outcome
+
+    def _start(self):
+        if self.thread is None or not self.thread.is_alive():
+            with self.lock:
+                if self.thread is None or not self.thread.is_alive():
+                    self.thread = threading.Thread(
+                        target=self._run, name='reporting', daemon=True
+                    )
+                    self.thread.start()
+
+    def _run(self):
+        while True:
+            report = self.queue.get()
+            try:
+                self.transport.send(report)
+            except Exception:
+                # The reporting must never fail, nor stop the thread
+                pass
+            finally:
+                self.queue.task_done()
+
+    def flush(self, timeout=2.0):
+        """
+        Waits until the queued reports are sent, at most timeout seconds.
+        Returns:
+            bool: True if the queue was emptied.
+        """
+        deadline = time.monotonic() + timeout
+        while self.queue.unfinished_tasks:
+            if time.monotonic() > deadline:
+                return False
+            time.sleep(0.005)
+        return True
+
+
+_reporter = None
+
+
+def get_reporter():
+    """
+    Returns the reporter of the current process, using REPORTING_TRANSPORT.
+    """
+    global _reporter
+    if _reporter is None or _reporter.pid != os.getpid():
+        # A forked worker needs its own queue and thread
+        _reporter = Reporter(TRANSPORTS[settings.REPORTING_TRANSPORT]())
+    return _reporter
+
+
+def report_exception(exception, message):
+    """
+    Reports an exception to Sentry, as a single event with a description.
+    Never blocks nor raises.
+    Args:
+        exception (Exception): The caught exception.
+        message (str): Where it was caught, e.g. "Erreur dans lettings.views index."
+    Returns:
+        str: The outcome, one of OUTCOMES.
+    """
+    return get_reporter().report(exception, message, 'error')
+
+
+def report_message(message, level='info'):
+    """
+    Reports a message to Sentry. Never blocks nor raises.
+    Returns:
+        str: The outcome, one of OUTCOMES.
+    """
+    return get_reporter().report(None, message, level)
+
+
+@contextmanager
+def capture_reports():
+    """
+    Sends the reports of the block to a MemoryTransport, with a fresh
+    deduplication state, and waits for them to be sent on exit.
+    Yields:
+        list: The reports, as dicts, filled once the block exits.
+    """
+    global _reporter
+    previous = _reporter
+    transport = MemoryTransport()
+    _reporter = Reporter(transport)
+    try:
+        yield transport.reports
+    finally:
+        _reporter.flush()
+        _reporter = previous
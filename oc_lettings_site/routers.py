@@ -0,0 +1,135 @@
+import contextvars
+import random
+import time
+from contextlib import contextmanager
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.urls import reverse
+
+
+# The reads of the current request, or thread outside requests, go to the primary
+_pinned = contextvars.ContextVar('pinned', default=False)
+# The current request, or thread outside requests, wrote to the primary
+_wrote = contextvars.ContextVar('wrote', default=False)
+
+# Apps whose writes are not read back from the replicas
+UNREPLICATED_WRITES = ('sessions',)
+
+
+def is_pinned():
+    """
+    Returns True if the reads of the current request go to the primary.
+    """
+    return _pinned.get() or _wrote.get()
+
+
+@contextmanager
+def primary_reads():
+    """
+    Sends the reads of the block to the primary: the rendered pages, cached
+    without expiry, and their validators, which a lagging replica would
+    leave stale under the new table versions for every client.
+    """
+    token = _pinned.set(True)
+    try:
+        yield
+    finally:
+        _pinned.reset(token)
+
+
+class ReplicaRouter:
+    """
+    Sends the reads of the REPLICA_APPS models to a random replica of
+    DATABASE_REPLICAS, everything else to the primary ('default'): writes,
+    auth, sessions, admin log. Once a request wrote, and for
+    REPLICA_STICKY_SECONDS after (see ReplicaStickinessMiddleware), its
+    client reads from the primary, so that it sees its own writes. The
+    pages rendered for the page cache and the ETags are read from the
+    primary too (see primary_reads).
+    """
+
+    def db_for_read(self, model, **hints):
+        replicas = settings.DATABASE_REPLICAS
+        if not replicas or is_pinned() or model._meta.app_label not in settings.REPLICA_APPS:
+            return 'default'
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label not in UNREPLICATED_WRITES:
+            _wrote.set(True)
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replicas hold the same rows as the primary
+        databases = {'default', *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replicas are migrated by the replication
+        return db not in settings.DATABASE_REPLICAS
+
+
+class ReplicaStickinessMiddleware:
+    """
+    Pins a request to the primary when its client wrote in the last
+    REPLICA_STICKY_SECONDS, shown by a cookie, or when it goes to the admin,
+    and sets the cookie when the request wrote.
+    """
+
+    async_capable = True
+    sync_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        tokens = self.pin(request)
+        try:
+            response = self.get_response(request)
+            wrote = _wrote.get()
+        finally:
+            self.unpin(tokens)
+        return self.stick(response, wrote)
+
+    async def __acall__(self, request):
+        # The ORM threads of async views get a copy of the context, and hand it back
+        tokens = self.pin(request)
+        try:
+            response = await self.get_response(request)
+            wrote = _wrote.get()
+        finally:
+            self.unpin(tokens)
+        return self.stick(response, wrote)
+
+    def pin(self, request):
+        pinned = (
+            request.path.startswith(reverse('admin:index'))
+            or _sticky_until(request) > time.time()
+        )
+        return _pinned.set(pinned), _wrote.set(False)
+
+    def unpin(self, tokens):
+        _pinned.reset(tokens[0])
+        _wrote.reset(tokens[1])
+
+    def stick(self, response, wrote):
+        if wrote:
+            until = time.time() + settings.REPLICA_STICKY_SECONDS
+            response.set_cookie(
+                settings.REPLICA_STICKY_COOKIE, f'{until:.3f}',
+                max_age=settings.REPLICA_STICKY_SECONDS, httponly=True, samesite='Lax'
+            )
+        return response
+
+
+def _sticky_until(request):
+    try:
+        return float(request.COOKIES.get(settings.REPLICA_STICKY_COOKIE, 0))
+    except ValueError:
+        return 0
@@ -1,15 +1,22 @@
 import os
+import random
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime
-import sentry_sdk
-from sentry_sdk.integrations.django import DjangoIntegration
+from django import shortcuts
+from django.conf import settings
 
 
-def add_timestamp(event, hint):
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+# Requests never traced: scrapes and static files
+UNTRACED_PATHS = ('/metrics', '/static/')
+
 
-    # Add timestamp to tags
+def add_timestamp(event, hint):
+    # Add timestamp to tags, unless the reporting already set the time of the error
     if 'tags' not in event:
         event['tags'] = {}
+    timestamp = event['tags'].get('timestamp') or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     event['tags']['timestamp'] = timestamp
 
     # Add timestamp to added data
@@ -24,12 +31,152 @@ def add_timestamp(event, hint):
     return event
 
 
+class TransactionSampler:
+    """
+    Tail-based sampling of the performance transactions: every request is
+    traced, then its transaction is kept when it failed, took more than
+    slow_ms milliseconds or was profiled, and only a sample_rate share of the
+    other ones is sent. Whether a request is profiled is decided when it
+    starts, before its outcome is known: the profiled ones are always sent,
+    so that no profile is recorded to be dropped.
+    """
+
+    def __init__(self, sample_rate, slow_ms):
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+
+    def traces_sampler(self, sampling_context):
+        # Follow the decision of the calling service, when there is one
+        if sampling_context.get('parent_sampled') is not None:
+            return float(sampling_context['parent_sampled'])
+        # The request path, under WSGI or under ASGI
+        path = (
+            sampling_context.get('wsgi_environ', {}).get('PATH_INFO')
+            or sampling_context.get('asgi_scope', {}).get('path')
+            or ''
+        )
+        if path.startswith(UNTRACED_PATHS):
+            return 0.0
+        # Every transaction is recorded, before_send_transaction decides which are sent
+        return 1.0
+
+    def before_send_transaction(self, event, hint):
+        status = event.get('contexts', {}).get('trace', {}).get('status')
+        duration_ms = _seconds(event.get('timestamp')) - _seconds(event.get('start_timestamp'))
+        duration_ms *= 1000
+        if status not in (None, 'ok'):
+            reason = 'error'
+        elif duration_ms >= self.slow_ms:
+            reason = 'slow'
+        elif 'profile' in event:
+            reason = 'profiled'
+        elif random.random() < self.sample_rate:
+            reason = 'sampled'
+        else:
+            return None
+        event.setdefault('tags', {})['sampling.reason'] = reason
+        return event
+
+
+def _seconds(timestamp):
+    # Transaction timestamps are datetimes, or ISO strings once serialized
+    if isinstance(timestamp, str):
+        timestamp = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+    if isinstance(timestamp, datetime):
+        return timestamp.timestamp()
+    return float(timestamp or 0)
+
+
+@contextmanager
+def span(op, name):
+    """
+    Times a block of a view as a span of the current transaction, e.g. the
+    ORM calls of a view with op 'db'. Does nothing when the request is not traced.
+    Args:
+        op (str): The span operation, e.g. 'db'.
+        name (str): The span description, e.g. 'lettings.views index'.
+    """
+    # Imported here, the SDK is only loaded by the first traced request
+    import sentry_sdk
+    with sentry_sdk.start_span(op=op, name=name) as current:
+        yield current
+
+
+def render(request, template_name, context=None, **kwargs):
+    """
+    Renders a template like django.shortcuts.render, looked up at each call
+    so that the 'template.render' spans of the Sentry integration, installed
+    after the views are imported, apply to the views too.
+    """
+    return shortcuts.render(request, template_name, context, **kwargs)
+
+
+def tracing_options():
+    """
+    Reads the tracing options from the environment. Tracing is opt-in: it is
+    enabled by a SENTRY_TRACES_SAMPLE_RATE above 0, the share of the fast
+    transactions sent, SENTRY_TRACES_SLOW_MS (500) sets the latency above
+    which a transaction is always sent, and SENTRY_PROFILES_SAMPLE_RATE the
+    share of the traced requests which are profiled, and then always sent.
+    The profiling overhead applies to that share of every request.
+    Returns:
+        dict: The options of sentry_sdk.init.
+    """
+    sample_rate = float(os.getenv('SENTRY_TRACES_SAMPLE_RATE', '0'))
+    if sample_rate <= 0:
+        return {}
+    sampler = TransactionSampler(sample_rate, float(os.getenv('SENTRY_TRACES_SLOW_MS', '500')))
+    return {
+        'traces_sampler': sampler.traces_sampler,
+        'before_send_transaction': sampler.before_send_transaction,
+        'profiles_sample_rate': float(os.getenv('SENTRY_PROFILES_SAMPLE_RATE', '0')),
+    }
+
+
 def initialize_sentry(env_str):
-    """Initialize Sentry with timestamp configuration"""
+    """Initialize Sentry with timestamp configuration and the optional tracing"""
+    import sentry_sdk
+    from sentry_sdk.integrations.django import DjangoIntegration
+
     sentry_sdk.init(
         dsn=os.getenv('SENTRY_DSN'),
         integrations=[DjangoIntegration()],
         environment=env_str,
         send_default_pii=True,
-        before_send=add_timestamp
+        before_send=add_timestamp,
+        **tracing_options()
     )
+
+
+_initialized_pid = None
+_init_seconds = None
+_init_lock = threading.Lock()
+
+
+def ensure_sentry():
+    """
+    Initializes Sentry once per process, with the SENTRY_ENVIRONMENT setting.
+    Called by the gunicorn post_fork hook and the WSGI and ASGI modules, else
+    by the first request or the first report, so that the settings import and
+    the management commands do not load the SDK, and forked workers start
+    their own SDK threads. Without SENTRY_DSN nothing would be sent, and the
+    SDK is not loaded at all.
+    Returns:
+        float: The initialization time in seconds, None if already initialized.
+    """
+    global _initialized_pid, _init_seconds
+    if _initialized_pid == os.getpid() or not os.getenv('SENTRY_DSN'):
+        return None
+    with _init_lock:
+        if _initialized_pid == os.getpid():
+            return None
+        started = time.perf_counter()
+        initialize_sentry(settings.SENTRY_ENVIRONMENT)
+        _init_seconds = time.perf_counter() - started
+        _initialized_pid = os.getpid()
+        return _init_seconds
+
+
+def init_on_request(sender, **kwargs):
+    # Receiver of request_started, for the servers without a post_fork hook
+    ensure_sentry()
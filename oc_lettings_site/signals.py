@@ -1,20 +1,104 @@
+from functools import partial
 from django.contrib.auth.models import User
-from django.contrib.auth.signals import user_login_failed
+from django.contrib.auth.signals import user_logged_in, user_login_failed
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-import sentry_sdk
+
+from lettings import summary
+from lettings.models import Address, Letting
+from profiles.models import Profile
+from profiles.autocomplete import AUTOCOMPLETERS
+from oc_lettings_site import login_guard, page_cache, profiling, versioning
+
+
+@receiver(connection_created)
+def install_query_timer(sender, connection, **kwargs):
+    # Feeds the query recorders of the metrics and the profiler, in every thread
+    profiling.install_query_timer(connection)
 
 
 @receiver(user_login_failed)
-def log_failed_login(sender, credentials, **kwargs):
-    username = credentials.get('username')
-    if not username:
-        # No Username given
-        sentry_sdk.capture_message("Échec de connexion sans nom d'utilisateur fourni.")
-        return
+def log_failed_login(sender, credentials, request=None, **kwargs):
+    # Counted, throttled and summarized, see login_guard.record_failure
+    login_guard.record_failure(credentials.get('username'), request)
+
+
+@receiver(user_logged_in)
+def clear_failed_logins(sender, request, user, **kwargs):
+    # Failures are counted per username and address, see login_guard.record_failure
+    login_guard.clear_failures('username', (user.get_username(), login_guard.client_ip(request)))
+
+
+@receiver(post_save, sender=User)
+def cache_username(sender, instance, **kwargs):
+    login_guard.set_username_exists(instance.username, True)
+
+
+@receiver(post_delete, sender=User)
+def forget_username(sender, instance, **kwargs):
+    login_guard.set_username_exists(instance.username, False)
+
+
+# The summaries, page caches and table versions change once the write is
+# committed: a request reading the rows in between would otherwise cache the
+# old page under the new version, where it would never expire.
+
+@receiver([post_save, post_delete], sender=Letting)
+def refresh_letting_summary(sender, instance, using, **kwargs):
+    # Before the pages are invalidated, so that they are rebuilt from the new summary
+    transaction.on_commit(partial(summary.refresh, [instance.id]), using=using)
 
-    if User.objects.filter(username=username).exists():
-        # Failed Password
-        sentry_sdk.capture_message(f"Échec de connexion pour l'utilisateur existant: {username}")
+
+@receiver(post_save, sender=Address)
+def refresh_address_summaries(sender, instance, using, **kwargs):
+    # Deleting an address deletes its letting, whose signal removes the summary
+    ids = list(
+        Letting.objects.using(using).filter(address_id=instance.id).values_list('id', flat=True)
+    )
+    transaction.on_commit(partial(summary.refresh, ids), using=using)
+
+
+@receiver([post_save, post_delete], sender=Address)
+@receiver([post_save, post_delete], sender=Letting)
+def invalidate_lettings_pages(sender, using, **kwargs):
+    # Lettings pages show letting titles and addresses
+    transaction.on_commit(partial(page_cache.invalidate, 'lettings'), using=using)
+
+
+@receiver([post_save, post_delete], sender=Profile)
+@receiver([post_save, post_delete], sender=User)
+def invalidate_profiles_pages(sender, using, **kwargs):
+    # Profiles pages show profile and user fields
+    transaction.on_commit(partial(page_cache.invalidate, 'profiles'), using=using)
+
+
+@receiver([post_save, post_delete], sender=Address)
+@receiver([post_save, post_delete], sender=Letting)
+@receiver([post_save, post_delete], sender=Profile)
+@receiver([post_save, post_delete], sender=User)
+def bump_model_version(sender, using, **kwargs):
+    # Table versions feed the ETag and Last-Modified of the list pages
+    transaction.on_commit(partial(versioning.bump, sender), using=using)
+
+
+@receiver(post_save, sender=Profile)
+def update_profiles_autocomplete(sender, instance, created, **kwargs):
+    if created:
+        # New profile, added in place
+        AUTOCOMPLETERS['username'].add(instance.user.username)
+        AUTOCOMPLETERS['city'].add(instance.favorite_city)
     else:
-        # Failed Username
-        sentry_sdk.capture_message(f"Échec de connexion pour l'utilisateur inexistant: {username}")
+        # The previous values are unknown, rebuilt on next use
+        AUTOCOMPLETERS['city'].invalidate()
+
+
+@receiver(post_delete, sender=Profile)
+@receiver([post_save, post_delete], sender=User)
+def invalidate_profiles_autocomplete(sender, created=False, update_fields=None, **kwargs):
+    if created or (update_fields and 'username' not in update_fields):
+        # New users have no profile yet, and only usernames are indexed
+        return
+    for autocompleter in AUTOCOMPLETERS.values():
+        autocompleter.invalidate()
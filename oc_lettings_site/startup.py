@@ -0,0 +1,161 @@
+import io
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from wsgiref.util import setup_testing_defaults
+
+
+# Phases of a cold start, in order
+PHASES = ('interpreter', 'settings', 'setup', 'application', 'first_request')
+
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+
+def measure(url):
+    """
+    Times the startup phases of the current process, from the settings to
+    the first request, sent to the WSGI application. Meant to run in a fresh
+    interpreter, see profile_startup.
+    Returns:
+        dict: The duration in seconds of each phase, the Sentry initialization
+            time and the status of the first request.
+    """
+    timings = {}
+    started = time.perf_counter()
+
+    def lap(phase):
+        nonlocal started
+        now = time.perf_counter()
+        timings[phase] = now - started
+        started = now
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'oc_lettings_site.settings')
+    from django.conf import settings
+    settings.INSTALLED_APPS
+    lap('settings')
+    import django
+    django.setup()
+    lap('setup')
+    from oc_lettings_site.wsgi import application
+    lap('application')
+    status = _request(application, url)
+    lap('first_request')
+
+    from oc_lettings_site import sentry_config
+    return {'phases': timings, 'sentry_init': sentry_config._init_seconds, 'status': status}
+
+
+def _request(application, url):
+    path, _, query = url.partition('?')
+    environ = {
+        'PATH_INFO': path,
+        'QUERY_STRING': query,
+        'HTTP_HOST': 'localhost',
+        'SERVER_NAME': 'localhost',
+        'wsgi.input': io.BytesIO(),
+    }
+    setup_testing_defaults(environ)
+    statuses = []
+    response = application(environ, lambda status, headers, exc_info=None: statuses.append(status))
+    try:
+        for _ in response:
+            pass
+    finally:
+        response.close()
+    return int(statuses[0].split()[0])
+
+
+def parse_importtime(output):
+    """
+    Parses the output of python -X importtime.
+    Returns:
+        list: The imported modules, in import order, as dicts with their own
+            and cumulative times in microseconds and their nesting depth.
+    """
+    imports = []
+    for line in output.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            imports.append({
+                'module': match[4],
+                'self_us': int(match[1]),
+                'cumulative_us': int(match[2]),
+                'depth': (len(match[3]) - 1) // 2,
+            })
+    return imports
+
+
+def packages(imports):
+    """
+    Sums the own import times by top-level package.
+    Returns:
+        list: (package, milliseconds) pairs, slowest first.
+    """
+    totals = {}
+    for entry in imports:
+        package = entry['module'].split('.')[0]
+        totals[package] = totals.get(package, 0) + entry['self_us']
+    return sorted(
+        ((package, round(us / 1000, 2)) for package, us in totals.items()),
+        key=lambda pair: pair[1], reverse=True
+    )
+
+
+def profile_startup(url='/', runs=1, python=None):
+    """
+    Starts fresh interpreters with -X importtime, each sending one request,
+    and measures their cold start.
+    Args:
+        url (str): The URL of the first request.
+        runs (int): The number of interpreters started, the median is kept.
+        python (str): The interpreter, the current one by default.
+    Returns:
+        dict: The median duration in milliseconds of each phase, the Sentry
+            initialization time, the status of the first request, and the
+            import times of the last run by package and by top-level import.
+    """
+    results = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        process = subprocess.run(
+            [python or sys.executable, '-X', 'importtime', '-m', 'oc_lettings_site.startup', url],
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            capture_output=True, text=True,
+        )
+        total = time.perf_counter() - started
+        if process.returncode:
+            raise RuntimeError(process.stderr.strip().splitlines()[-1])
+        measured = json.loads(process.stdout.strip().splitlines()[-1])
+        # The interpreter start is whatever the child process did not measure itself
+        measured['phases']['interpreter'] = total - sum(measured['phases'].values())
+        measured['total'] = total
+        results.append((measured, process.stderr))
+
+    imports = parse_importtime(results[-1][1])
+    sentry_times = [measured['sentry_init'] for measured, _ in results if measured['sentry_init']]
+    return {
+        'runs': runs,
+        'status': results[-1][0]['status'],
+        'phases_ms': {
+            phase: round(statistics.median(m['phases'][phase] for m, _ in results) * 1000, 2)
+            for phase in PHASES
+        },
+        'total_ms': round(statistics.median(m['total'] for m, _ in results) * 1000, 2),
+        'sentry_init_ms': (
+            round(statistics.median(sentry_times) * 1000, 2) if sentry_times else None
+        ),
+        'packages_ms': packages(imports),
+        'imports_ms': sorted(
+            ((entry['module'], round(entry['cumulative_us'] / 1000, 2))
+             for entry in imports if entry['depth'] == 0),
+            key=lambda pair: pair[1], reverse=True
+        ),
+    }
+
+
+if __name__ == '__main__':
+    print(json.dumps(measure(sys.argv[1] if len(sys.argv) > 1 else '/')))
@@ -7,6 +7,13 @@ urlpatterns = [
     path('', views.index, name='index'),
     path('lettings/', include('lettings.urls', namespace='lettings')),
     path('profiles/', include('profiles.urls', namespace='profiles')),
+    path('api/v1/', include('oc_lettings_site.api_urls', namespace='api')),
+    path('metrics', views.metrics, name='metrics'),
+    path('admin/profiling/', views.profiling_captures, name='profiling'),
+    path(
+        'admin/profiling/<str:capture_id>.<str:format>',
+        views.profiling_capture, name='profiling-capture'
+    ),
     path('admin/', admin.site.urls),
 ]
 """
@@ -14,5 +21,8 @@ URL configuration for the main app.
 - '' → Calls the index view and
 - 'lettings/' → Calls the lettings view and lists all lettings.
 - 'profiles/' → Calls the profiles view and lists all profiles.
+- 'api/v1/' → Calls the JSON API views (see api_urls).
+- 'metrics' → Exports the Prometheus metrics.
+- 'admin/profiling/' → Lists the profiling captures, staff only.
 - 'admin/' → Calls the admin view.
 """
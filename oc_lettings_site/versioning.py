@@ -0,0 +1,152 @@
+from functools import lru_cache, wraps
+from hashlib import md5
+from pathlib import Path
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+from django.views.decorators.http import condition
+from oc_lettings_site.models import ModelVersion
+from oc_lettings_site.routers import primary_reads
+
+
+def model_label(model):
+    """
+    Returns the label identifying a model's table in ModelVersion, e.g. 'lettings.letting'.
+    """
+    return model._meta.label_lower
+
+
+def bump(*models):
+    """
+    Increments the version counter of each given model.
+    Args:
+        *models: The model classes whose table changed.
+    """
+    now = timezone.now()
+    for model in models:
+        label = model_label(model)
+        updated = ModelVersion.objects.filter(label=label).update(
+            version=F('version') + 1, updated_at=now
+        )
+        if not updated:
+            version, created = ModelVersion.objects.get_or_create(
+                label=label, defaults={'version': 1}
+            )
+            if not created:
+                ModelVersion.objects.filter(pk=version.pk).update(
+                    version=F('version') + 1, updated_at=now
+                )
+
+
+def versions(*models):
+    """
+    Returns the version counters of the given models in a single query.
+    Args:
+        *models: The model classes.
+    Returns:
+        dict: (version, updated_at) by model label, (0, None) for a never changed table.
+    """
+    labels = [model_label(model) for model in models]
+    found = {
+        label: (version, updated_at)
+        for label, version, updated_at in ModelVersion.objects.filter(
+            label__in=labels
+        ).values_list('label', 'version', 'updated_at')
+    }
+    return {label: found.get(label, (0, None)) for label in labels}
+
+
+def table_validators(view_name, *models, extra=None):
+    """
+    Returns a function computing the ETag and Last-Modified of a page that
+    depends on whole tables, from their versions only.
+    Args:
+        view_name (str): The route name, part of the ETag.
+        *models: The model classes whose tables the page reads.
+        extra (callable): Returns other values the page depends on, e.g. settings,
+            made part of the ETag.
+    Returns:
+        callable: The function to give to cached_validators().
+    """
+    def compute(*args, **kwargs):
+        table_versions = versions(*models).values()
+        parts = [version for version, _ in table_versions]
+        if extra is not None:
+            parts.extend(extra())
+        etag = make_etag(view_name, *parts)
+        updates = [updated_at for _, updated_at in table_versions if updated_at]
+        return etag, max(updates, default=None)
+    return compute
+
+
+@lru_cache(maxsize=1)
+def templates_digest():
+    """
+    Returns a digest of every project template, computed once per process,
+    so that a deployment changing a template changes every ETag.
+    """
+    digest = md5(settings.ETAG_SALT.encode(), usedforsecurity=False)
+    for path in sorted(Path(settings.BASE_DIR).glob('*/templates/**/*.html')):
+        digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+def make_etag(*parts):
+    """
+    Builds a quoted ETag from the templates digest and the given parts.
+    """
+    key = '|'.join([templates_digest()] + [str(part) for part in parts])
+    return f'"{md5(key.encode(), usedforsecurity=False).hexdigest()}"'
+
+
+def cached_validators(compute):
+    """
+    Wraps a function computing (etag, last_modified) for a request, so that it
+    runs once per request even though condition() asks for both validators.
+    Args:
+        compute (callable): Called with the view arguments, returns a tuple
+            (etag, last_modified) or None when the resource does not exist.
+    Returns:
+        tuple: The etag and last_modified functions to give to condition().
+    """
+    def validators(request, *args, **kwargs):
+        if not hasattr(request, '_validators'):
+            try:
+                # From the primary, as the pages they validate (see page_cache.cached_page)
+                with primary_reads():
+                    request._validators = compute(*args, **kwargs) or (None, None)
+            except Exception:
+                # Let the view run and report the error itself
+                request._validators = (None, None)
+        return request._validators
+
+    def etag(request, *args, **kwargs):
+        return validators(request, *args, **kwargs)[0]
+
+    def last_modified(request, *args, **kwargs):
+        return validators(request, *args, **kwargs)[1]
+
+    return etag, last_modified
+
+
+def async_condition(etag_func, last_modified_func):
+    """
+    condition() for async views. The validators made by cached_validators
+    read the cache and the database: they are computed once, in a thread,
+    then condition() reads them back from the request.
+    Args:
+        etag_func (callable): The etag function of cached_validators.
+        last_modified_func (callable): The last_modified function of cached_validators.
+    Returns:
+        callable: The view decorator.
+    """
+    def decorator(view):
+        conditional_view = condition(etag_func, last_modified_func)(view)
+
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            await sync_to_async(etag_func)(request, *args, **kwargs)
+            return await conditional_view(request, *args, **kwargs)
+        return wrapper
+    return decorator
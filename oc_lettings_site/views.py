@@ -1,7 +1,23 @@
-import sentry_sdk
-from django.shortcuts import render
+import json
+from django.contrib import admin
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.utils.crypto import constant_time_compare
+from django.http import FileResponse, Http404, HttpResponse
+from django.views.decorators.http import etag
+from oc_lettings_site import metrics as metrics_module, reporting, versioning
+from oc_lettings_site.profiling import get_store
+from oc_lettings_site.sentry_config import render
 
 
+def index_etag(request):
+    """
+    Computes the ETag of the main index page, which only depends on the templates.
+    """
+    return versioning.make_etag('index')
+
+
+@etag(index_etag)
 def index(request):
     """
     Renders the main index page.
@@ -14,6 +30,101 @@ def index(request):
         return render(request, 'oc_lettings_site/index.html')
     except Exception as e:
         # Capturing sentry exception
-        sentry_sdk.capture_exception(e)
-        sentry_sdk.capture_message("Erreur dans oc_lettings_site.views index.")
+        reporting.report_exception(e, "Erreur dans oc_lettings_site.views index.")
+        return render(request, '500.html', status=500)
+
+
+@staff_member_required
+def profiling_captures(request):
+    """
+    Lists the profiling captures of the ring buffer, most recent first.
+    Args:
+        request: The HTTP request object.
+    Returns:
+        HttpResponse: The rendered 'profiling.html' template.
+    """
+    try:
+        store = get_store()
+        captures = [capture for capture in map(store.load, store.ids()) if capture]
+        for capture in captures:
+            capture['query_count'] = len(capture['queries'])
+            capture['query_ms'] = round(sum(query['ms'] for query in capture['queries']), 3)
+        context = {
+            **admin.site.each_context(request),
+            'title': "Profiling captures",
+            'captures': captures,
+        }
+        return render(request, 'oc_lettings_site/profiling.html', context)
+    except Exception as e:
+        # Capturing sentry exception
+        reporting.report_exception(e, "Erreur dans oc_lettings_site.views profiling_captures.")
+        return render(request, '500.html', status=500)
+
+
+@staff_member_required
+def profiling_capture(request, capture_id, format):
+    """
+    Downloads a profiling capture as collapsed stacks ('collapsed', the input
+    of flamegraph.pl or speedscope), as JSON ('json') or, for cProfile
+    captures, as raw statistics ('prof', for pstats or snakeviz).
+    Args:
+        request: The HTTP request object.
+        capture_id (str): The capture id.
+        format (str): 'collapsed', 'json' or 'prof'.
+    Returns:
+        HttpResponse: The capture, sent as an attachment.
+    Raises:
+        Http404: If the capture or the format does not exist.
+    """
+    store = get_store()
+    capture = store.load(capture_id)
+    if capture is None or format not in ('collapsed', 'json', 'prof'):
+        raise Http404("Capture not found.")
+    try:
+        if format == 'prof':
+            if capture['mode'] != 'cprofile':
+                raise Http404("Only cProfile captures have raw statistics.")
+            return FileResponse(
+                open(store.path(capture_id, 'prof'), 'rb'), as_attachment=True,
+                filename=f'{capture_id}.prof'
+            )
+        if format == 'json':
+            response = HttpResponse(json.dumps(capture, indent=2), content_type='application/json')
+        else:
+            response = HttpResponse(
+                ''.join(f'{stack} {count}\n' for stack, count in capture['stacks'].items()),
+                content_type='text/plain; charset=utf-8',
+            )
+        extension = 'json' if format == 'json' else 'txt'
+        response['Content-Disposition'] = f'attachment; filename="{capture_id}.{extension}"'
+        return response
+    except Http404:
+        raise
+    except Exception as e:
+        # Capturing sentry exception
+        reporting.report_exception(e, "Erreur dans oc_lettings_site.views profiling_capture.")
         return render(request, '500.html', status=500)
+
+
+def metrics(request):
+    """
+    Exports the metrics of every worker in the Prometheus text format.
+    Args:
+        request: The HTTP request object.
+    Returns:
+        HttpResponse: The metrics, or a 401 response when METRICS_TOKEN is set
+            and the request does not send it as a bearer token.
+    """
+    token = settings.METRICS_TOKEN
+    if token and not constant_time_compare(
+        request.headers.get('Authorization', ''), f'Bearer {token}'
+    ):
+        return HttpResponse("Unauthorized.", status=401, content_type='text/plain')
+    try:
+        response = HttpResponse(metrics_module.render(), content_type=metrics_module.CONTENT_TYPE)
+        response['Cache-Control'] = 'no-store'
+        return response
+    except Exception as e:
+        # Capturing sentry exception
+        reporting.report_exception(e, "Erreur dans oc_lettings_site.views metrics.")
+        return HttpResponse("Metrics unavailable.", status=500, content_type='text/plain')
@@ -1,7 +1,10 @@
 import os
 from django.core.handlers.wsgi import WSGIHandler
 from django.core.wsgi import get_wsgi_application
+from oc_lettings_site.sentry_config import ensure_sentry
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'oc_lettings_site.settings')
+# Initialized in the serving process only, before the application is loaded
+ensure_sentry()
 
 application: WSGIHandler = get_wsgi_application()
@@ -0,0 +1,65 @@
+from oc_lettings_site.api import Resource, api_view, export_response
+from oc_lettings_site.export import Export
+from oc_lettings_site.page_cache import cached_page
+from .models import Profile
+
+
+# The email and credentials of the users are never exposed
+PROFILE_FIELDS = {
+    'username': 'user__username',
+    'favorite_city': 'favorite_city',
+    'user.first_name': 'user__first_name',
+    'user.last_name': 'user__last_name',
+    'user.date_joined': 'user__date_joined',
+}
+
+PROFILES = Resource(
+    Profile.objects.all(),
+    key='username',
+    fields=PROFILE_FIELDS,
+    default_fields=('favorite_city', 'user'),
+    batch_param='usernames',
+)
+
+PROFILES_EXPORT = Export('profiles', Profile.objects.all(), {'id': 'id', **PROFILE_FIELDS})
+
+
+@cached_page('profiles')
+@api_view
+def profile_list(request):
+    """
+    Returns the profiles with their user, as JSON.
+    Supports the 'fields', 'after', 'limit' and 'usernames' query parameters.
+    Args:
+        request (HttpRequest): The HTTP request object.
+    Returns:
+        JsonResponse: A page of profiles, or the profiles listed in 'usernames'.
+    """
+    return PROFILES.list(request)
+
+
+@cached_page('profiles')
+@api_view
+def profile_detail(request, username):
+    """
+    Returns the profile of a user, as JSON.
+    Args:
+        request (HttpRequest): The HTTP request object.
+        username (str): The username of the user.
+    Returns:
+        JsonResponse: The profile, or an error with status 404.
+    """
+    return PROFILES.detail(request, username)
+
+
+@api_view
+def profile_export(request):
+    """
+    Streams every profile with its user, as CSV or NDJSON (staff only).
+    Supports the 'format', 'gzip' and 'after' query parameters.
+    Args:
+        request (HttpRequest): The HTTP request object.
+    Returns:
+        StreamingHttpResponse: The profiles export.
+    """
+    return export_response(request, PROFILES_EXPORT)
@@ -0,0 +1,135 @@
+import threading
+import time
+from bisect import bisect_left, insort
+from django.conf import settings
+from django.contrib.auth.models import User
+from .models import Profile
+
+
+class PrefixIndex:
+    """
+    Sorted array of distinct values answering case-insensitive prefix queries
+    with a binary search. Values are reference counted, so that a city shared
+    by several profiles stays in the index until the last one goes away.
+    """
+
+    def __init__(self, values=()):
+        self._counts = {}
+        for value in values:
+            self._counts[value] = self._counts.get(value, 0) + 1
+        # Single list of (folded, value) pairs, so that each update is one list operation
+        self._entries = sorted((value.casefold(), value) for value in self._counts)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, value):
+        """
+        Adds one occurrence of a value.
+        """
+        if not value:
+            return
+        count = self._counts.get(value, 0)
+        self._counts[value] = count + 1
+        if not count:
+            insort(self._entries, (value.casefold(), value))
+
+    def remove(self, value):
+        """
+        Removes one occurrence of a value.
+        """
+        count = self._counts.get(value, 0)
+        if count > 1:
+            self._counts[value] = count - 1
+        elif count == 1:
+            del self._counts[value]
+            entry = (value.casefold(), value)
+            position = bisect_left(self._entries, entry)
+            if position < len(self._entries) and self._entries[position] == entry:
+                self._entries.pop(position)
+
+    def complete(self, prefix, limit=10):
+        """
+        Returns the values starting with the given prefix, in alphabetical order.
+        Args:
+            prefix (str): The typed prefix, compared case-insensitively.
+            limit (int): The maximum number of values.
+        Returns:
+            list: The matching values.
+        """
+        folded = prefix.casefold()
+        entries = self._entries
+        position = bisect_left(entries, (folded,))
+        results = []
+        while position < len(entries) and len(results) < limit:
+            key, value = entries[position]
+            if not key.startswith(folded):
+                break
+            results.append(value)
+            position += 1
+        return results
+
+
+class Autocompleter:
+    """
+    Lazily built PrefixIndex over values loaded from the database.
+    The index is rebuilt on first use, after invalidate(), and once older than
+    AUTOCOMPLETE_MAX_AGE seconds so that each worker sees the other workers' writes.
+    """
+
+    def __init__(self, loader):
+        """
+        Args:
+            loader (callable): Returns the values to index.
+        """
+        self.loader = loader
+        self._index = None
+        self._built_at = 0.0
+        self._lock = threading.Lock()
+
+    def index(self):
+        """
+        Returns the current index, building it if needed.
+        """
+        index = self._index
+        if index is None or time.monotonic() - self._built_at > settings.AUTOCOMPLETE_MAX_AGE:
+            with self._lock:
+                if self._index is index:
+                    self._index = PrefixIndex(self.loader())
+                    self._built_at = time.monotonic()
+                index = self._index
+        return index
+
+    def complete(self, prefix, limit=10):
+        """
+        Returns the indexed values starting with the given prefix.
+        """
+        return self.index().complete(prefix, limit)
+
+    def add(self, value):
+        """
+        Adds a value to the index if it is already built.
+        """
+        index = self._index
+        if index is not None:
+            index.add(value)
+
+    def invalidate(self):
+        """
+        Drops the index, the next query rebuilds it.
+        """
+        self._index = None
+
+
+def load_usernames():
+    return User.objects.filter(profile__isnull=False).values_list('username', flat=True)
+
+
+def load_cities():
+    return Profile.objects.exclude(favorite_city='').values_list('favorite_city', flat=True)
+
+
+AUTOCOMPLETERS = {
+    'username': Autocompleter(load_usernames),
+    'city': Autocompleter(load_cities),
+}
@@ -0,0 +1,94 @@
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from oc_lettings_site import page_cache, versioning
+from oc_lettings_site.bulk_import import ImportCommand
+from profiles.autocomplete import AUTOCOMPLETERS
+from profiles.models import Profile
+
+
+USER_FIELDS = ['first_name', 'last_name', 'date_joined']
+# The user fields an import updates, the others are only set on creation
+UPDATED_USER_FIELDS = ['first_name', 'last_name']
+
+
+def upsert(model, objects, unique_fields, update_fields):
+    """
+    Inserts the objects, updating the given fields of the existing rows, or
+    leaving the existing rows untouched when there is no field to update.
+    """
+    if update_fields:
+        model.objects.bulk_create(
+            objects, update_conflicts=True, unique_fields=unique_fields,
+            update_fields=update_fields
+        )
+    else:
+        model.objects.bulk_create(objects, ignore_conflicts=True)
+
+
+class Command(ImportCommand):
+    """
+    Bulk imports profiles with their user, from the columns of the profiles
+    export. Users are matched by username, the new ones are created with an
+    unusable password.
+    """
+    help = "Imports profiles and their users from a CSV or NDJSON file."
+
+    columns = {
+        'username': User._meta.get_field('username'),
+        'favorite_city': Profile._meta.get_field('favorite_city'),
+        **{f'user.{name}': User._meta.get_field(name) for name in USER_FIELDS},
+    }
+
+    def import_batch(self, records):
+        # The last record wins when a username is repeated
+        records = list({record['username']: record for record in records}.values())
+        # An upsert only overwrites the columns a record has: the records are
+        # imported by group of columns, e.g. one group for a CSV file
+        groups = {}
+        for record in records:
+            groups.setdefault(frozenset(record), []).append(record)
+        for columns, group in groups.items():
+            self.import_group(group, columns)
+
+    def import_group(self, records, columns):
+        upsert(
+            User,
+            [
+                User(
+                    username=record['username'],
+                    password=make_password(None),
+                    **{
+                        name: record[f'user.{name}']
+                        for name in USER_FIELDS
+                        if f'user.{name}' in record
+                    }
+                )
+                for record in records
+            ],
+            unique_fields=['username'],
+            update_fields=[name for name in UPDATED_USER_FIELDS if f'user.{name}' in columns],
+        )
+        user_ids = dict(
+            User.objects.filter(username__in=[record['username'] for record in records])
+            .values_list('username', 'id')
+        )
+        upsert(
+            Profile,
+            [
+                Profile(
+                    user_id=user_ids[record['username']],
+                    favorite_city=record.get('favorite_city', ''),
+                )
+                for record in records
+            ],
+            unique_fields=['user'],
+            update_fields=['favorite_city', 'updated_at'] if 'favorite_city' in columns else [],
+        )
+
+    def finish(self):
+        # Bulk operations send no signals
+        versioning.bump(Profile, User)
+        # Seen by the web workers through the cache they share (see page_cache.is_shared)
+        page_cache.invalidate('profiles')
+        for autocompleter in AUTOCOMPLETERS.values():
+            autocompleter.invalidate()
@@ -1,11 +1,13 @@
 from django.db import migrations
+from oc_lettings_site.migration_utils import copy_table, empty_table
 
 
 def forward_func(apps, schema_editor):
     """
     Migrates data from the old 'oc_lettings_site' app to the new 'profiles' app.
-    Copies all profiles records from 'oc_lettings_site' to 'profiles',
-    maintaining the same IDs to preserve relationships.
+    Copies all profiles records from 'oc_lettings_site' to 'profiles' with
+    set-based INSERT ... SELECT statements, maintaining the same IDs to
+    preserve relationships.
     Args:
         apps: The Django app registry.
         schema_editor: Database schema editor to apply changes.
@@ -16,13 +18,7 @@ def forward_func(apps, schema_editor):
     NewProfile = apps.get_model('profiles', 'Profile')
 
     # Copy Profile data
-    for old_profile in OldProfile.objects.all():
-        new_profile = NewProfile(
-            id=old_profile.id,
-            favorite_city=old_profile.favorite_city,
-            user_id=old_profile.user_id
-        )
-        new_profile.save()
+    copy_table(schema_editor, OldProfile, NewProfile)
 
     # Drop old table from the 'oc_lettings_site' app
     schema_editor.delete_model(OldProfile)
@@ -30,8 +26,10 @@ def forward_func(apps, schema_editor):
 
 def reverse_func(apps, schema_editor):
     """
-    Reverts the migration by copying the data back from the new 'profile' app
-    to the old 'oc_lettings_site' app and then drops the new 'profiles' table.
+    Reverts the migration by recreating the old 'oc_lettings_site' table,
+    dropped by the forward migration, copying the data back from the new
+    'profiles' app and then emptying the new 'profiles' table, which is
+    dropped by the reverse of its initial migration.
     Args:
         apps: The Django app registry.
         schema_editor: Database schema editor to apply changes.
@@ -41,17 +39,12 @@ def reverse_func(apps, schema_editor):
     NewProfile = apps.get_model('profiles', 'Profile')
     OldProfile = apps.get_model('oc_lettings_site', 'Profile')
 
-    # Copy Profile data
-    for new_profile in NewProfile.objects.all():
-        old_profile = OldProfile(
-            id=new_profile.id,
-            favorite_city=new_profile.favorite_city,
-            user_id=new_profile.user_id
-        )
-        old_profile.save()
+    # Recreate the old table and copy the data back
+    schema_editor.create_model(OldProfile)
+    copy_table(schema_editor, NewProfile, OldProfile)
 
-    # Drop new table from the 'profiles' app
-    schema_editor.delete_model(NewProfile)
+    # Empty the new table from the 'profiles' app
+    empty_table(schema_editor, NewProfile)
 
 
 class Migration(migrations.Migration):
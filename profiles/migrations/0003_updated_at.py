@@ -0,0 +1,22 @@
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+    """
+    Adds an 'updated_at' timestamp to the 'Profile' model,
+    used to compute the HTTP validators of the profiles pages.
+    """
+
+    dependencies = [
+        ('profiles', '0002_migrate_data'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+    ]
@@ -1,6 +1,17 @@
-import sentry_sdk
 from django.db import models
 from django.contrib.auth.models import User
+from oc_lettings_site import reporting
+from oc_lettings_site.querysets import ViewQuerySet
+
+
+class ProfileQuerySet(ViewQuerySet):
+    """
+    QuerySet declaring the relations read by each profiles view.
+    """
+    view_relations = {
+        'index': ('user',),
+        'profile': ('user',),
+    }
 
 
 class Profile(models.Model):
@@ -9,6 +20,9 @@ class Profile(models.Model):
     """
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     favorite_city = models.CharField(max_length=64, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = ProfileQuerySet.as_manager()
 
     def __str__(self):
         """
@@ -21,6 +35,5 @@ class Profile(models.Model):
             super().clean()
         except Exception as e:
             # Capturing sentry exception
-            sentry_sdk.capture_exception(e)
-            sentry_sdk.capture_message("Erreur de validation dans le modèle Profile")
+            reporting.report_exception(e, "Erreur de validation dans le modèle Profile")
             raise
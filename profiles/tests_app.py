@@ -1,8 +1,19 @@
-import sentry_sdk
-from django.test import TestCase
+import os
+import random
+import string
+import tempfile
+import time
+from io import StringIO
+from django.core.management import call_command
+from asgiref.sync import sync_to_async
+from django.test import AsyncRequestFactory, TestCase, override_settings
 from django.urls import reverse
 from django.contrib.auth.models import User
 from django.template.exceptions import TemplateDoesNotExist
+from oc_lettings_site.query_budget import query_budget
+from oc_lettings_site.reporting import capture_reports
+from . import views
+from .autocomplete import AUTOCOMPLETERS, PrefixIndex
 from .models import Profile
 
 
@@ -18,17 +29,18 @@ class ProfileTest(TestCase):
         Sets up the test user and associated profile data.
         Creates a test user and their profile with a favorite city.
         """
-        self.user = User.objects.create_user(
-            username="testuser",
-            email="test@test.com",
-            password="testpassword",
-            first_name="Test",
-            last_name="User"
-        )
-        self.profile = Profile.objects.create(
-            user=self.user,
-            favorite_city="Test City"
-        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user = User.objects.create_user(
+                username="testuser",
+                email="test@test.com",
+                password="testpassword",
+                first_name="Test",
+                last_name="User"
+            )
+            self.profile = Profile.objects.create(
+                user=self.user,
+                favorite_city="Test City"
+            )
 
     def test_profile_model_str(self):
         """
@@ -74,22 +86,9 @@ class ProfileTest(TestCase):
         Tests that exceptions in the index view are properly handled.
         Verifies that a 500 error page is returned when an exception occurs.
         """
-        # Sauvegarder les fonctions originales
+        # Save original functions
         from django.template import Engine
         original_find_template = Engine.find_template
-        original_capture_exception = sentry_sdk.capture_exception
-        original_capture_message = sentry_sdk.capture_message
-
-        sentry_calls = []
-
-        # Define mocks
-        def mock_capture_exception(exc):
-            sentry_calls.append(('exception', exc))
-            return None
-
-        def mock_capture_message(message):
-            sentry_calls.append(('message', message))
-            return None
 
         def mock_find_template(self, name, dirs=None, skip=None):
             if name == 'profiles/index.html':
@@ -99,33 +98,22 @@ class ProfileTest(TestCase):
         try:
             # Apply mocks
             Engine.find_template = mock_find_template
-            sentry_sdk.capture_exception = mock_capture_exception
-            sentry_sdk.capture_message = mock_capture_message
 
             # Call the view
-            response = self.client.get(reverse('profiles:index'))
+            with capture_reports() as reports:
+                response = self.client.get(reverse('profiles:index'))
 
             # Check status 500 is returned
             self.assertEqual(response.status_code, 500)
 
-            # Check Sentry was called
-            self.assertTrue(len(sentry_calls) >= 1)
-            self.assertEqual(sentry_calls[0][0], 'exception')
-            self.assertTrue(isinstance(sentry_calls[0][1], TemplateDoesNotExist))
-
-            # Check for specific message
-            message_found = False
-            for call in sentry_calls:
-                if call[0] == 'message' and call[1] == "Erreur dans profiles.views index.":
-                    message_found = True
-                    break
-            self.assertTrue(message_found)
+            # Check a single event was sent to Sentry, with the specific message
+            self.assertEqual(len(reports), 1)
+            self.assertIsInstance(reports[0]['exception'], TemplateDoesNotExist)
+            self.assertEqual(reports[0]['message'], "Erreur dans profiles.views index.")
 
         finally:
             # Restore original functions
             Engine.find_template = original_find_template
-            sentry_sdk.capture_exception = original_capture_exception
-            sentry_sdk.capture_message = original_capture_message
 
     def test_profile_detail_view_exception(self):
         """
@@ -135,19 +123,6 @@ class ProfileTest(TestCase):
         # Save original functions
         from django.template import Engine
         original_find_template = Engine.find_template
-        original_capture_exception = sentry_sdk.capture_exception
-        original_capture_message = sentry_sdk.capture_message
-
-        sentry_calls = []
-
-        # Define mocks
-        def mock_capture_exception(exc):
-            sentry_calls.append(('exception', exc))
-            return None
-
-        def mock_capture_message(message):
-            sentry_calls.append(('message', message))
-            return None
 
         def mock_find_template(self, name, dirs=None, skip=None):
             if name == 'profiles/profile.html':
@@ -157,51 +132,28 @@ class ProfileTest(TestCase):
         try:
             # Apply mocks
             Engine.find_template = mock_find_template
-            sentry_sdk.capture_exception = mock_capture_exception
-            sentry_sdk.capture_message = mock_capture_message
 
             # Call the view
-            response = self.client.get(reverse('profiles:profile', args=["testuser"]))
+            with capture_reports() as reports:
+                response = self.client.get(reverse('profiles:profile', args=["testuser"]))
 
             # Check status 500 is returned
             self.assertEqual(response.status_code, 500)
 
-            # Check Sentry was called
-            self.assertTrue(len(sentry_calls) >= 1)
-            self.assertEqual(sentry_calls[0][0], 'exception')
-            self.assertTrue(isinstance(sentry_calls[0][1], TemplateDoesNotExist))
-
-            # Check for specific message
-            message_found = False
-            for call in sentry_calls:
-                if call[0] == 'message' and call[1] == "Erreur dans profiles.views profile.":
-                    message_found = True
-                    break
-            self.assertTrue(message_found)
+            # Check a single event was sent to Sentry, with the specific message
+            self.assertEqual(len(reports), 1)
+            self.assertIsInstance(reports[0]['exception'], TemplateDoesNotExist)
+            self.assertEqual(reports[0]['message'], "Erreur dans profiles.views profile.")
 
         finally:
             # Restore original functions
             Engine.find_template = original_find_template
-            sentry_sdk.capture_exception = original_capture_exception
-            sentry_sdk.capture_message = original_capture_message
 
     def test_profile_clean_exception(self):
         """
-        Tests that the Profile.clean() method correctly captures exceptions using Sentry.
-        Simulates an exception raised from within clean() and ensures Sentry captures it.
+        Tests that the Profile.clean() method correctly reports exceptions to Sentry.
+        Simulates an exception raised from within clean() and ensures a single event is sent.
         """
-        # Backup original sentry functions
-        original_capture_exception = sentry_sdk.capture_exception
-        original_capture_message = sentry_sdk.capture_message
-
-        sentry_calls = []
-
-        def mock_capture_exception(exc):
-            sentry_calls.append(('exception', exc))
-
-        def mock_capture_message(msg):
-            sentry_calls.append(('message', msg))
-
         class CustomError(Exception):
             """Custom exception to trigger in clean()."""
             pass
@@ -214,28 +166,507 @@ class ProfileTest(TestCase):
 
         try:
             # Apply mocks
-            sentry_sdk.capture_exception = mock_capture_exception
-            sentry_sdk.capture_message = mock_capture_message
             self.profile.__class__.__base__.clean = mock_super_clean  # simulate exception
 
-            with self.assertRaises(CustomError):
-                self.profile.clean()
+            with capture_reports() as reports:
+                with self.assertRaises(CustomError):
+                    self.profile.clean()
 
-            # Check Sentry was called properly
-            exception_logged = any(
-                call[0] == 'exception' and isinstance(call[1], CustomError)
-                for call in sentry_calls
-            )
-            message_logged = any(
-                call == ('message', "Erreur de validation dans le modèle Profile")
-                for call in sentry_calls
-            )
-
-            self.assertTrue(exception_logged)
-            self.assertTrue(message_logged)
+            # Check the exception was reported once, with its message
+            self.assertEqual(len(reports), 1)
+            self.assertIsInstance(reports[0]['exception'], CustomError)
+            self.assertEqual(reports[0]['message'], "Erreur de validation dans le modèle Profile")
 
         finally:
             # Restore original methods
-            sentry_sdk.capture_exception = original_capture_exception
-            sentry_sdk.capture_message = original_capture_message
             self.profile.__class__.__base__.clean = original_super_clean
+
+
+class ProfileQueryBudgetTest(TestCase):
+    """
+    Test case for the number of queries run by the Profile views.
+    """
+
+    def setUp(self):
+        """
+        Sets up several profiles so that N+1 patterns would show up.
+        """
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(1, 6):
+                user = User.objects.create_user(username=f"user{i}", password="testpassword")
+                Profile.objects.create(user=user, favorite_city="Test City")
+
+    def test_profile_index_within_budget(self):
+        """
+        Tests that the index view loads every profile with its user in one query.
+        """
+        with query_budget('profiles:index'):
+            response = self.client.get(reverse('profiles:index'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "user5")
+
+    def test_profile_detail_within_budget(self):
+        """
+        Tests that the detail view stays within its query budget.
+        """
+        with query_budget('profiles:profile'):
+            response = self.client.get(reverse('profiles:profile', args=["user1"]))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Test City")
+
+
+@override_settings(PROFILES_PAGE_SIZE=2)
+class ProfilePaginationTest(TestCase):
+    """
+    Test case for the keyset pagination of the Profile index view.
+    """
+
+    def setUp(self):
+        """
+        Sets up profiles created in a different order than their usernames.
+        """
+        with self.captureOnCommitCallbacks(execute=True):
+            for username in ["charlie", "alice", "eve", "bob", "dave"]:
+                user = User.objects.create_user(username=username, password="testpassword")
+                Profile.objects.create(user=user, favorite_city="Test City")
+
+    def usernames(self, response):
+        return [profile.user.username for profile in response.context['page']]
+
+    def test_pages_ordered_by_username(self):
+        """
+        Tests that pages follow the username order through the next links.
+        """
+        response = self.client.get(reverse('profiles:index'))
+        self.assertEqual(self.usernames(response), ["alice", "bob"])
+        self.assertContains(response, 'href="?after=bob"')
+
+        response = self.client.get(reverse('profiles:index'), {'after': "bob"})
+        self.assertEqual(self.usernames(response), ["charlie", "dave"])
+
+        response = self.client.get(reverse('profiles:index'), {'after': "dave"})
+        self.assertEqual(self.usernames(response), ["eve"])
+        self.assertFalse(response.context['page'].has_next)
+
+    def test_previous_page(self):
+        """
+        Tests that the previous link goes back to the preceding usernames.
+        """
+        response = self.client.get(reverse('profiles:index'), {'before': "charlie"})
+        self.assertEqual(self.usernames(response), ["alice", "bob"])
+        self.assertFalse(response.context['page'].has_previous)
+        self.assertTrue(response.context['page'].has_next)
+
+    def test_past_last_page(self):
+        """
+        Tests that a cursor past the end renders an empty page linking back.
+        """
+        response = self.client.get(reverse('profiles:index'), {'after': "zed"})
+        self.assertEqual(self.usernames(response), [])
+        self.assertContains(response, 'href="?before=zed"')
+
+
+class ProfilePageCacheTest(TestCase):
+    """
+    Test case for the cache of the rendered Profile pages.
+    """
+
+    def setUp(self):
+        """
+        Sets up a profile whose pages are cached.
+        """
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user = User.objects.create_user(
+                username="testuser", password="testpassword", first_name="Test"
+            )
+            self.profile = Profile.objects.create(user=self.user, favorite_city="Test City")
+        self.url = reverse('profiles:profile', args=["testuser"])
+
+    def test_second_hit_served_from_cache(self):
+        """
+        Tests that a page is rendered once and then served from the cache.
+        """
+        self.assertEqual(self.client.get(self.url)['X-Page-Cache'], 'MISS')
+        self.assertEqual(self.client.get(self.url)['X-Page-Cache'], 'HIT')
+
+    def test_profile_save_invalidates(self):
+        """
+        Tests that saving a profile invalidates its page.
+        """
+        self.client.get(self.url)
+        self.profile.favorite_city = "Other City"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.profile.save()
+        self.assertContains(self.client.get(self.url), "Other City")
+
+    def test_user_save_invalidates(self):
+        """
+        Tests that saving the related user invalidates the profile page.
+        """
+        self.client.get(self.url)
+        self.user.first_name = "Renamed"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        self.assertContains(self.client.get(self.url), "Renamed")
+
+    def test_user_delete_invalidates(self):
+        """
+        Tests that deleting a user removes the profile from the cached index page.
+        """
+        self.client.get(reverse('profiles:index'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.delete()
+        self.assertNotContains(self.client.get(reverse('profiles:index')), "testuser")
+
+
+class ProfileConditionalGetTest(TestCase):
+    """
+    Test case for the ETag and Last-Modified validators of the Profile views.
+    """
+
+    def setUp(self):
+        """
+        Sets up a profile.
+        """
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user = User.objects.create_user(username="testuser", password="testpassword")
+            self.profile = Profile.objects.create(user=self.user, favorite_city="Test City")
+        self.url = reverse('profiles:profile', args=["testuser"])
+
+    def test_not_modified(self):
+        """
+        Tests that the index and detail pages answer 304 to a matching ETag.
+        """
+        for url in (reverse('profiles:index'), self.url):
+            response = self.client.get(url)
+            self.assertTrue(response.has_header('Last-Modified'))
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(response.status_code, 304)
+
+    def test_user_change_changes_etag(self):
+        """
+        Tests that updating the user invalidates the profile page ETag.
+        """
+        etag = self.client.get(self.url)['ETag']
+        self.user.email = "new@test.com"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "new@test.com")
+
+
+class ProfileAsyncViewTest(TestCase):
+    """
+    Test case for the async versions of the Profile views, served under ASGI.
+    """
+
+    def setUp(self):
+        """
+        Sets up a profile and a factory of ASGI requests.
+        """
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user = User.objects.create_user(username="testuser", password="testpassword")
+            Profile.objects.create(user=self.user, favorite_city="Test City")
+        self.url = reverse('profiles:profile', args=["testuser"])
+        self.factory = AsyncRequestFactory()
+
+    @override_settings(PAGE_CACHE_ENABLED=False)
+    async def test_same_pages_as_sync_views(self):
+        """
+        Tests that the async views render the pages and validators of the sync views.
+        """
+        pages = (
+            (views.aindex, views.index, reverse('profiles:index'), ()),
+            (views.aprofile, views.profile, self.url, ("testuser",)),
+        )
+        for async_view, sync_view, url, args in pages:
+            response = await async_view(self.factory.get(url), *args)
+            expected = await sync_to_async(sync_view)(self.factory.get(url), *args)
+            self.assertEqual(response.status_code, 200)
+            self.assertContains(response, "testuser")
+            self.assertEqual(response.content, expected.content)
+            self.assertEqual(response['ETag'], expected['ETag'])
+
+    async def test_cached_and_not_modified(self):
+        """
+        Tests that the async profile view is cached, answers 304 to its ETag and
+        renders the 404 page of a missing user.
+        """
+        first = await views.aprofile(self.factory.get(self.url), "testuser")
+        self.assertEqual(first['X-Page-Cache'], 'MISS')
+        second = await views.aprofile(self.factory.get(self.url), "testuser")
+        self.assertEqual(second['X-Page-Cache'], 'HIT')
+
+        request = self.factory.get(self.url, headers={'If-None-Match': first['ETag']})
+        self.assertEqual((await views.aprofile(request, "testuser")).status_code, 304)
+        missing = reverse('profiles:profile', args=["nobody"])
+        response = await views.aprofile(self.factory.get(missing), "nobody")
+        self.assertEqual(response.status_code, 404)
+
+
+class PrefixIndexTest(TestCase):
+    """
+    Test case for the PrefixIndex sorted array.
+    """
+
+    def test_complete(self):
+        """
+        Tests that completion is case-insensitive, sorted and limited.
+        """
+        index = PrefixIndex(["Boston", "berlin", "Bordeaux", "Paris"])
+        self.assertEqual(index.complete("bo"), ["Bordeaux", "Boston"])
+        self.assertEqual(index.complete("B", limit=2), ["berlin", "Bordeaux"])
+        self.assertEqual(index.complete("x"), [])
+
+    def test_reference_counting(self):
+        """
+        Tests that a shared value stays until its last occurrence is removed.
+        """
+        index = PrefixIndex(["Paris", "Paris"])
+        self.assertEqual(len(index), 1)
+        index.remove("Paris")
+        self.assertEqual(index.complete("pa"), ["Paris"])
+        index.remove("Paris")
+        self.assertEqual(index.complete("pa"), [])
+        index.add("Pau")
+        self.assertEqual(index.complete("pa"), ["Pau"])
+
+    def test_latency(self):
+        """
+        Tests that the 99th percentile of completions stays well under a millisecond.
+        """
+        rng = random.Random(0)
+        index = PrefixIndex(
+            ''.join(rng.choices(string.ascii_lowercase, k=10)) for _ in range(100000)
+        )
+        durations = []
+        for _ in range(1000):
+            prefix = ''.join(rng.choices(string.ascii_lowercase, k=rng.randint(1, 3)))
+            start = time.perf_counter()
+            index.complete(prefix)
+            durations.append(time.perf_counter() - start)
+        durations.sort()
+        self.assertLess(durations[989], 0.001)
+
+
+class ProfileAutocompleteTest(TestCase):
+    """
+    Test case for the autocomplete view of the profiles.
+    """
+
+    def setUp(self):
+        """
+        Sets up profiles, starting from empty autocomplete indexes.
+        """
+        for autocompleter in AUTOCOMPLETERS.values():
+            autocompleter.invalidate()
+        for username, city in [("alice", "Boston"), ("albert", "Berlin"), ("bob", "Boston")]:
+            user = User.objects.create_user(username=username, password="testpassword")
+            Profile.objects.create(user=user, favorite_city=city)
+        self.url = reverse('profiles:autocomplete')
+
+    def results(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()['results']
+
+    def test_usernames(self):
+        """
+        Tests that usernames are completed in alphabetical order.
+        """
+        self.assertEqual(self.results(q="al"), ["albert", "alice"])
+        self.assertEqual(self.results(q="al", limit=1), ["albert"])
+
+    def test_cities(self):
+        """
+        Tests that favorite cities are completed once each.
+        """
+        self.assertEqual(self.results(q="b", field="city"), ["Berlin", "Boston"])
+
+    def test_no_query_once_built(self):
+        """
+        Tests that keystrokes do not hit the database once the index is built.
+        """
+        self.results(q="a")
+        with query_budget('profiles:autocomplete'):
+            self.assertEqual(self.results(q="ali"), ["alice"])
+
+    def test_follows_model_changes(self):
+        """
+        Tests that new profiles, renamed users and deleted users are reflected.
+        """
+        self.results(q="a")
+        user = User.objects.create_user(username="alfred", password="testpassword")
+        Profile.objects.create(user=user, favorite_city="Austin")
+        self.assertEqual(self.results(q="alf"), ["alfred"])
+        self.assertEqual(self.results(q="au", field="city"), ["Austin"])
+
+        user.username = "zoe"
+        user.save()
+        self.assertEqual(self.results(q="alf"), [])
+        self.assertEqual(self.results(q="z"), ["zoe"])
+
+        User.objects.get(username="alice").delete()
+        self.assertEqual(self.results(q="al"), ["albert"])
+
+    def test_invalid_parameters(self):
+        """
+        Tests that an unknown field or a non numeric limit is rejected.
+        """
+        self.assertEqual(self.client.get(self.url, {'q': "a", 'field': "email"}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'q': "a", 'limit': "x"}).status_code, 400)
+
+    def test_username_not_shadowed(self):
+        """
+        Tests that the profile of a user named 'autocomplete' is still served.
+        """
+        user = User.objects.create_user(username="autocomplete", password="testpassword")
+        Profile.objects.create(user=user, favorite_city="Boston")
+        response = self.client.get(reverse('profiles:profile', args=["autocomplete"]))
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, 'profiles/profile.html')
+
+
+class ProfileApiTest(TestCase):
+    """
+    Test case for the profiles endpoints of the JSON API.
+    """
+
+    def setUp(self):
+        """
+        Sets up three profiles.
+        """
+        for i in range(1, 4):
+            user = User.objects.create_user(
+                username=f"user{i}", password="testpassword", email=f"user{i}@example.com",
+                first_name=f"First {i}", last_name=f"Last {i}"
+            )
+            Profile.objects.create(user=user, favorite_city=f"City {i}")
+
+    def test_list(self):
+        """
+        Tests that the list embeds the selected user fields, in one query.
+        """
+        with query_budget('api:profiles'):
+            response = self.client.get(reverse('api:profiles'))
+        result = response.json()['results'][0]
+        self.assertEqual(result['username'], "user1")
+        self.assertEqual(result['favorite_city'], "City 1")
+        self.assertEqual(result['user']['first_name'], "First 1")
+        self.assertIn('date_joined', result['user'])
+        self.assertNotIn("example.com", response.content.decode())
+
+    def test_sparse_fields(self):
+        """
+        Tests that only the requested fields, and the username, are returned.
+        """
+        response = self.client.get(reverse('api:profiles'), {'fields': 'user.last_name'})
+        self.assertEqual(response.json()['results'][1],
+                         {'username': "user2", 'user': {'last_name': "Last 2"}})
+        response = self.client.get(reverse('api:profiles'), {'fields': 'user.email'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_batch(self):
+        """
+        Tests that many profiles are fetched by username in one query.
+        """
+        with query_budget('api:profiles'):
+            response = self.client.get(
+                reverse('api:profiles'),
+                {'usernames': 'user3,user1,nobody', 'fields': 'favorite_city'}
+            )
+        self.assertEqual(response.json(), {
+            'results': [
+                {'username': "user1", 'favorite_city': "City 1"},
+                {'username': "user3", 'favorite_city': "City 3"},
+            ],
+            'missing': ["nobody"],
+        })
+
+    def test_detail(self):
+        """
+        Tests that a profile is fetched in one query, and that a missing one is a 404.
+        """
+        with query_budget('api:profile'):
+            response = self.client.get(reverse('api:profile', args=["user2"]))
+        self.assertEqual(response.json()['user']['first_name'], "First 2")
+        self.assertEqual(self.client.get(reverse('api:profile', args=["nobody"])).status_code, 404)
+
+    def test_export(self):
+        """
+        Tests that the profiles are exported to staff members, and that the
+        profile of a user named 'export' is still served.
+        """
+        user = User.objects.create_user(username="export", password="testpassword", is_staff=True)
+        Profile.objects.create(user=user, favorite_city="Export City")
+        self.client.force_login(user)
+        response = self.client.get(reverse('api:profiles-export'), {'format': 'ndjson'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(b''.join(response.streaming_content).decode().splitlines()), 4)
+        response = self.client.get(reverse('api:profile', args=["export"]))
+        self.assertEqual(response.json()['favorite_city'], "Export City")
+
+
+class ImportProfilesTest(TestCase):
+    """
+    Test case for the 'import_profiles' command.
+    """
+
+    def setUp(self):
+        for autocompleter in AUTOCOMPLETERS.values():
+            autocompleter.invalidate()
+
+    def run_import(self, content):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as file:
+            file.write(content)
+        self.addCleanup(os.remove, file.name)
+        out, err = StringIO(), StringIO()
+        call_command('import_profiles', file.name, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_import_and_update(self):
+        """
+        Tests that users are matched by username, and created with an unusable password.
+        """
+        user = User.objects.create_user(username="alice", password="testpassword")
+        Profile.objects.create(user=user, favorite_city="Paris")
+        AUTOCOMPLETERS['city'].complete("p")
+
+        out, err = self.run_import(
+            "username,favorite_city,user.first_name,user.last_name\n"
+            "alice,Lyon,Alice,Martin\n"
+            "bob,,Bob,\n"
+            "not a username!,Nice,,\n"
+        )
+        self.assertIn("Imported 2 records, rejected 1", out)
+        self.assertIn("Record 3 rejected, username:", err)
+
+        user.refresh_from_db()
+        self.assertEqual((user.first_name, user.profile.favorite_city), ("Alice", "Lyon"))
+        self.assertTrue(user.check_password("testpassword"))
+        bob = User.objects.get(username="bob")
+        self.assertFalse(bob.has_usable_password())
+        self.assertEqual(bob.profile.favorite_city, "")
+        self.assertEqual(AUTOCOMPLETERS['city'].complete("l"), ["Lyon"])
+
+    def test_reimport_keeps_absent_columns(self):
+        """
+        Tests that re-importing onto existing users leaves the columns missing
+        from the file untouched.
+        """
+        user = User.objects.create_user(
+            username="alice", password="testpassword", first_name="Alice", last_name="Smith"
+        )
+        Profile.objects.create(user=user, favorite_city="Paris")
+
+        out, _ = self.run_import("username,favorite_city\nalice,Lyon\n")
+        self.assertIn("Imported 1 records", out)
+        user.refresh_from_db()
+        self.assertEqual((user.first_name, user.last_name), ("Alice", "Smith"))
+        self.assertEqual(user.profile.favorite_city, "Lyon")
+
+        self.run_import("username,user.last_name\nalice,Martin\n")
+        user.refresh_from_db()
+        self.assertEqual((user.first_name, user.last_name), ("Alice", "Martin"))
+        self.assertEqual(user.profile.favorite_city, "Lyon")
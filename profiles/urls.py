@@ -1,14 +1,25 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
 
+# The async views are served under ASGI only (see settings.ASYNC_VIEWS)
+if settings.ASYNC_VIEWS:
+    index, profile = views.aindex, views.aprofile
+else:
+    index, profile = views.index, views.profile
+
 app_name = 'profiles'
 urlpatterns = [
-    path('', views.index, name='index'),
-    path('<str:username>/', views.profile, name='profile'),
+    path('', index, name='index'),
+    # Under '-/', which a single username segment never matches
+    path('-/autocomplete/', views.autocomplete, name='autocomplete'),
+    path('<str:username>/', profile, name='profile'),
 ]
 """
 URL configuration for the Profiles app.
-- '' → Calls the index view and lists all profiles.
-- '<str:username>/' → Calls the profile view for a specific profile by username.
+- '' → Calls the index view (aindex under ASGI) and lists all profiles.
+- '-/autocomplete/' → Calls the autocomplete view and returns the matching usernames or cities.
+- '<str:username>/' → Calls the profile view (aprofile under ASGI) for a specific profile
+  by username.
 """
@@ -1,29 +1,97 @@
-import sentry_sdk
-from django.http import Http404
-from django.shortcuts import render, get_object_or_404
+from django.conf import settings
+from django.http import Http404, JsonResponse
+from django.contrib.auth.models import User
+from django.db.models import Subquery
+from django.shortcuts import aget_object_or_404, get_object_or_404
+from django.views.decorators.http import condition
+from oc_lettings_site import reporting, versioning
+from oc_lettings_site.models import ModelVersion
+from oc_lettings_site.page_cache import cached_page
+from oc_lettings_site.pagination import KeysetPaginator
+from oc_lettings_site.sentry_config import render, span
+from .autocomplete import AUTOCOMPLETERS
 from .models import Profile
 
 
+def profile_validators(username):
+    """
+    Computes the ETag and Last-Modified of a profile page from the profile timestamp
+    and the User table version, in a single query.
+    """
+    user_versions = ModelVersion.objects.filter(label=versioning.model_label(User))
+    row = Profile.objects.filter(user__username=username).annotate(
+        user_version=Subquery(user_versions.values('version')[:1]),
+        user_updated_at=Subquery(user_versions.values('updated_at')[:1]),
+    ).values_list('id', 'updated_at', 'user_version', 'user_updated_at').first()
+    if row is None:
+        return None
+    profile_id, updated_at, user_version, user_updated_at = row
+    etag = versioning.make_etag('profiles:profile', profile_id, updated_at, user_version)
+    return etag, max(updated_at, user_updated_at or updated_at)
+
+
+index_etag, index_last_modified = versioning.cached_validators(
+    versioning.table_validators(
+        'profiles:index', Profile, User, extra=lambda: (settings.PROFILES_PAGE_SIZE,)
+    )
+)
+profile_etag, profile_last_modified = versioning.cached_validators(profile_validators)
+
+
+@condition(etag_func=index_etag, last_modified_func=index_last_modified)
+@cached_page('profiles')
 def index(request):
     """
-    Renders the index page displaying a list of all user profiles.
+    Renders the index page displaying a page of user profiles ordered by username.
+    The page is selected with the 'after' or 'before' cursor query parameters.
     Args:
         request (HttpRequest): The HTTP request object.
     Returns:
-        HttpResponse: The rendered 'profiles/index.html' template with the profiles list.
+        HttpResponse: The rendered 'profiles/index.html' template with the profiles page.
     """
     try:
         # Profiles.index view logic
-        profiles_list = Profile.objects.all()
-        context = {'profiles_list': profiles_list}
+        paginator = KeysetPaginator(
+            Profile.objects.for_view('index'), 'user__username', settings.PROFILES_PAGE_SIZE
+        )
+        with span('db', "profiles.views index"):
+            page = paginator.get_page(request.GET)
+        context = {'profiles_list': page.object_list, 'page': page}
         return render(request, 'profiles/index.html', context)
     except Exception as e:
         # Capturing sentry exception
-        sentry_sdk.capture_exception(e)
-        sentry_sdk.capture_message("Erreur dans profiles.views index.")
+        reporting.report_exception(e, "Erreur dans profiles.views index.")
         return render(request, '500.html', status=500)
 
 
+@versioning.async_condition(index_etag, index_last_modified)
+@cached_page('profiles')
+async def aindex(request):
+    """
+    Async version of the index view, served under ASGI (see ASYNC_VIEWS):
+    the profiles page is read with the async ORM.
+    Args:
+        request (HttpRequest): The HTTP request object.
+    Returns:
+        HttpResponse: The rendered 'profiles/index.html' template with the profiles page.
+    """
+    try:
+        # Profiles.index view logic
+        paginator = KeysetPaginator(
+            Profile.objects.for_view('index'), 'user__username', settings.PROFILES_PAGE_SIZE
+        )
+        with span('db', "profiles.views index"):
+            page = await paginator.aget_page(request.GET)
+        context = {'profiles_list': page.object_list, 'page': page}
+        return render(request, 'profiles/index.html', context)
+    except Exception as e:
+        # Capturing sentry exception
+        reporting.report_exception(e, "Erreur dans profiles.views index.")
+        return render(request, '500.html', status=500)
+
+
+@condition(etag_func=profile_etag, last_modified_func=profile_last_modified)
+@cached_page('profiles')
 def profile(request, username):
     """
     Renders the detail page for a specific user profile.
@@ -35,7 +103,10 @@ def profile(request, username):
     """
     try:
         # Profiles.profile view logic
-        profile = get_object_or_404(Profile, user__username=username)
+        with span('db', "profiles.views profile"):
+            profile = get_object_or_404(
+                Profile.objects.for_view('profile'), user__username=username
+            )
         context = {'profile': profile}
         return render(request, 'profiles/profile.html', context)
     except Http404:
@@ -43,6 +114,63 @@ def profile(request, username):
         return render(request, '404.html', status=404)
     except Exception as e:
         # Capturing other exception
-        sentry_sdk.capture_exception(e)
-        sentry_sdk.capture_message("Erreur dans profiles.views profile.")
+        reporting.report_exception(e, "Erreur dans profiles.views profile.")
         return render(request, '500.html', status=500)
+
+
+@versioning.async_condition(profile_etag, profile_last_modified)
+@cached_page('profiles')
+async def aprofile(request, username):
+    """
+    Async version of the profile view, served under ASGI (see ASYNC_VIEWS):
+    the profile and its user are read with the async ORM.
+    Args:
+        request (HttpRequest): The HTTP request object.
+        username (str): The username of the user whose profile is to be displayed.
+    Returns:
+        HttpResponse: The rendered 'profiles/profile.html' template with the user's profile data.
+    """
+    try:
+        # Profiles.profile view logic
+        with span('db', "profiles.views profile"):
+            profile = await aget_object_or_404(
+                Profile.objects.for_view('profile'), user__username=username
+            )
+        context = {'profile': profile}
+        return render(request, 'profiles/profile.html', context)
+    except Http404:
+        # Username doesn't exist, 404
+        return render(request, '404.html', status=404)
+    except Exception as e:
+        # Capturing other exception
+        reporting.report_exception(e, "Erreur dans profiles.views profile.")
+        return render(request, '500.html', status=500)
+
+
+def autocomplete(request):
+    """
+    Returns the usernames or favorite cities starting with the 'q' query parameter.
+    Answers from an in-memory sorted index, without querying the database.
+    Args:
+        request (HttpRequest): The HTTP request object, with the 'q', 'field'
+            ('username' or 'city') and 'limit' query parameters.
+    Returns:
+        JsonResponse: The matching values, or an error with status 400.
+    """
+    field = request.GET.get('field', 'username')
+    if field not in AUTOCOMPLETERS:
+        return JsonResponse({'error': f"Unknown field '{field}'."}, status=400)
+    try:
+        limit = min(int(request.GET.get('limit', 10)), settings.AUTOCOMPLETE_MAX_RESULTS)
+    except ValueError:
+        return JsonResponse({'error': "The limit must be an integer."}, status=400)
+
+    try:
+        # Profiles.autocomplete view logic
+        query = request.GET.get('q', '')
+        results = AUTOCOMPLETERS[field].complete(query, max(limit, 0)) if query else []
+        return JsonResponse({'field': field, 'query': query, 'results': results})
+    except Exception as e:
+        # Capturing sentry exception
+        reporting.report_exception(e, "Erreur dans profiles.views autocomplete.")
+        return JsonResponse({'error': "Internal server error."}, status=500)